@@ -0,0 +1,82 @@
+import json
+import logging
+import queue
+import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.config.settings import settings
+
+# Correlation id of the request being served; "-" outside of a request.
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_listener: Optional[QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _formatter() -> logging.Formatter:
+    if settings.log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s')
+
+
+def configure_logging():
+    """Route every log record through a queue so handler I/O runs on a background thread.
+
+    Request threads and the event loop only pay for building the record; writing to
+    stderr and the optional LOG_FILE happens in the QueueListener thread. Safe to call
+    more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = _formatter()
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if settings.log_file:
+        handlers.append(logging.FileHandler(settings.log_file, mode='a'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.log_level.upper())
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,9 +1,134 @@
 import os
+from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
+# Loaded once, before any default below reads the environment.
+load_dotenv()
+
 class Settings(BaseSettings):
     sns_topic_arn: str = os.getenv("SNS_SMS_TOPIC_ARN", "")
     sns_email_topic_arn: str = os.getenv("SNS_EMAIL_TOPIC_ARN", "")
     aws_region: str = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
+    sns_endpoint_url: str = os.getenv("SNS_ENDPOINT_URL", "")
+    dynamodb_endpoint_url: str = os.getenv("DYNAMODB_ENDPOINT_URL", "")
+    s3_endpoint_url: str = os.getenv("S3_ENDPOINT_URL", "")
+
+    # Storage backend: "dynamodb" or "memory" (in-process, optionally seeded from a
+    # DynamoDB JSON file such as iac/data.json).
+    storage_backend: str = os.getenv("STORAGE_BACKEND", "dynamodb")
+    storage_seed_file: str = os.getenv("STORAGE_SEED_FILE", "")
+
+    # Shared AWS clients (app/utils/aws.py)
+    aws_max_pool_connections: int = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+    aws_connect_timeout: float = float(os.getenv("AWS_CONNECT_TIMEOUT", "2"))
+    aws_read_timeout: float = float(os.getenv("AWS_READ_TIMEOUT", "5"))
+    aws_tcp_keepalive: bool = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() == "true"
+    aws_retry_mode: str = os.getenv("AWS_RETRY_MODE", "standard")
+    aws_max_attempts: int = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
+
+    # Logging (app/config/logging_config.py)
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_format: str = os.getenv("LOG_FORMAT", "text")
+    log_file: str = os.getenv("LOG_FILE", "")
+    log_headers_sample_rate: float = float(os.getenv("LOG_HEADERS_SAMPLE_RATE", "0"))
+    log_body_sample_rate: float = float(os.getenv("LOG_BODY_SAMPLE_RATE", "0"))
+    log_body_max_bytes: int = int(os.getenv("LOG_BODY_MAX_BYTES", "2048"))
+
+    # Cold start: warm the storage connections, AWS clients and fund catalog before
+    # serving, opening this many pooled connections up front.
+    warmup_on_startup: bool = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+    warmup_connections: int = int(os.getenv("WARMUP_CONNECTIONS", "4"))
+
+    # Pre-fork server (python -m app.server). WEB_CONCURRENCY = 0 sizes the pool from the
+    # CPUs and memory the container may use; workers are recycled after N (+ jitter) requests.
+    server_host: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    server_port: int = int(os.getenv("SERVER_PORT", "8000"))
+    server_backlog: int = int(os.getenv("SERVER_BACKLOG", "2048"))
+    web_concurrency: int = int(os.getenv("WEB_CONCURRENCY", "0"))
+    server_worker_memory_mb: int = int(os.getenv("SERVER_WORKER_MEMORY_MB", "128"))
+    server_preload: bool = os.getenv("SERVER_PRELOAD", "false").lower() == "true"
+    server_max_requests: int = int(os.getenv("SERVER_MAX_REQUESTS", "0"))
+    server_max_requests_jitter: int = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", "0"))
+    server_graceful_timeout: float = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "25"))
+    server_keep_alive_timeout: int = int(os.getenv("SERVER_KEEP_ALIVE_TIMEOUT", "65"))
+    # Whether this process runs the periodic jobs (fund stats reconciler, balance
+    # snapshotter, notification sweep). app.server sets it per worker so only one does.
+    background_jobs: bool = os.getenv("BACKGROUND_JOBS", "true").lower() == "true"
+
+    # Metrics (GET /metrics)
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # Admission control (app/utils/admission.py). Rates are requests per second;
+    # 0 disables that bucket. The concurrency limit adapts between min and max.
+    admission_enabled: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    admission_global_rate: float = float(os.getenv("ADMISSION_GLOBAL_RATE", "0"))
+    admission_global_burst: float = float(os.getenv("ADMISSION_GLOBAL_BURST", "200"))
+    admission_user_rate: float = float(os.getenv("ADMISSION_USER_RATE", "10"))
+    admission_user_burst: float = float(os.getenv("ADMISSION_USER_BURST", "50"))
+    admission_max_tracked_users: int = int(os.getenv("ADMISSION_MAX_TRACKED_USERS", "100000"))
+    admission_min_concurrency: int = int(os.getenv("ADMISSION_MIN_CONCURRENCY", "8"))
+    admission_max_concurrency: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "256"))
+    admission_latency_target_seconds: float = float(os.getenv("ADMISSION_LATENCY_TARGET_SECONDS", "1.0"))
+    admission_retry_after_seconds: float = float(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+    # Subscribe/cancel
+    transaction_max_attempts: int = int(os.getenv("TRANSACTION_MAX_ATTEMPTS", "3"))
+    batch_max_operations: int = int(os.getenv("BATCH_MAX_OPERATIONS", "1000"))
+
+    # Idempotency-Key replays (IdempotencyKeys table, with an in-process LRU in front)
+    idempotency_ttl_seconds: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    idempotency_cache_max_size: int = int(os.getenv("IDEMPOTENCY_CACHE_MAX_SIZE", "10000"))
+
+    # Notification outbox
+    outbox_workers: int = int(os.getenv("OUTBOX_WORKERS", "2"))
+    outbox_max_attempts: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+    outbox_backoff_seconds: float = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "0.2"))
+    outbox_linger_seconds: float = float(os.getenv("OUTBOX_LINGER_SECONDS", "0.02"))
+    # Every N seconds (0 = only on demand) re-enqueue notifications still pending on
+    # history rows between the window and the grace period ago. Pending rows are
+    # spread over this many shards per day of the pending index; keep it stable.
+    outbox_sweep_interval_seconds: float = float(os.getenv("OUTBOX_SWEEP_INTERVAL_SECONDS", "0"))
+    outbox_sweep_shards: int = int(os.getenv("OUTBOX_SWEEP_SHARDS", "4"))
+    outbox_sweep_grace_seconds: float = float(os.getenv("OUTBOX_SWEEP_GRACE_SECONDS", "300"))
+    outbox_sweep_window_seconds: float = float(os.getenv("OUTBOX_SWEEP_WINDOW_SECONDS", "86400"))
+
+    # Fund catalog cache
+    fund_cache_ttl_seconds: float = float(os.getenv("FUND_CACHE_TTL_SECONDS", "300"))
+    fund_cache_max_size: int = int(os.getenv("FUND_CACHE_MAX_SIZE", "1024"))
+    fund_cache_preload: bool = os.getenv("FUND_CACHE_PRELOAD", "false").lower() == "true"
+
+    # Client reads for read-only endpoints: concurrent misses share one read, and with a
+    # TTL > 0 the validated client is cached for that many milliseconds (0 = no cache).
+    client_cache_ttl_ms: float = float(os.getenv("CLIENT_CACHE_TTL_MS", "0"))
+    client_cache_max_size: int = int(os.getenv("CLIENT_CACHE_MAX_SIZE", "10000"))
+
+    # Per-fund counters (FundStats table). Writes spread over this many shards per fund;
+    # a reconciliation pass repairs drift every N seconds (0 = only on demand).
+    fund_stats_shards: int = int(os.getenv("FUND_STATS_SHARDS", "8"))
+    fund_stats_reconcile_interval_seconds: float = float(os.getenv("FUND_STATS_RECONCILE_INTERVAL_SECONDS", "0"))
+
+    # Point-in-time balances (BalanceSnapshots table). Every N seconds (0 = only on demand)
+    # each client's balance is snapshotted as of now minus the settle window.
+    balance_snapshot_interval_seconds: float = float(os.getenv("BALANCE_SNAPSHOT_INTERVAL_SECONDS", "0"))
+    balance_snapshot_settle_seconds: float = float(os.getenv("BALANCE_SNAPSHOT_SETTLE_SECONDS", "300"))
+
+    # Transaction history
+    relations_user_index: str = os.getenv("RELATIONS_USER_INDEX", "user_id-index")
+    history_user_index: str = os.getenv("HISTORY_USER_INDEX", "user_id-timestamp-index")
+    history_pending_index: str = os.getenv("HISTORY_PENDING_INDEX", "notification_pending-timestamp-index")
+    history_page_size: int = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+    history_max_page_size: int = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "500"))
+    history_export_page_size: int = int(os.getenv("HISTORY_EXPORT_PAGE_SIZE", "1000"))
+    # Storage reads one history page may take before it is returned short with a cursor.
+    history_max_reads_per_page: int = int(os.getenv("HISTORY_MAX_READS_PER_PAGE", "4"))
+
+    # Cold history archive: s3://bucket/prefix or a local directory (empty = disabled).
+    # Compaction moves rows older than N days there, as parts of up to PART_ROWS rows
+    # per day cut into row groups of GROUP_ROWS; decoded groups are cached per process.
+    history_archive_uri: str = os.getenv("HISTORY_ARCHIVE_URI", "")
+    history_archive_after_days: int = int(os.getenv("HISTORY_ARCHIVE_AFTER_DAYS", "365"))
+    history_archive_part_rows: int = int(os.getenv("HISTORY_ARCHIVE_PART_ROWS", "50000"))
+    history_archive_group_rows: int = int(os.getenv("HISTORY_ARCHIVE_GROUP_ROWS", "1000"))
+    history_archive_cache_groups: int = int(os.getenv("HISTORY_ARCHIVE_CACHE_GROUPS", "256"))
 
 settings = Settings()
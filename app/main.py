@@ -1,67 +1,153 @@
+import time
+
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import Response, JSONResponse, PlainTextResponse
 from fastapi import Request as FastAPIRequest
-from starlette.datastructures import State
-from app.routers import funds
+from app.routers import clients, funds
+from app.config.logging_config import configure_logging, request_id_var, shutdown_logging
+from app.config.settings import settings
+from app.services import fund_catalog, fund_stats, ledger_service, notification_sweep, warmup
+from app.services.funds_service import notification_outbox
+from app.utils import admission, aio, metrics
 import logging
-import traceback
-import time
+import random
+import uuid
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('/tmp/api.log', mode='a')
-    ]
-)
+configure_logging()
 
 logger = logging.getLogger("fondos-api")
 
 app = FastAPI()
 
+@app.on_event("startup")
+def warm_up():
+    if not settings.warmup_on_startup:
+        return
+    try:
+        warmup.warm_up()
+    except Exception as e:
+        logger.error("Warm-up failed, clients will connect on first use: %s", e)
+
+@app.on_event("startup")
+def preload_fund_catalog():
+    if not settings.fund_cache_preload or settings.warmup_on_startup:
+        return
+    try:
+        fund_catalog.preload()
+    except Exception as e:
+        logger.error("Fund catalog preload failed, falling back to lazy loading: %s", e)
+
+# Periodic jobs run in one process per instance: app.server hands them to a single worker.
+@app.on_event("startup")
+def start_fund_stats_reconciler():
+    if settings.background_jobs:
+        fund_stats.start_reconciler()
+
+@app.on_event("startup")
+def start_balance_snapshotter():
+    if settings.background_jobs:
+        ledger_service.start_snapshotter()
+
+@app.on_event("startup")
+def start_notification_sweeper():
+    if settings.background_jobs:
+        notification_sweep.start_sweeper()
+
+@app.on_event("shutdown")
+def drain_notification_outbox():
+    fund_stats.stop_reconciler()
+    ledger_service.stop_snapshotter()
+    notification_sweep.stop_sweeper()
+    notification_outbox.stop()
+    aio.shutdown()
+    shutdown_logging()
+
+# Load balancer probes do not count as the first request in the startup report.
+PROBE_PATHS = {"/health", "/v1/funds/health", "/metrics"}
+
+def _sampled(rate: float) -> bool:
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+@app.exception_handler(admission.Rejected)
+async def admission_rejected(request: Request, exc: admission.Rejected):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+# Registered before log_requests so that it runs inside it: shed requests are
+# still logged and measured, but never reach a handler or the I/O pool.
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    if not admission.applies(request.url.path):
+        return await call_next(request)
+    try:
+        admission.admit()
+    except admission.Rejected as e:
+        return await admission_rejected(request, e)
+    started = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        admission.release(time.perf_counter() - started, request.url.path)
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    
-    logger.info(f"🔵 REQUEST: {request.method} {request.url}")
-    logger.info(f"🔵 Headers: {dict(request.headers)}")
-    
-    if request.method in ["POST", "PUT", "PATCH"]:
-        body = await request.body()
-        if body:
-            logger.info(f"🔵 Body: {body.decode('utf-8')}")
-
-        async def receive():
-            return {"type": "http.request", "body": body}
-        
-        request = FastAPIRequest(
-            scope=request.scope,
-            receive=receive
-        )
-    
+    start_time = time.perf_counter()
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    metrics.http_requests_in_flight.inc(method=request.method)
+    status = 500
+
     try:
+        if _sampled(settings.log_headers_sample_rate):
+            logger.info("Headers: %s", dict(request.headers))
+
+        # The body is only read (and the request re-wrapped to replay it) when sampled.
+        if request.method in ["POST", "PUT", "PATCH"] and _sampled(settings.log_body_sample_rate):
+            body = await request.body()
+            if body:
+                logger.info("Body: %s", body[:settings.log_body_max_bytes].decode('utf-8', errors='replace'))
+
+            async def receive():
+                return {"type": "http.request", "body": body}
+
+            request = FastAPIRequest(
+                scope=request.scope,
+                receive=receive
+            )
+
         response = await call_next(request)
-        process_time = time.time() - start_time
-        
-        logger.info(f"RESPONSE: {response.status_code} - {process_time:.3f}s")
-        
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        logger.info("%s %s %s %.3fs", request.method, request.url.path, response.status_code,
+                    time.perf_counter() - start_time)
         return response
-        
+
     except Exception as e:
-        process_time = time.time() - start_time
-        logger.error(f"ERROR: {str(e)} - {process_time:.3f}s")
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        
+        logger.exception("%s %s failed after %.3fs: %s", request.method, request.url.path,
+                         time.perf_counter() - start_time, e)
+
         return JSONResponse(
             status_code=500,
+            headers={"X-Request-ID": request_id},
             content={
                 "detail": "Internal server error",
                 "error": str(e),
                 "timestamp": time.time()
             }
         )
+    finally:
+        elapsed = time.perf_counter() - start_time
+        metrics.http_requests_in_flight.dec(method=request.method)
+        # Label by route template, not raw path, to keep cardinality bounded.
+        route = request.scope.get("route")
+        metrics.http_request_duration.observe(elapsed, method=request.method,
+                                              route=getattr(route, "path", "unmatched"), status=status)
+        if warmup.first_request_pending() and request.url.path not in PROBE_PATHS:
+            warmup.record_first_request(elapsed)
+        request_id_var.reset(token)
 
 app.add_middleware(
     CORSMiddleware,
@@ -86,4 +172,11 @@ async def options_handler(request: Request, full_path: str):
 def health_check():
     return {"status": "healthy", "service": "fondos-api"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 app.include_router(funds.router)
+app.include_router(clients.router)
+
+warmup.record("import", time.perf_counter() - _import_started)
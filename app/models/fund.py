@@ -1,6 +1,6 @@
 from decimal import Decimal
 from pydantic import BaseModel, EmailStr, Field
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 class FundTransactionRequest(BaseModel):
@@ -19,6 +19,20 @@ class FundTransactionResponse(BaseModel):
     new_balance: float
     timestamp: datetime
 
+class BatchTransactionRequest(BaseModel):
+    operations: List[FundTransactionRequest] = Field(..., min_length=1)
+
+class BatchOperationResult(BaseModel):
+    index: int
+    status: Literal["ok", "error"]
+    transaction: Optional[FundTransactionResponse] = None
+    error: Optional[str] = None
+
+class BatchTransactionResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchOperationResult]
+
 class TransactionHistoryModel(BaseModel):
     transaction_id: str
     user_id: str
@@ -28,6 +42,24 @@ class TransactionHistoryModel(BaseModel):
     amount: Decimal
     notification: bool
 
+class TransactionHistoryPage(BaseModel):
+    items: List[TransactionHistoryModel]
+    next_cursor: Optional[str] = None
+
+
+class FundModel(BaseModel):
+    id_fund: str
+    name: str
+    minimum_amount: float
+    category: Optional[str] = None
+    description: Optional[str] = None
+
+
+class FundStats(BaseModel):
+    id_fund: str
+    subscribers: int
+    committed_capital: float
+
 
 class ClientModel(BaseModel):
     user_id: str 
@@ -37,3 +69,26 @@ class ClientModel(BaseModel):
     balance: float 
 
 
+
+
+class PortfolioHolding(BaseModel):
+    id_fund: str
+    name: Optional[str] = None
+    category: Optional[str] = None
+    amount: float
+    subscribed_at: Optional[datetime] = None
+
+
+class ClientPortfolio(BaseModel):
+    user_id: str
+    balance: float
+    holdings: List[PortfolioHolding]
+    total_committed: float
+
+
+class ClientBalance(BaseModel):
+    user_id: str
+    at: datetime
+    balance: float
+    snapshot_at: Optional[datetime] = None
+    replayed: int
@@ -0,0 +1,43 @@
+import threading
+
+from app.config.settings import settings
+from app.repositories.base import (BackendThrottled, BalanceUpdate, FundStatsCheck, FundStatsDelta, HistoryFilter,
+                                   HistoryPut, IdempotencyPut, Storage, SubscriptionDelete, SubscriptionPut,
+                                   TransactionConflict, pending_notification_key, relation_key)
+
+# One storage backend per process, chosen by STORAGE_BACKEND on first use and
+# swappable for tests and local stand-ins (same pattern as app.utils.aws).
+_lock = threading.Lock()
+_storage = None
+
+BACKENDS = ("dynamodb", "memory")
+
+
+def build_storage(backend: str = None) -> Storage:
+    backend = (backend or settings.storage_backend).lower()
+    if backend == "dynamodb":
+        from app.repositories.dynamodb import DynamoDBStorage
+        return DynamoDBStorage()
+    if backend == "memory":
+        from app.repositories.memory import MemoryStorage
+        return MemoryStorage(seed_file=settings.storage_seed_file or None)
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+
+def get_storage() -> Storage:
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                _storage = build_storage()
+    return _storage
+
+
+def set_storage(storage: Storage):
+    global _storage
+    with _lock:
+        _storage = storage
+
+
+def reset():
+    set_storage(None)
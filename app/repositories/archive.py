@@ -0,0 +1,193 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from typing import List, Optional
+from urllib.parse import urlparse
+
+from app.config.settings import settings
+
+# Cold tier of TransactionHistory: one partition per UTC day
+# ("date=YYYY-MM-DD/"), holding a few large immutable parts and a manifest
+# indexing them. A part's rows are sorted by (user, timestamp, id) and cut into
+# row groups; each group is a separate gzip member, columnar inside - one JSON
+# array per attribute - so repetitive columns (fund ids, types) shrink well.
+# The manifest records every group's byte range and first/last user, so a read
+# lists the dates once, skips the ones outside its range and, within a date,
+# fetches only the groups that can hold its user.
+
+PART_SUFFIX = ".json.gz"
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 2
+
+
+def encode_group(items: List[dict]) -> bytes:
+    """One row group: a self-contained gzip member, so groups concatenate into a part."""
+    columns = sorted({name for item in items for name in item})
+    data = {name: [item.get(name) for item in items] for name in columns}
+    # Amounts stay exact: Decimal columns are stored as strings and restored on read.
+    decimals = [name for name in columns if any(isinstance(value, Decimal) for value in data[name])]
+    for name in decimals:
+        data[name] = [None if value is None else str(value) for value in data[name]]
+    document = {"version": FORMAT_VERSION, "rows": len(items), "decimal_columns": decimals, "columns": data}
+    return gzip.compress(json.dumps(document, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_group(payload: bytes) -> List[dict]:
+    document = json.loads(gzip.decompress(payload))
+    data = document["columns"]
+    for name in document["decimal_columns"]:
+        data[name] = [None if value is None else Decimal(value) for value in data[name]]
+    rows = []
+    for i in range(document["rows"]):
+        rows.append({name: values[i] for name, values in data.items() if values[i] is not None})
+    return rows
+
+
+def empty_manifest() -> dict:
+    return {"version": FORMAT_VERSION, "parts": []}
+
+
+def encode_manifest(manifest: dict) -> bytes:
+    return json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+
+
+def decode_manifest(payload: bytes) -> dict:
+    return json.loads(payload)
+
+
+class ArchiveStore(ABC):
+    @abstractmethod
+    def dates(self) -> List[str]:
+        """Every partition date (``YYYY-MM-DD``) with at least one archived object."""
+
+    @abstractmethod
+    def read(self, date: str, name: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        """``length`` bytes of an object from ``start`` (all of it by default); FileNotFoundError if missing."""
+
+    @abstractmethod
+    def write(self, date: str, name: str, payload: bytes):
+        """Store an object; it only becomes visible once completely written."""
+
+
+class LocalArchiveStore(ArchiveStore):
+    """Parts on local disk; also the stand-in for the object store in local runs."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _partition_dir(self, date: str) -> str:
+        return os.path.join(self.root, f"date={date}")
+
+    def dates(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[len("date="):] for name in os.listdir(self.root) if name.startswith("date="))
+
+    def read(self, date: str, name: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        with open(os.path.join(self._partition_dir(date), name), "rb") as f:
+            f.seek(start)
+            return f.read() if length is None else f.read(length)
+
+    def write(self, date: str, name: str, payload: bytes):
+        directory = self._partition_dir(date)
+        os.makedirs(directory, exist_ok=True)
+        # Temp file + rename: readers never see a half-written part or manifest.
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(temp_path, os.path.join(directory, name))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+class S3ArchiveStore(ArchiveStore):
+    def __init__(self, bucket: str, prefix: str = ""):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+
+    def _key(self, date: str, name: str) -> str:
+        return f"{self.prefix}date={date}/{name}"
+
+    def dates(self) -> List[str]:
+        from app.utils.aws import get_s3_client
+
+        # One delimited listing of the top level: a page covers 1000 days.
+        prefix = self.prefix + "date="
+        pages = get_s3_client().get_paginator("list_objects_v2").paginate(
+            Bucket=self.bucket, Prefix=prefix, Delimiter="/")
+        return sorted(entry["Prefix"][len(prefix):].rstrip("/")
+                      for page in pages for entry in page.get("CommonPrefixes", []))
+
+    def read(self, date: str, name: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        from botocore.exceptions import ClientError
+        from app.utils.aws import get_s3_client
+
+        params = {"Bucket": self.bucket, "Key": self._key(date, name)}
+        if start or length is not None:
+            params["Range"] = f"bytes={start}-" + ("" if length is None else str(start + length - 1))
+        try:
+            response = get_s3_client().get_object(**params)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                raise FileNotFoundError(params["Key"]) from e
+            raise
+        return response["Body"].read()
+
+    def write(self, date: str, name: str, payload: bytes):
+        from app.utils.aws import get_s3_client
+
+        # A PUT is atomic: the object is visible whole or not at all.
+        content_type = "application/json" if name == MANIFEST else "application/gzip"
+        get_s3_client().put_object(Bucket=self.bucket, Key=self._key(date, name), Body=payload,
+                                   ContentType=content_type)
+
+
+def build_archive_store(uri: str = None) -> Optional[ArchiveStore]:
+    """``s3://bucket/prefix`` or a local path (``file://`` optional); empty disables the archive."""
+    uri = settings.history_archive_uri if uri is None else uri
+    if not uri:
+        return None
+    parsed = urlparse(uri)
+    if parsed.scheme == "s3":
+        return S3ArchiveStore(parsed.netloc, parsed.path)
+    if parsed.scheme in ("", "file"):
+        return LocalArchiveStore(parsed.path if parsed.scheme else uri)
+    raise ValueError(f"Unsupported HISTORY_ARCHIVE_URI {uri!r}; expected s3://bucket/prefix or a local path")
+
+
+# Built on first use and swappable, like the storage backend.
+_lock = threading.Lock()
+_store: Optional[ArchiveStore] = None
+_configured = False
+
+
+def get_archive_store() -> Optional[ArchiveStore]:
+    global _store, _configured
+    if not _configured:
+        with _lock:
+            if not _configured:
+                _store = build_archive_store()
+                _configured = True
+    return _store
+
+
+def set_archive_store(store: Optional[ArchiveStore]):
+    global _store, _configured
+    with _lock:
+        _store = store
+        _configured = True
+
+
+def reset():
+    global _store, _configured
+    with _lock:
+        _store = None
+        _configured = False
+
@@ -0,0 +1,244 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class TransactionConflict(Exception):
+    """A conditional write inside ``Storage.transact`` failed; nothing was applied.
+
+    ``reasons`` has one entry per write, in order: "ConditionalCheckFailed" for the
+    writes whose condition did not hold and "None" for the others.
+    """
+
+    def __init__(self, reasons: List[str]):
+        super().__init__(f"Transaction cancelled [{', '.join(reasons)}]")
+        self.reasons = reasons
+
+
+class BackendThrottled(RuntimeError):
+    """The backend refused the call for capacity reasons, even after retries; worth retrying later."""
+
+
+# Writes accepted by Storage.transact. Each one carries its own condition.
+
+class BalanceUpdate(NamedTuple):
+    """Set the client's balance, only if it still equals ``expected``."""
+    user_id: str
+    expected: float
+    new: float
+
+
+class SubscriptionPut(NamedTuple):
+    """Create the relation; with ``replace`` the relation must already exist instead."""
+    user_id: str
+    id_fund: str
+    replace: bool = False
+
+
+class SubscriptionDelete(NamedTuple):
+    """Delete the relation, which must exist."""
+    user_id: str
+    id_fund: str
+
+
+class HistoryPut(NamedTuple):
+    """Insert a TransactionHistory row."""
+    item: dict
+
+
+class IdempotencyPut(NamedTuple):
+    """Store a replayable response, only if ``key`` is unused or its record has expired."""
+    key: str
+    record: dict
+    now: int  # epoch seconds; records with expires_at < now count as unused
+
+
+class FundStatsDelta(NamedTuple):
+    """Add to one shard of a fund's counters; unconditional, so hot funds never conflict.
+
+    With ``expected_version`` it only applies while the shard is still at that
+    version (0 = never written); reconciliation uses it, the request path does not.
+    """
+    id_fund: str
+    subscribers: int
+    committed: float
+    shard: int = 0
+    expected_version: Optional[int] = None
+
+
+class FundStatsCheck(NamedTuple):
+    """Write nothing, but require one shard of a fund's counters to still be at ``version``."""
+    id_fund: str
+    shard: int
+    version: int
+
+
+class HistoryFilter(NamedTuple):
+    user_id: Optional[str] = None
+    id_fund: Optional[str] = None
+    start: Optional[str] = None  # ISO-8601 UTC, inclusive
+    end: Optional[str] = None
+    transaction_type: Optional[str] = None
+
+
+def relation_key(user_id: str, id_fund: str) -> str:
+    return f"{user_id}#{id_fund}"
+
+
+def pending_notification_key(timestamp: str, shard: int) -> str:
+    """Partition of the sparse pending-notification index: the row's UTC day plus a shard."""
+    return f"{timestamp[:10]}#{shard}"
+
+
+def relation_item(user_id: str, id_fund: str) -> dict:
+    return {
+        'user_id#fund_id': relation_key(user_id, id_fund),
+        'user_id': user_id,
+        'id_fund': id_fund,
+        'subscribed_at': datetime.now(timezone.utc).isoformat()
+    }
+
+
+class ClientRepository(ABC):
+    @abstractmethod
+    def get(self, user_id: str, consistent: bool = False) -> Optional[dict]:
+        """One client; ``consistent`` asks for a strongly consistent read."""
+
+    @abstractmethod
+    def get_many(self, user_ids: Iterable[str]) -> List[dict]:
+        """Strongly consistent read of several clients; missing ones are left out."""
+
+    @abstractmethod
+    def list_ids(self) -> List[str]:
+        """Every client id (a full read of the table; meant for background jobs)."""
+
+    @abstractmethod
+    def update_balance(self, user_id: str, new_balance: float):
+        ...
+
+
+class FundRepository(ABC):
+    @abstractmethod
+    def get(self, id_fund: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def get_many(self, id_funds: Iterable[str]) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def list_all(self) -> List[dict]:
+        ...
+
+
+class RelationRepository(ABC):
+    @abstractmethod
+    def get(self, user_id: str, id_fund: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def get_many(self, pairs: Iterable[Tuple[str, str]]) -> List[dict]:
+        """Strongly consistent read of several (user_id, id_fund) relations."""
+
+    @abstractmethod
+    def list_for_user(self, user_id: str) -> List[dict]:
+        """Every relation of one user, read from the user_id index."""
+
+    @abstractmethod
+    def count_by_fund(self) -> Dict[str, int]:
+        """Subscribers per fund, counted over the whole table (reconciliation only)."""
+
+    @abstractmethod
+    def put(self, user_id: str, id_fund: str):
+        ...
+
+    @abstractmethod
+    def delete(self, user_id: str, id_fund: str):
+        ...
+
+
+class HistoryRepository(ABC):
+    @abstractmethod
+    def put_many(self, items: List[dict]) -> int:
+        """Insert rows; returns the number of backend round trips."""
+
+    @abstractmethod
+    def query(self, filters: HistoryFilter, limit: int,
+              start_key: Optional[dict] = None) -> Tuple[List[dict], Optional[dict]]:
+        """Read up to ``limit`` rows, then apply the non-key filters.
+
+        Rows come newest first when filtered by user. Like a DynamoDB page, fewer
+        than ``limit`` rows may match; the returned key resumes right after the
+        last row examined and is None at the end.
+        """
+
+    @abstractmethod
+    def mark_notified(self, keys: List[dict]) -> int:
+        """Set ``notification`` on the rows addressed by ``{"transaction_id": ...}`` keys; returns how many.
+
+        The rows also leave the pending-notification index. Best effort: missing
+        rows are skipped and failures logged, never raised.
+        """
+
+    @abstractmethod
+    def pending_notifications(self, partition: str, start: str, end: str, limit: int,
+                              start_key: Optional[dict] = None) -> Tuple[List[dict], Optional[dict]]:
+        """Rows of one pending-notification partition with ``start <= timestamp <= end``, oldest first."""
+
+    @abstractmethod
+    def claim_notification(self, transaction_id: str, enqueued_at: str, now: str) -> bool:
+        """Move ``notification_enqueued_at`` from ``enqueued_at`` to ``now`` while the row is still pending.
+
+        False when the row was delivered, deleted or claimed by someone else since it was read.
+        """
+
+    @abstractmethod
+    def delete_many(self, keys: List[dict]) -> int:
+        """Remove the rows addressed by ``{"transaction_id": ...}`` keys; returns the backend round trips."""
+
+
+class IdempotencyRepository(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        """Strongly consistent read of a stored record, expired or not."""
+
+
+class FundStatsRepository(ABC):
+    @abstractmethod
+    def get(self, id_fund: str) -> dict:
+        """``subscribers`` and ``committed_capital`` summed over the fund's shards (zero if none).
+
+        ``versions`` maps each written shard to its version, which every write bumps.
+        """
+
+    @abstractmethod
+    def add(self, delta: FundStatsDelta):
+        ...
+
+
+class BalanceSnapshotRepository(ABC):
+    @abstractmethod
+    def latest_before(self, user_id: str, at: str) -> Optional[dict]:
+        """The newest snapshot taken at or before ``at`` (UTC ISO timestamp)."""
+
+    @abstractmethod
+    def earliest_after(self, user_id: str, at: str) -> Optional[dict]:
+        """The oldest snapshot taken strictly after ``at``."""
+
+    @abstractmethod
+    def put(self, item: dict):
+        ...
+
+
+class Storage(ABC):
+    clients: ClientRepository
+    funds: FundRepository
+    relations: RelationRepository
+    history: HistoryRepository
+    idempotency: IdempotencyRepository
+    fund_stats: FundStatsRepository
+    balance_snapshots: BalanceSnapshotRepository
+
+    @abstractmethod
+    def transact(self, writes: List[NamedTuple]):
+        """Apply every write atomically or raise TransactionConflict."""
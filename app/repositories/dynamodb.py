@@ -0,0 +1,405 @@
+import logging
+from collections import Counter
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from app.config.settings import settings
+from app.repositories.base import (BackendThrottled, BalanceSnapshotRepository, BalanceUpdate, ClientRepository, FundRepository, FundStatsCheck,
+                                   FundStatsDelta, FundStatsRepository, HistoryFilter, HistoryPut, HistoryRepository, IdempotencyPut,
+                                   IdempotencyRepository, RelationRepository, Storage, SubscriptionDelete,
+                                   SubscriptionPut, TransactionConflict, relation_item, relation_key)
+from app.repositories.tables import (BALANCE_SNAPSHOTS_TABLE, CLIENTS_TABLE, FUND_STATS_TABLE, FUNDS_TABLE, IDEMPOTENCY_TABLE,
+                                     RELATIONS_TABLE, TRANSACTIONS_TABLE)
+from app.utils.admission import THROTTLE_CODES
+from app.utils.aws import backend_error, get_dynamodb_client, get_table
+from app.utils.batch import batch_get, batch_write
+
+logger = logging.getLogger("dynamodb-storage")
+
+
+def cancellation_reasons(error: ClientError) -> list:
+    reasons = error.response.get("CancellationReasons")
+    if reasons is not None:
+        return [reason.get("Code", "None") for reason in reasons]
+    # Older botocore versions only report the reasons inside the message.
+    message = error.response["Error"].get("Message", "")
+    if "[" in message:
+        return [code.strip() for code in message[message.rindex("[") + 1:message.rindex("]")].split(",")]
+    return []
+
+
+class DynamoDBClientRepository(ClientRepository):
+    def get(self, user_id: str, consistent: bool = False) -> Optional[dict]:
+        try:
+            return get_table(CLIENTS_TABLE).get_item(Key={'user_id': user_id},
+                                                     ConsistentRead=consistent).get('Item')
+        except ClientError as e:
+            raise backend_error(e, "Error accessing Clients table")
+
+    def get_many(self, user_ids: Iterable[str]) -> List[dict]:
+        return batch_get(CLIENTS_TABLE, [{'user_id': user_id} for user_id in user_ids], True)
+
+    def list_ids(self) -> List[str]:
+        user_ids = []
+        scan_kwargs = {"ProjectionExpression": "user_id"}
+        try:
+            while True:
+                response = get_table(CLIENTS_TABLE).scan(**scan_kwargs)
+                user_ids.extend(item["user_id"] for item in response.get("Items", []))
+                if "LastEvaluatedKey" not in response:
+                    return user_ids
+                scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except ClientError as e:
+            raise backend_error(e, "Error listing clients")
+
+    def update_balance(self, user_id: str, new_balance: float):
+        try:
+            get_table(CLIENTS_TABLE).update_item(
+                Key={'user_id': user_id},
+                UpdateExpression="SET balance = :balance",
+                ExpressionAttributeValues={':balance': Decimal(str(new_balance))}
+            )
+        except ClientError as e:
+            raise backend_error(e, "Failed to update balance")
+
+
+class DynamoDBFundRepository(FundRepository):
+    def get(self, id_fund: str) -> Optional[dict]:
+        try:
+            return get_table(FUNDS_TABLE).get_item(Key={'id_fund': id_fund}).get('Item')
+        except ClientError as e:
+            logger.exception("DynamoDB client error when retrieving fund.")
+            raise backend_error(e, "Error retrieving fund")
+
+    def get_many(self, id_funds: Iterable[str]) -> List[dict]:
+        return batch_get(FUNDS_TABLE, [{'id_fund': id_fund} for id_fund in id_funds])
+
+    def list_all(self) -> List[dict]:
+        items = []
+        scan_kwargs = {}
+        try:
+            while True:
+                response = get_table(FUNDS_TABLE).scan(**scan_kwargs)
+                items.extend(response.get('Items', []))
+                if 'LastEvaluatedKey' not in response:
+                    return items
+                scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except ClientError as e:
+            logger.exception("DynamoDB client error when listing funds.")
+            raise backend_error(e, "Error listing funds")
+
+
+class DynamoDBRelationRepository(RelationRepository):
+    def get(self, user_id: str, id_fund: str) -> Optional[dict]:
+        response = get_table(RELATIONS_TABLE).get_item(Key={'user_id#fund_id': relation_key(user_id, id_fund)})
+        return response.get('Item')
+
+    def get_many(self, pairs: Iterable[Tuple[str, str]]) -> List[dict]:
+        keys = sorted({relation_key(user_id, id_fund) for user_id, id_fund in pairs})
+        return batch_get(RELATIONS_TABLE, [{'user_id#fund_id': key} for key in keys], True)
+
+    def list_for_user(self, user_id: str) -> List[dict]:
+        params = {
+            "IndexName": settings.relations_user_index,
+            "KeyConditionExpression": Key("user_id").eq(user_id),
+        }
+        items = []
+        try:
+            while True:
+                response = get_table(RELATIONS_TABLE).query(**params)
+                items.extend(response.get("Items", []))
+                if "LastEvaluatedKey" not in response:
+                    return items
+                params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except ClientError as e:
+            raise backend_error(e, "Error reading subscriptions")
+
+    def count_by_fund(self) -> Dict[str, int]:
+        counts = Counter()
+        params = {"ProjectionExpression": "id_fund"}
+        try:
+            while True:
+                response = get_table(RELATIONS_TABLE).scan(**params)
+                counts.update(item["id_fund"] for item in response.get("Items", []))
+                if "LastEvaluatedKey" not in response:
+                    return dict(counts)
+                params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except ClientError as e:
+            raise backend_error(e, "Error counting subscriptions")
+
+    def put(self, user_id: str, id_fund: str):
+        get_table(RELATIONS_TABLE).put_item(Item=relation_item(user_id, id_fund))
+
+    def delete(self, user_id: str, id_fund: str):
+        get_table(RELATIONS_TABLE).delete_item(Key={'user_id#fund_id': relation_key(user_id, id_fund)})
+
+
+def _history_request(filters: HistoryFilter) -> dict:
+    conditions = []
+    if filters.id_fund:
+        conditions.append(Attr("id_fund").eq(filters.id_fund))
+    if filters.transaction_type:
+        conditions.append(Attr("transaction_type").eq(filters.transaction_type))
+
+    if filters.user_id:
+        key_condition = Key("user_id").eq(filters.user_id)
+        if filters.start and filters.end:
+            key_condition &= Key("timestamp").between(filters.start, filters.end)
+        elif filters.start:
+            key_condition &= Key("timestamp").gte(filters.start)
+        elif filters.end:
+            key_condition &= Key("timestamp").lte(filters.end)
+        request = {
+            "IndexName": settings.history_user_index,
+            "KeyConditionExpression": key_condition,
+            "ScanIndexForward": False,
+        }
+    else:
+        # Without a user there is no partition to query; fall back to a paginated scan.
+        if filters.start:
+            conditions.append(Attr("timestamp").gte(filters.start))
+        if filters.end:
+            conditions.append(Attr("timestamp").lte(filters.end))
+        request = {}
+
+    if conditions:
+        expression = conditions[0]
+        for condition in conditions[1:]:
+            expression &= condition
+        request["FilterExpression"] = expression
+    return request
+
+
+class DynamoDBHistoryRepository(HistoryRepository):
+    def put_many(self, items: List[dict]) -> int:
+        return batch_write(TRANSACTIONS_TABLE, puts=items)
+
+    def query(self, filters: HistoryFilter, limit: int,
+              start_key: Optional[dict] = None) -> Tuple[List[dict], Optional[dict]]:
+        table = get_table(TRANSACTIONS_TABLE)
+        operation = table.query if filters.user_id else table.scan
+        params = dict(_history_request(filters), Limit=limit)
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        try:
+            response = operation(**params)
+        except ClientError as e:
+            raise backend_error(e, "Error reading transaction history")
+        return response.get("Items", []), response.get("LastEvaluatedKey")
+
+    def mark_notified(self, keys: List[dict]) -> int:
+        # One conditional update per row: a row that is gone (compacted, or never
+        # written) is not recreated as a stub, one failure does not undo the others,
+        # and a plain write costs half a transactional one for a best-effort flag.
+        table = get_table(TRANSACTIONS_TABLE)
+        marked = 0
+        for key in keys:
+            try:
+                table.update_item(
+                    Key=key,
+                    UpdateExpression="SET notification = :notification REMOVE notification_pending",
+                    ConditionExpression="attribute_exists(transaction_id)",
+                    ExpressionAttributeValues={":notification": True}
+                )
+                marked += 1
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                    logger.warning("History row %s does not exist, not marking it notified.", key)
+                else:
+                    logger.error("Could not mark history row %s notified: %s", key, e)
+        return marked
+
+    def pending_notifications(self, partition: str, start: str, end: str, limit: int,
+                              start_key: Optional[dict] = None) -> Tuple[List[dict], Optional[dict]]:
+        params = {
+            "IndexName": settings.history_pending_index,
+            "KeyConditionExpression": Key("notification_pending").eq(partition) & Key("timestamp").between(start, end),
+            "Limit": limit
+        }
+        if start_key:
+            params["ExclusiveStartKey"] = start_key
+        try:
+            response = get_table(TRANSACTIONS_TABLE).query(**params)
+        except ClientError as e:
+            raise backend_error(e, "Error reading pending notifications")
+        return response.get("Items", []), response.get("LastEvaluatedKey")
+
+    def claim_notification(self, transaction_id: str, enqueued_at: str, now: str) -> bool:
+        try:
+            get_table(TRANSACTIONS_TABLE).update_item(
+                Key={"transaction_id": transaction_id},
+                UpdateExpression="SET notification_enqueued_at = :now",
+                ConditionExpression="attribute_exists(notification_pending) AND notification_enqueued_at = :seen",
+                ExpressionAttributeValues={":now": now, ":seen": enqueued_at}
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise backend_error(e, "Error claiming a pending notification")
+        return True
+
+    def delete_many(self, keys: List[dict]) -> int:
+        return batch_write(TRANSACTIONS_TABLE, deletes=keys)
+
+
+class DynamoDBIdempotencyRepository(IdempotencyRepository):
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            response = get_table(IDEMPOTENCY_TABLE).get_item(Key={'idempotency_key': key}, ConsistentRead=True)
+        except ClientError as e:
+            raise backend_error(e, "Error reading idempotency key")
+        return response.get('Item')
+
+
+def _fund_stats_version(version: int) -> dict:
+    # Shards that were never written (or predate versions) have no version attribute.
+    if not version:
+        return {"ConditionExpression": "attribute_not_exists(#version)"}
+    return {"ConditionExpression": "#version = :version", "ExpressionAttributeValues": {":version": version}}
+
+
+def _fund_stats_update(delta: FundStatsDelta) -> dict:
+    update = {
+        "Key": {"id_fund": delta.id_fund, "shard": delta.shard},
+        "UpdateExpression": "ADD subscribers :subscribers, committed_capital :committed, #version :one",
+        "ExpressionAttributeNames": {"#version": "version"},
+        "ExpressionAttributeValues": {
+            ":subscribers": delta.subscribers,
+            ":committed": Decimal(str(delta.committed)),
+            ":one": 1
+        }
+    }
+    if delta.expected_version is not None:
+        condition = _fund_stats_version(delta.expected_version)
+        update["ConditionExpression"] = condition["ConditionExpression"]
+        update["ExpressionAttributeValues"].update(condition.get("ExpressionAttributeValues", {}))
+    return update
+
+
+class DynamoDBFundStatsRepository(FundStatsRepository):
+    def get(self, id_fund: str) -> dict:
+        # One partition holds every shard of the fund: a single Query sums them.
+        try:
+            response = get_table(FUND_STATS_TABLE).query(KeyConditionExpression=Key("id_fund").eq(id_fund))
+        except ClientError as e:
+            raise backend_error(e, "Error reading fund stats")
+        items = response.get("Items", [])
+        return {
+            "subscribers": int(sum(item.get("subscribers", 0) for item in items)),
+            "committed_capital": sum((item.get("committed_capital", Decimal(0)) for item in items), Decimal(0)),
+            "versions": {int(item["shard"]): int(item.get("version", 0)) for item in items}
+        }
+
+    def add(self, delta: FundStatsDelta):
+        try:
+            get_table(FUND_STATS_TABLE).update_item(**_fund_stats_update(delta))
+        except ClientError as e:
+            raise backend_error(e, "Error updating fund stats")
+
+
+class DynamoDBBalanceSnapshotRepository(BalanceSnapshotRepository):
+    def _first(self, key_condition, forward: bool) -> Optional[dict]:
+        try:
+            response = get_table(BALANCE_SNAPSHOTS_TABLE).query(
+                KeyConditionExpression=key_condition, ScanIndexForward=forward, Limit=1)
+        except ClientError as e:
+            raise backend_error(e, "Error reading balance snapshots")
+        items = response.get("Items", [])
+        return items[0] if items else None
+
+    def latest_before(self, user_id: str, at: str) -> Optional[dict]:
+        return self._first(Key("user_id").eq(user_id) & Key("at").lte(at), forward=False)
+
+    def earliest_after(self, user_id: str, at: str) -> Optional[dict]:
+        return self._first(Key("user_id").eq(user_id) & Key("at").gt(at), forward=True)
+
+    def put(self, item: dict):
+        try:
+            get_table(BALANCE_SNAPSHOTS_TABLE).put_item(Item=item)
+        except ClientError as e:
+            raise backend_error(e, "Error writing balance snapshot")
+
+
+def transact_action(write) -> dict:
+    """Translate a storage write into its TransactWriteItems action."""
+    if isinstance(write, BalanceUpdate):
+        return {
+            "Update": {
+                "TableName": CLIENTS_TABLE,
+                "Key": {"user_id": write.user_id},
+                "UpdateExpression": "SET balance = :balance",
+                "ConditionExpression": "balance = :expected",
+                "ExpressionAttributeValues": {
+                    ":balance": Decimal(str(write.new)),
+                    ":expected": Decimal(str(write.expected))
+                }
+            }
+        }
+    if isinstance(write, SubscriptionPut):
+        return {
+            "Put": {
+                "TableName": RELATIONS_TABLE,
+                "Item": relation_item(write.user_id, write.id_fund),
+                "ConditionExpression": "attribute_exists(#key)" if write.replace else "attribute_not_exists(#key)",
+                "ExpressionAttributeNames": {"#key": "user_id#fund_id"}
+            }
+        }
+    if isinstance(write, SubscriptionDelete):
+        return {
+            "Delete": {
+                "TableName": RELATIONS_TABLE,
+                "Key": {"user_id#fund_id": relation_key(write.user_id, write.id_fund)},
+                "ConditionExpression": "attribute_exists(#key)",
+                "ExpressionAttributeNames": {"#key": "user_id#fund_id"}
+            }
+        }
+    if isinstance(write, HistoryPut):
+        return {"Put": {"TableName": TRANSACTIONS_TABLE, "Item": write.item}}
+    if isinstance(write, FundStatsDelta):
+        return {"Update": dict(_fund_stats_update(write), TableName=FUND_STATS_TABLE)}
+    if isinstance(write, FundStatsCheck):
+        return {
+            "ConditionCheck": dict(
+                _fund_stats_version(write.version),
+                TableName=FUND_STATS_TABLE,
+                Key={"id_fund": write.id_fund, "shard": write.shard},
+                ExpressionAttributeNames={"#version": "version"}
+            )
+        }
+    if isinstance(write, IdempotencyPut):
+        # TTL deletes expired records lazily, so an expired one may still be there.
+        return {
+            "Put": {
+                "TableName": IDEMPOTENCY_TABLE,
+                "Item": dict(write.record, idempotency_key=write.key),
+                "ConditionExpression": "attribute_not_exists(idempotency_key) OR expires_at < :now",
+                "ExpressionAttributeValues": {":now": write.now}
+            }
+        }
+    raise TypeError(f"Unsupported write: {write!r}")
+
+
+class DynamoDBStorage(Storage):
+    def __init__(self):
+        self.clients = DynamoDBClientRepository()
+        self.funds = DynamoDBFundRepository()
+        self.relations = DynamoDBRelationRepository()
+        self.history = DynamoDBHistoryRepository()
+        self.idempotency = DynamoDBIdempotencyRepository()
+        self.fund_stats = DynamoDBFundStatsRepository()
+        self.balance_snapshots = DynamoDBBalanceSnapshotRepository()
+
+    def transact(self, writes: list):
+        try:
+            get_dynamodb_client().transact_write_items(TransactItems=[transact_action(write) for write in writes])
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "TransactionCanceledException":
+                reasons = cancellation_reasons(e)
+                if THROTTLE_CODES.intersection(reasons):
+                    raise BackendThrottled(f"Transaction throttled [{', '.join(reasons)}]")
+                raise TransactionConflict(reasons)
+            logger.exception("Error writing transaction to DynamoDB.")
+            raise backend_error(e, "Error writing transaction")
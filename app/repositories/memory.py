@@ -0,0 +1,380 @@
+import bisect
+import copy
+import json
+import logging
+import threading
+from collections import Counter
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from app.repositories.base import (BalanceSnapshotRepository, BalanceUpdate, ClientRepository, FundRepository, FundStatsCheck,
+                                   FundStatsDelta, FundStatsRepository, HistoryFilter, HistoryPut, HistoryRepository, IdempotencyPut,
+                                   IdempotencyRepository, RelationRepository, Storage, SubscriptionDelete,
+                                   SubscriptionPut, TransactionConflict, relation_item, relation_key)
+
+logger = logging.getLogger("memory-storage")
+
+# In-process storage with the same semantics as the DynamoDB tables: conditional
+# transactions, consistent reads, history newest-first per user with resumable
+# pages. Items are plain dicts with Decimal numbers, as boto3 returns them, and
+# are copied on the way in and out so callers never share state with the store.
+
+
+def _history_key(item: dict) -> str:
+    # TransactionHistory is keyed by transaction_id alone (see iac/template.yaml).
+    return item["transaction_id"]
+
+
+class _MemoryClients(ClientRepository):
+    def __init__(self, storage: "MemoryStorage"):
+        self._storage = storage
+
+    def get(self, user_id: str, consistent: bool = False) -> Optional[dict]:
+        with self._storage.lock:
+            return copy.deepcopy(self._storage.clients_by_id.get(user_id))
+
+    def get_many(self, user_ids: Iterable[str]) -> List[dict]:
+        with self._storage.lock:
+            found = (self._storage.clients_by_id.get(user_id) for user_id in set(user_ids))
+            return [copy.deepcopy(item) for item in found if item is not None]
+
+    def list_ids(self) -> List[str]:
+        with self._storage.lock:
+            return sorted(self._storage.clients_by_id)
+
+    def update_balance(self, user_id: str, new_balance: float):
+        with self._storage.lock:
+            item = self._storage.clients_by_id.setdefault(user_id, {"user_id": user_id})
+            item["balance"] = Decimal(str(new_balance))
+
+
+class _MemoryFunds(FundRepository):
+    def __init__(self, storage: "MemoryStorage"):
+        self._storage = storage
+
+    def get(self, id_fund: str) -> Optional[dict]:
+        with self._storage.lock:
+            return copy.deepcopy(self._storage.funds_by_id.get(id_fund))
+
+    def get_many(self, id_funds: Iterable[str]) -> List[dict]:
+        with self._storage.lock:
+            found = (self._storage.funds_by_id.get(id_fund) for id_fund in set(id_funds))
+            return [copy.deepcopy(item) for item in found if item is not None]
+
+    def list_all(self) -> List[dict]:
+        with self._storage.lock:
+            return copy.deepcopy(list(self._storage.funds_by_id.values()))
+
+
+class _MemoryRelations(RelationRepository):
+    def __init__(self, storage: "MemoryStorage"):
+        self._storage = storage
+
+    def get(self, user_id: str, id_fund: str) -> Optional[dict]:
+        with self._storage.lock:
+            return copy.deepcopy(self._storage.relations_by_key.get(relation_key(user_id, id_fund)))
+
+    def get_many(self, pairs: Iterable[Tuple[str, str]]) -> List[dict]:
+        with self._storage.lock:
+            found = (self._storage.relations_by_key.get(relation_key(*pair)) for pair in set(pairs))
+            return [copy.deepcopy(item) for item in found if item is not None]
+
+    def list_for_user(self, user_id: str) -> List[dict]:
+        with self._storage.lock:
+            keys = self._storage.relations_by_user.get(user_id, ())
+            return [copy.deepcopy(self._storage.relations_by_key[key]) for key in sorted(keys)]
+
+    def count_by_fund(self) -> Dict[str, int]:
+        with self._storage.lock:
+            return dict(Counter(item["id_fund"] for item in self._storage.relations_by_key.values()))
+
+    def put(self, user_id: str, id_fund: str):
+        with self._storage.lock:
+            self._storage.put_relation(relation_item(user_id, id_fund))
+
+    def delete(self, user_id: str, id_fund: str):
+        with self._storage.lock:
+            self._storage.delete_relation(relation_key(user_id, id_fund))
+
+
+class _MemoryHistory(HistoryRepository):
+    def __init__(self, storage: "MemoryStorage"):
+        self._storage = storage
+
+    def put_many(self, items: List[dict]) -> int:
+        with self._storage.lock:
+            for item in items:
+                self._storage.put_history(copy.deepcopy(item))
+        return 0
+
+    def query(self, filters: HistoryFilter, limit: int,
+              start_key: Optional[dict] = None) -> Tuple[List[dict], Optional[dict]]:
+        storage = self._storage
+        with storage.lock:
+            if filters.user_id:
+                entries = storage.history_by_user.get(filters.user_id, [])
+                # Newest first: walk the (timestamp, key) list backwards from the cursor.
+                end = len(entries)
+                if start_key:
+                    try:
+                        end = bisect.bisect_left(entries, (start_key["timestamp"], _history_key(start_key)))
+                    except KeyError:
+                        raise ValueError("Invalid pagination cursor.")
+                candidates = (storage.history_by_key[key] for _, key in reversed(entries[:end]))
+                candidates = (item for item in candidates
+                              if (not filters.start or item["timestamp"] >= filters.start)
+                              and (not filters.end or item["timestamp"] <= filters.end))
+                key_names = ("transaction_id", "user_id", "timestamp")
+            else:
+                try:
+                    position = bisect.bisect_right(storage.history_order, _history_key(start_key)) if start_key else 0
+                except KeyError:
+                    raise ValueError("Invalid pagination cursor.")
+                candidates = (storage.history_by_key[key] for key in storage.history_order[position:])
+                key_names = ("transaction_id",)
+
+            evaluated = []
+            for item in candidates:
+                if len(evaluated) == limit:
+                    last = evaluated[-1]
+                    return self._filter(evaluated, filters), {name: last[name] for name in key_names}
+                evaluated.append(item)
+            return self._filter(evaluated, filters), None
+
+    @staticmethod
+    def _filter(items: List[dict], filters: HistoryFilter) -> List[dict]:
+        matches = []
+        for item in items:
+            if filters.id_fund and item.get("id_fund") != filters.id_fund:
+                continue
+            if filters.transaction_type and item.get("transaction_type") != filters.transaction_type:
+                continue
+            if not filters.user_id and ((filters.start and item["timestamp"] < filters.start)
+                                        or (filters.end and item["timestamp"] > filters.end)):
+                continue
+            matches.append(copy.deepcopy(item))
+        return matches
+
+    def mark_notified(self, keys: List[dict]) -> int:
+        marked = 0
+        with self._storage.lock:
+            for key in keys:
+                item = self._storage.history_by_key.get(_history_key(key))
+                if item is not None:
+                    item["notification"] = True
+                    item.pop("notification_pending", None)
+                    marked += 1
+        return marked
+
+    def pending_notifications(self, partition: str, start: str, end: str, limit: int,
+                              start_key: Optional[dict] = None) -> Tuple[List[dict], Optional[dict]]:
+        with self._storage.lock:
+            rows = sorted(((item["timestamp"], key) for key, item in self._storage.history_by_key.items()
+                           if item.get("notification_pending") == partition and start <= item["timestamp"] <= end))
+            if start_key:
+                rows = rows[bisect.bisect_right(rows, (start_key["timestamp"], _history_key(start_key))):]
+            page = [copy.deepcopy(self._storage.history_by_key[key]) for _, key in rows[:limit]]
+        if len(rows) > limit:
+            last = page[-1]
+            return page, {name: last[name] for name in ("transaction_id", "notification_pending", "timestamp")}
+        return page, None
+
+    def claim_notification(self, transaction_id: str, enqueued_at: str, now: str) -> bool:
+        with self._storage.lock:
+            item = self._storage.history_by_key.get(transaction_id)
+            if item is None or "notification_pending" not in item or item.get("notification_enqueued_at") != enqueued_at:
+                return False
+            item["notification_enqueued_at"] = now
+            return True
+
+    def delete_many(self, keys: List[dict]) -> int:
+        with self._storage.lock:
+            for key in keys:
+                self._storage.delete_history(_history_key(key))
+        return 0
+
+
+class _MemoryIdempotency(IdempotencyRepository):
+    def __init__(self, storage: "MemoryStorage"):
+        self._storage = storage
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._storage.lock:
+            return copy.deepcopy(self._storage.idempotency_by_key.get(key))
+
+
+class _MemoryFundStats(FundStatsRepository):
+    def __init__(self, storage: "MemoryStorage"):
+        self._storage = storage
+
+    def get(self, id_fund: str) -> dict:
+        with self._storage.lock:
+            stats = dict(self._storage.fund_stats_by_id.get(id_fund)
+                         or {"subscribers": 0, "committed_capital": Decimal(0)})
+            version = self._storage.fund_stats_versions.get(id_fund)
+            stats["versions"] = {0: version} if version else {}
+            return stats
+
+    def add(self, delta: FundStatsDelta):
+        with self._storage.lock:
+            self._storage.add_fund_stats(delta)
+
+
+class _MemoryBalanceSnapshots(BalanceSnapshotRepository):
+    def __init__(self, storage: "MemoryStorage"):
+        self._storage = storage
+
+    def _get(self, user_id: str, times: List[str], position: int) -> Optional[dict]:
+        if 0 <= position < len(times):
+            return copy.deepcopy(self._storage.snapshots_by_key[(user_id, times[position])])
+        return None
+
+    def latest_before(self, user_id: str, at: str) -> Optional[dict]:
+        with self._storage.lock:
+            times = self._storage.snapshot_times.get(user_id, [])
+            return self._get(user_id, times, bisect.bisect_right(times, at) - 1)
+
+    def earliest_after(self, user_id: str, at: str) -> Optional[dict]:
+        with self._storage.lock:
+            times = self._storage.snapshot_times.get(user_id, [])
+            return self._get(user_id, times, bisect.bisect_right(times, at))
+
+    def put(self, item: dict):
+        with self._storage.lock:
+            key = (item["user_id"], item["at"])
+            if key not in self._storage.snapshots_by_key:
+                bisect.insort(self._storage.snapshot_times.setdefault(item["user_id"], []), item["at"])
+            self._storage.snapshots_by_key[key] = copy.deepcopy(item)
+
+
+class MemoryStorage(Storage):
+    """Single-process storage for local runs, tests and single-node deployments."""
+
+    def __init__(self, seed_file: Optional[str] = None):
+        self.lock = threading.RLock()
+        self.clients_by_id: Dict[str, dict] = {}
+        self.funds_by_id: Dict[str, dict] = {}
+        self.relations_by_key: Dict[str, dict] = {}
+        self.relations_by_user: Dict[str, set] = {}
+        self.history_by_key: Dict[str, dict] = {}
+        # Sorted indexes: every history key, and (timestamp, key) per user.
+        self.history_order: List[str] = []
+        self.history_by_user: Dict[str, List[Tuple[str, str]]] = {}
+        self.idempotency_by_key: Dict[str, dict] = {}
+        # Shards only exist to spread DynamoDB writes; here each fund has one counter,
+        # reported as shard 0, whose version counts the writes to it.
+        self.fund_stats_by_id: Dict[str, dict] = {}
+        self.fund_stats_versions: Dict[str, int] = {}
+        # Balance snapshots by (user_id, at), plus each user's snapshot times in order.
+        self.snapshots_by_key: Dict[Tuple[str, str], dict] = {}
+        self.snapshot_times: Dict[str, List[str]] = {}
+
+        self.clients = _MemoryClients(self)
+        self.funds = _MemoryFunds(self)
+        self.relations = _MemoryRelations(self)
+        self.history = _MemoryHistory(self)
+        self.idempotency = _MemoryIdempotency(self)
+        self.fund_stats = _MemoryFundStats(self)
+        self.balance_snapshots = _MemoryBalanceSnapshots(self)
+        if seed_file:
+            self.load(seed_file)
+
+    def load(self, path: str):
+        """Load a data file in DynamoDB JSON (the format of iac/data.json)."""
+        deserializer = TypeDeserializer()
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        def items(name):
+            return [{k: deserializer.deserialize(v) for k, v in item.items()} for item in data.get(name, [])]
+
+        with self.lock:
+            for item in items("clients"):
+                self.clients_by_id[item["user_id"]] = item
+            for item in items("funds"):
+                self.funds_by_id[item["id_fund"]] = item
+            for item in items("relations"):
+                self.put_relation(item)
+            for item in items("history"):
+                self.put_history(item)
+        logger.info("Loaded %s clients and %s funds from %s", len(self.clients_by_id), len(self.funds_by_id), path)
+
+    def put_relation(self, item: dict):
+        key = item["user_id#fund_id"]
+        self.relations_by_key[key] = item
+        self.relations_by_user.setdefault(item["user_id"], set()).add(key)
+
+    def delete_relation(self, key: str):
+        item = self.relations_by_key.pop(key, None)
+        if item is not None:
+            self.relations_by_user.get(item["user_id"], set()).discard(key)
+
+    def put_history(self, item: dict):
+        key = _history_key(item)
+        if key not in self.history_by_key:
+            bisect.insort(self.history_order, key)
+            bisect.insort(self.history_by_user.setdefault(item["user_id"], []), (item["timestamp"], key))
+        self.history_by_key[key] = item
+
+    def delete_history(self, key: str):
+        item = self.history_by_key.pop(key, None)
+        if item is None:
+            return
+        del self.history_order[bisect.bisect_left(self.history_order, key)]
+        entries = self.history_by_user[item["user_id"]]
+        del entries[bisect.bisect_left(entries, (item["timestamp"], key))]
+
+    def add_fund_stats(self, delta: FundStatsDelta):
+        stats = self.fund_stats_by_id.setdefault(delta.id_fund, {"subscribers": 0, "committed_capital": Decimal(0)})
+        stats["subscribers"] += delta.subscribers
+        stats["committed_capital"] += Decimal(str(delta.committed))
+        self.fund_stats_versions[delta.id_fund] = self.fund_stats_versions.get(delta.id_fund, 0) + 1
+
+    def _fund_stats_at(self, id_fund: str, shard: int, version: int) -> bool:
+        return version == (self.fund_stats_versions.get(id_fund, 0) if shard == 0 else 0)
+
+    def _holds(self, write) -> bool:
+        if isinstance(write, BalanceUpdate):
+            client = self.clients_by_id.get(write.user_id)
+            return client is not None and Decimal(str(client.get("balance"))) == Decimal(str(write.expected))
+        if isinstance(write, SubscriptionPut):
+            return (relation_key(write.user_id, write.id_fund) in self.relations_by_key) == write.replace
+        if isinstance(write, SubscriptionDelete):
+            return relation_key(write.user_id, write.id_fund) in self.relations_by_key
+        if isinstance(write, FundStatsDelta):
+            return write.expected_version is None or self._fund_stats_at(write.id_fund, write.shard,
+                                                                        write.expected_version)
+        if isinstance(write, FundStatsCheck):
+            return self._fund_stats_at(write.id_fund, write.shard, write.version)
+        if isinstance(write, HistoryPut):
+            return True
+        if isinstance(write, IdempotencyPut):
+            record = self.idempotency_by_key.get(write.key)
+            return record is None or record["expires_at"] < write.now
+        raise TypeError(f"Unsupported write: {write!r}")
+
+    def _apply(self, write):
+        if isinstance(write, BalanceUpdate):
+            self.clients_by_id[write.user_id]["balance"] = Decimal(str(write.new))
+        elif isinstance(write, SubscriptionPut):
+            self.put_relation(relation_item(write.user_id, write.id_fund))
+        elif isinstance(write, SubscriptionDelete):
+            self.delete_relation(relation_key(write.user_id, write.id_fund))
+        elif isinstance(write, FundStatsDelta):
+            self.add_fund_stats(write)
+        elif isinstance(write, FundStatsCheck):
+            pass
+        elif isinstance(write, IdempotencyPut):
+            self.idempotency_by_key[write.key] = dict(copy.deepcopy(write.record), idempotency_key=write.key)
+        else:
+            self.put_history(copy.deepcopy(write.item))
+
+    def transact(self, writes: list):
+        with self.lock:
+            reasons = ["None" if self._holds(write) else "ConditionalCheckFailed" for write in writes]
+            if "ConditionalCheckFailed" in reasons:
+                raise TransactionConflict(reasons)
+            for write in writes:
+                self._apply(write)
@@ -0,0 +1,9 @@
+# DynamoDB table names. Kept apart from app.repositories.dynamodb so that
+# importing them does not pull in boto3 before the first request needs it.
+CLIENTS_TABLE = 'Clients'
+FUNDS_TABLE = 'Funds'
+RELATIONS_TABLE = 'ClientFundRelation'
+TRANSACTIONS_TABLE = 'TransactionHistory'
+IDEMPOTENCY_TABLE = 'IdempotencyKeys'
+FUND_STATS_TABLE = 'FundStats'
+BALANCE_SNAPSHOTS_TABLE = 'BalanceSnapshots'
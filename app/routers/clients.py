@@ -0,0 +1,50 @@
+import logging
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from app.models.fund import ClientBalance, ClientPortfolio
+from app.repositories import BackendThrottled
+from app.services import ledger_service
+from app.services.portfolio_service import get_portfolio_async
+from app.utils import admission
+
+logger = logging.getLogger("clients-router")
+
+router = APIRouter(prefix="/v1/clients", tags=["Clients"])
+
+@router.get("/{user_id}/portfolio", response_model=ClientPortfolio)
+async def get_portfolio(user_id: str):
+    admission.check_user(user_id)
+    try:
+        return await get_portfolio_async(user_id)
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except BackendThrottled as bt:
+        raise admission.throttled_exception(bt)
+    except RuntimeError as re:
+        logger.error("Portfolio runtime error: %s", re)
+        raise HTTPException(status_code=500, detail=str(re))
+    except Exception as e:
+        logger.error("Portfolio unexpected error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+@router.get("/{user_id}/balance", response_model=ClientBalance)
+async def get_balance(user_id: str, at: Optional[datetime] = None):
+    admission.check_user(user_id)
+    try:
+        return await ledger_service.balance_at_async(user_id, at)
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except BackendThrottled as bt:
+        raise admission.throttled_exception(bt)
+    except RuntimeError as re:
+        logger.error("Balance runtime error: %s", re)
+        raise HTTPException(status_code=500, detail=str(re))
+
+@router.post("/admin/balance/snapshots")
+def take_balance_snapshots(at: Optional[datetime] = None):
+    try:
+        return ledger_service.take_snapshots(at)
+    except RuntimeError as re:
+        logger.error("Balance snapshot error: %s", re)
+        raise HTTPException(status_code=500, detail=str(re))
@@ -1,15 +1,23 @@
-from decimal import Decimal
+import itertools
 import logging
 from datetime import datetime
-from typing import List
-from fastapi import APIRouter, HTTPException
-from app.models.fund import FundTransactionRequest, FundTransactionResponse, TransactionHistoryModel
-from app.services.funds_service import create_transaction
-import boto3
-import os
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.config.settings import settings
+from app.models.fund import (BatchTransactionRequest, BatchTransactionResponse, FundModel, FundStats,
+                            FundTransactionRequest, FundTransactionResponse, TransactionHistoryPage)
+from app.repositories import BackendThrottled
+from app.services.batch_service import apply_batch_async
+from app.services import fund_catalog, fund_stats, history_archive, notification_sweep
+from app.services.funds_service import create_transaction_async
+from app.services.idempotency import IdempotencyKeyReused
+from app.services.history_service import iter_transactions, list_transactions_async
+from app.utils import admission
+from app.utils.export import EXPORT_MEDIA_TYPES, EXPORT_WRITERS
+from app.utils.serialization import FastJSONResponse
 
 logger = logging.getLogger("funds-router")
-logging.basicConfig(level=logging.INFO)
 
 router = APIRouter(prefix="/v1/funds", tags=["Funds"])
 
@@ -17,77 +25,200 @@ router = APIRouter(prefix="/v1/funds", tags=["Funds"])
 def health_check():
     return {"status": "ok", "service": "funds-api"}
 
+@router.get("", response_model=List[FundModel])
+def list_funds():
+    try:
+        return fund_catalog.list_funds()
+    except BackendThrottled as bt:
+        raise admission.throttled_exception(bt)
+    except Exception as e:
+        logger.error("Error listing funds: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to list funds: {str(e)}")
+
+@router.get("/admin/cache")
+def fund_cache_stats():
+    return fund_catalog.cache_stats()
+
+@router.post("/admin/cache/invalidate")
+def invalidate_fund_cache(id_fund: Optional[str] = None):
+    fund_catalog.invalidate(id_fund)
+    return {"invalidated": id_fund or "all"}
+
+@router.post("/admin/stats/reconcile")
+def reconcile_fund_stats():
+    try:
+        return {"repaired": fund_stats.reconcile()}
+    except RuntimeError as re:
+        logger.error("Fund stats reconciliation error: %s", re)
+        raise HTTPException(status_code=500, detail=str(re))
+
+@router.post("/admin/history/compact")
+def compact_history(older_than_days: Optional[int] = Query(default=None, ge=0)):
+    try:
+        return history_archive.compact(older_than_days)
+    except RuntimeError as re:
+        logger.error("History compaction error: %s", re)
+        raise HTTPException(status_code=500, detail=str(re))
+
+@router.post("/admin/notifications/redrive")
+def redrive_notifications():
+    try:
+        return notification_sweep.redrive()
+    except RuntimeError as re:
+        logger.error("Notification sweep error: %s", re)
+        raise HTTPException(status_code=500, detail=str(re))
+
+@router.get("/{id_fund}/stats", response_model=FundStats)
+async def get_fund_stats(id_fund: str):
+    try:
+        return await fund_stats.get_fund_stats_async(id_fund)
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    except BackendThrottled as bt:
+        raise admission.throttled_exception(bt)
+    except RuntimeError as re:
+        logger.error("Fund stats runtime error: %s", re)
+        raise HTTPException(status_code=500, detail=str(re))
+
 @router.post("/subscribe", response_model=FundTransactionResponse)
-def subscribe(request: FundTransactionRequest):
-    logger.info(f"Subscribe request: {request}")
+async def subscribe(request: FundTransactionRequest,
+                    idempotency_key: Optional[str] = Header(default=None, max_length=255)):
+    logger.debug("Subscribe request: %s", request)
     if request.transaction_type != "subscribe":
         raise HTTPException(status_code=400, detail="Invalid transaction type for this endpoint.")
+    admission.check_user(request.user_id)
 
     try:
-        result = create_transaction(request.user_id, request.id_fund, request.transaction_type, request.notification_type)
-        return FundTransactionResponse(**result)
+        result = await create_transaction_async(request.user_id, request.id_fund, request.transaction_type,
+                                                request.notification_type, idempotency_key=idempotency_key)
+        return FastJSONResponse(result)
+    except IdempotencyKeyReused as e:
+        logger.info("Subscribe rejected: %s", e)
+        raise HTTPException(status_code=422, detail=str(e))
     except ValueError as ve:
-        logger.error(f"Subscribe error: {ve}")
+        logger.info("Subscribe rejected: %s", ve)
         raise HTTPException(status_code=400, detail=str(ve))
+    except BackendThrottled as bt:
+        logger.warning("Subscribe throttled: %s", bt)
+        raise admission.throttled_exception(bt)
     except RuntimeError as re:
-        logger.error(f"Subscribe runtime error: {re}")
+        logger.error("Subscribe runtime error: %s", re)
         raise HTTPException(status_code=500, detail=str(re))
     except Exception as e:
-        logger.error(f"Subscribe unexpected error: {e}")
+        logger.error("Subscribe unexpected error: %s", e)
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 @router.post("/cancel", response_model=FundTransactionResponse)
-def cancel_subscription(request: FundTransactionRequest):
-    logger.info(f"Cancel request: {request}")
+async def cancel_subscription(request: FundTransactionRequest,
+                              idempotency_key: Optional[str] = Header(default=None, max_length=255)):
+    logger.debug("Cancel request: %s", request)
     if request.transaction_type != "cancel":
         raise HTTPException(status_code=400, detail="Invalid transaction type for this endpoint.")
-    
+    admission.check_user(request.user_id)
+
     try:
-        result = create_transaction(request.user_id, request.id_fund, request.transaction_type)
-        return FundTransactionResponse(**result)
+        result = await create_transaction_async(request.user_id, request.id_fund, request.transaction_type,
+                                                idempotency_key=idempotency_key)
+        return FastJSONResponse(result)
+    except IdempotencyKeyReused as e:
+        logger.info("Cancel rejected: %s", e)
+        raise HTTPException(status_code=422, detail=str(e))
     except ValueError as ve:
-        logger.error(f"Cancel error: {ve}")
+        logger.info("Cancel rejected: %s", ve)
         raise HTTPException(status_code=400, detail=str(ve))
+    except BackendThrottled as bt:
+        logger.warning("Cancel throttled: %s", bt)
+        raise admission.throttled_exception(bt)
     except RuntimeError as re:
-        logger.error(f"Cancel runtime error: {re}")
+        logger.error("Cancel runtime error: %s", re)
         raise HTTPException(status_code=500, detail=str(re))
     except Exception as e:
-        logger.error(f"Cancel unexpected error: {e}")
+        logger.error("Cancel unexpected error: %s", e)
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
-@router.get("/history", response_model=List[TransactionHistoryModel])
-def transaction_history():
-    logger.info("Fetching transaction history")
+@router.post("/batch", response_model=BatchTransactionResponse)
+async def batch_transactions(request: BatchTransactionRequest):
+    logger.info("Batch request: %s operations", len(request.operations))
+    if len(request.operations) > settings.batch_max_operations:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch accepts at most {settings.batch_max_operations} operations."
+        )
+
     try:
-        dynamodb_endpoint = os.getenv('DYNAMODB_ENDPOINT_URL')
-        if dynamodb_endpoint:
-            dynamodb = boto3.resource('dynamodb', endpoint_url=dynamodb_endpoint)
-        else:
-            dynamodb = boto3.resource('dynamodb')
-            
-        table = dynamodb.Table('TransactionHistory')
-        response = table.scan()
-        items = response.get("Items", [])
-
-        history = []
-        for item in items:
-            try:
-                id_fund, timestamp_str = item["user_id#fund_id#timestamp"].split("#")[1:]
-                timestamp = datetime.fromisoformat(timestamp_str)
-                history.append(TransactionHistoryModel(
-                    transaction_id=item["transaction_id"],
-                    user_id=item["user_id"],
-                    id_fund=id_fund,
-                    timestamp=timestamp,
-                    transaction_type=item["transaction_type"],
-                    amount=Decimal(str(item["amount"])),
-                    notification=item.get("notification", False)
-                ))
-            except Exception as e:
-                logger.warning(f"Skipping invalid item: {e}")
-
-        history.sort(key=lambda x: x.timestamp, reverse=True)
-        return history
+        results = await apply_batch_async(request.operations)
+    except BackendThrottled as bt:
+        raise admission.throttled_exception(bt)
+    except RuntimeError as re:
+        logger.error("Batch runtime error: %s", re)
+        raise HTTPException(status_code=500, detail=str(re))
     except Exception as e:
-        logger.error(f"Error fetching transaction history: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to fetch transaction history: {str(e)}")
\ No newline at end of file
+        logger.error("Batch unexpected error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+
+    succeeded = sum(1 for result in results if result["status"] == "ok")
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+@router.get("/history", response_model=TransactionHistoryPage)
+async def transaction_history(
+    user_id: Optional[str] = None,
+    id_fund: Optional[str] = None,
+    transaction_type: Optional[Literal["subscribe", "cancel"]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = Query(default=None, ge=1),
+    cursor: Optional[str] = None,
+):
+    logger.debug("Fetching transaction history")
+    admission.check_user(user_id)
+    try:
+        page = await list_transactions_async(
+            user_id=user_id,
+            id_fund=id_fund,
+            start=start,
+            end=end,
+            transaction_type=transaction_type,
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except BackendThrottled as bt:
+        raise admission.throttled_exception(bt)
+    except Exception as e:
+        logger.error("Error fetching transaction history: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch transaction history: {str(e)}")
+    # Rows are already shaped like TransactionHistoryPage; skip the response-model pass.
+    return FastJSONResponse(page)
+
+
+@router.get("/history/export")
+def export_transaction_history(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    user_id: Optional[str] = None,
+    id_fund: Optional[str] = None,
+    transaction_type: Optional[Literal["subscribe", "cancel"]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    logger.info("Exporting transaction history as %s", format)
+    rows = iter_transactions(
+        user_id=user_id,
+        id_fund=id_fund,
+        start=start,
+        end=end,
+        transaction_type=transaction_type
+    )
+    try:
+        # Read the first page up front so backend failures still surface as a 500
+        # instead of a truncated 200 stream.
+        first = list(itertools.islice(rows, 1))
+    except Exception as e:
+        logger.error("Error exporting transaction history: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to export transaction history: {str(e)}")
+
+    return StreamingResponse(
+        EXPORT_WRITERS[format](itertools.chain(first, rows)),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="transaction-history.{format}"'}
+    )
@@ -0,0 +1,299 @@
+import argparse
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+from app.config.settings import settings
+
+logger = logging.getLogger("server")
+
+# Production entry point: one master process binds the port and forks a fixed
+# number of uvicorn workers that accept from the shared socket. The master only
+# supervises: it replaces workers that exit (crashes, or recycling after
+# SERVER_MAX_REQUESTS) and on SIGTERM/SIGINT lets every worker finish its
+# in-flight requests before exiting. With SERVER_PRELOAD the app, boto3's service
+# models and the fund catalog are loaded once in the master and inherited by
+# every worker; connections are not, each worker opens its own pool. Periodic
+# jobs (fund stats reconciliation, balance snapshots, the notification sweep) run
+# in exactly one worker; when it exits, the next worker spawned takes them over.
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# A worker that exits sooner than this after starting is treated as a crash loop.
+MIN_WORKER_LIFETIME = 1.0
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_limit(root: str = CGROUP_ROOT) -> Optional[float]:
+    """CPUs granted by the container's CFS quota (cgroup v2, then v1); None when unlimited."""
+    value = _read(os.path.join(root, "cpu.max"))
+    if value:
+        quota, _, period = value.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota = _read(os.path.join(root, "cpu", "cpu.cfs_quota_us"))
+    period = _read(os.path.join(root, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def memory_limit(root: str = CGROUP_ROOT) -> Optional[int]:
+    """Bytes the container may use (cgroup v2, then v1); None when unlimited."""
+    value = _read(os.path.join(root, "memory.max"))
+    if value is None:
+        value = _read(os.path.join(root, "memory", "memory.limit_in_bytes"))
+    if not value or value == "max":
+        return None
+    limit = int(value)
+    # cgroup v1 reports "unlimited" as a huge page-aligned number.
+    return limit if limit < 1 << 60 else None
+
+
+def available_cpus(root: str = CGROUP_ROOT) -> float:
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    limit = cpu_limit(root)
+    return min(cpus, limit) if limit else cpus
+
+
+def worker_count(root: str = CGROUP_ROOT) -> int:
+    """WEB_CONCURRENCY if set, else one worker per available CPU, capped by the memory limit.
+
+    Workers are async, so one per core keeps every core busy; more only adds
+    context switches. Fractional quotas round to the nearest whole CPU.
+    """
+    if settings.web_concurrency > 0:
+        return settings.web_concurrency
+    workers = max(1, int(available_cpus(root) + 0.5))
+    memory = memory_limit(root)
+    if memory and settings.server_worker_memory_mb > 0:
+        workers = min(workers, max(1, memory // (settings.server_worker_memory_mb * 1024 * 1024)))
+    return workers
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(settings.server_backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload():
+    """Import the app and load everything workers can share read-only before forking."""
+    started = time.perf_counter()
+    import app.main  # noqa: F401  (routes, models, middleware)
+
+    from app.services import fund_catalog
+    from app.utils import aws
+
+    if settings.storage_backend == "dynamodb":
+        # Building the clients parses botocore's service models into the session's
+        # loader cache, which the workers inherit; the clients themselves are dropped.
+        aws.get_dynamodb()
+        if settings.sns_topic_arn or settings.sns_email_topic_arn:
+            aws.get_sns_client()
+    if settings.fund_cache_preload or settings.warmup_on_startup:
+        try:
+            fund_catalog.preload()
+        except Exception as e:
+            logger.error("Fund catalog preload failed, workers will load it lazily: %s", e)
+    aws.drop_clients()
+    logger.info("Preloaded the app in %.3fs.", time.perf_counter() - started)
+
+
+class Master:
+    def __init__(self, sock: socket.socket, workers: int, max_requests: int, max_requests_jitter: int,
+                 graceful_timeout: float):
+        self.sock = sock
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.children: Dict[int, float] = {}
+        self.jobs_pid: Optional[int] = None
+        self.stopping = False
+
+    def _worker_max_requests(self) -> int:
+        # Jitter keeps workers started together from all recycling at the same moment.
+        if self.max_requests <= 0:
+            return 0
+        return self.max_requests + random.randint(0, max(0, self.max_requests_jitter))
+
+    def spawn(self):
+        from app.config.logging_config import configure_logging, shutdown_logging
+
+        max_requests = self._worker_max_requests()
+        background_jobs = settings.background_jobs and self.jobs_pid not in self.children
+        # The log listener thread would not survive the fork: stop it, fork, restart it on both sides.
+        shutdown_logging()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                configure_logging()
+                code = run_worker(self.sock, max_requests, self.graceful_timeout, background_jobs)
+            except BaseException:
+                logger.exception("Worker %s failed.", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        configure_logging()
+        self.children[pid] = time.monotonic()
+        if background_jobs:
+            self.jobs_pid = pid
+        logger.info("Worker %s started (max requests: %s%s).", pid, max_requests or "unlimited",
+                    ", background jobs" if background_jobs else "")
+
+    def _signal(self, signum, frame):
+        if not self.stopping:
+            logger.info("Received %s, draining %s workers.", signal.Signals(signum).name, len(self.children))
+        self.stopping = True
+
+    def reap(self) -> List[int]:
+        exited = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            started = self.children.pop(pid, None)
+            exited.append(pid)
+            lifetime = time.monotonic() - started if started is not None else 0
+            code = os.waitstatus_to_exitcode(status)
+            log = logger.info if code == 0 else logger.warning
+            log("Worker %s exited with %s after %.1fs.", pid, code, lifetime)
+            if lifetime < MIN_WORKER_LIFETIME and not self.stopping:
+                time.sleep(MIN_WORKER_LIFETIME)
+        return exited
+
+    def stop(self):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # uvicorn gives in-flight requests graceful_timeout; allow a little more for shutdown hooks.
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            logger.warning("Worker %s did not stop in time, killing it.", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.children:
+            self.reap()
+            time.sleep(0.05)
+        self.sock.close()
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self._signal)
+        signal.signal(signal.SIGINT, self._signal)
+        while not self.stopping:
+            while len(self.children) < self.workers and not self.stopping:
+                self.spawn()
+            time.sleep(0.2)
+            self.reap()
+        self.stop()
+        logger.info("All workers stopped.")
+        return 0
+
+
+def run_worker(sock: socket.socket, max_requests: int = 0, graceful_timeout: Optional[float] = None,
+               background_jobs: bool = True) -> int:
+    import uvicorn
+
+    from app.utils import aio, aws
+
+    # uvicorn re-raises the signal that stopped it once it has drained; with the
+    # previous handler set to ignore, the worker then exits normally.
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    random.seed()
+    if graceful_timeout is None:
+        graceful_timeout = settings.server_graceful_timeout
+    # Read by the startup hooks, which run after this (even when the app was preloaded).
+    settings.background_jobs = background_jobs
+    # Nothing the master opened is usable here: no executor threads survived the
+    # fork and sockets are per process. Both are rebuilt on first use.
+    aio.shutdown(wait=False)
+    aws.drop_clients()
+
+    from app.main import app
+
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        log_config=None,
+        access_log=False,
+        limit_max_requests=max_requests or None,
+        timeout_graceful_shutdown=graceful_timeout,
+        timeout_keep_alive=settings.server_keep_alive_timeout,
+    )
+    # uvicorn installs its own SIGTERM/SIGINT handlers: stop accepting, drain, run shutdown hooks.
+    uvicorn.Server(config).run(sockets=[sock])
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the API with a pre-fork pool of uvicorn workers.")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: WEB_CONCURRENCY, else sized from CPUs and memory)")
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=settings.server_preload,
+                        help="load the app and shared caches once in the master before forking")
+    parser.add_argument("--max-requests", type=int, default=settings.server_max_requests,
+                        help="recycle a worker after this many requests (0 = never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=settings.server_max_requests_jitter)
+    parser.add_argument("--graceful-timeout", type=float, default=settings.server_graceful_timeout)
+    args = parser.parse_args(argv)
+
+    from app.config.logging_config import configure_logging
+
+    configure_logging()
+    workers = args.workers or worker_count()
+    if settings.storage_backend == "memory" and workers > 1:
+        logger.warning("STORAGE_BACKEND=memory keeps its data per process; running 1 worker instead of %s.",
+                       workers)
+        workers = 1
+    if args.preload:
+        preload()
+
+    sock = _bind(args.host, args.port)
+    logger.info("Listening on %s:%s with %s workers (cpus: %s, cpu limit: %s, memory limit: %s).",
+                args.host, args.port, workers, available_cpus(), cpu_limit(), memory_limit())
+    master = Master(sock, workers, args.max_requests, args.max_requests_jitter, args.graceful_timeout)
+    code = master.run()
+
+    from app.config.logging_config import shutdown_logging
+
+    shutdown_logging()
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
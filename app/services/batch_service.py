@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import List
+
+from app.models.fund import FundTransactionRequest
+from app.repositories import (BalanceUpdate, HistoryPut, SubscriptionDelete, SubscriptionPut, TransactionConflict,
+                              get_storage, relation_key)
+from app.services.client_service import invalidate_client
+from app.services.fund_catalog import get_funds
+from app.services.fund_stats import stats_delta
+from app.services.funds_service import build_transaction_record, enqueue_notification
+from app.utils.aio import run_io
+
+logger = logging.getLogger("batch-service")
+
+# A storage transaction (TransactWriteItems) accepts at most 100 writes.
+MAX_ACTIONS_PER_CLIENT = 100
+
+
+def _relation_actions(user_id: str, touched: set, initially: set, finally_: set, funds: dict) -> list:
+    actions = []
+    for key in sorted(touched):
+        id_fund = key.split("#", 1)[1]
+        amount = float(funds[id_fund]['minimum_amount'])
+        if key in finally_:
+            actions.append(SubscriptionPut(user_id, id_fund, replace=key in initially))
+            if key not in initially:
+                actions.append(stats_delta(id_fund, 1, amount))
+        elif key in initially:
+            actions.append(SubscriptionDelete(user_id, id_fund))
+            actions.append(stats_delta(id_fund, -1, -amount))
+        # Subscribed and cancelled inside the same batch: nothing to write.
+    return actions
+
+
+def _commit_client(user_id: str, expected_balance: float, new_balance: float, relation_actions: list,
+                   history_items: List[dict]):
+    """Apply one client's net balance change, relation changes and history rows atomically."""
+    actions = [BalanceUpdate(user_id, expected_balance, new_balance)] + relation_actions
+    actions += [HistoryPut(item) for item in history_items]
+    if len(actions) > MAX_ACTIONS_PER_CLIENT:
+        raise ValueError("Too many operations for one client in a single batch.")
+    try:
+        get_storage().transact(actions)
+    except TransactionConflict:
+        raise ValueError("Client state changed concurrently, please retry.")
+
+
+async def apply_batch_async(operations: List[FundTransactionRequest]) -> List[dict]:
+    """Apply subscribe/cancel operations in order with a handful of round trips.
+
+    Clients and relations are read with one strongly consistent batch read each
+    (BatchGetItem on DynamoDB) and funds come from the catalog cache. Operations
+    are then applied in memory in request order, each one getting its own result
+    or error. Every client with accepted operations commits its net balance
+    change, relation changes and history rows in one conditional storage
+    transaction (all clients in parallel), so a concurrent single-operation
+    write makes that client's operations fail instead of being overwritten, and
+    a committed balance change never lacks its ledger rows.
+    """
+    storage = get_storage()
+    client_items, funds, relation_items = await asyncio.gather(
+        run_io(storage.clients.get_many, sorted({op.user_id for op in operations})),
+        run_io(get_funds, {op.id_fund for op in operations}),
+        run_io(storage.relations.get_many, {(op.user_id, op.id_fund) for op in operations})
+    )
+
+    initial_balances = {item['user_id']: float(item['balance']) for item in client_items}
+    balances = dict(initial_balances)
+    initially_subscribed = {item['user_id#fund_id'] for item in relation_items}
+    subscribed = set(initially_subscribed)
+
+    results: List[dict] = [None] * len(operations)
+    accepted = defaultdict(list)
+    touched = defaultdict(set)
+
+    for index, op in enumerate(operations):
+        key = relation_key(op.user_id, op.id_fund)
+        try:
+            if op.user_id not in balances:
+                raise ValueError(f"Client {op.user_id} does not exist.")
+            if op.id_fund not in funds:
+                raise ValueError(f"Fund {op.id_fund} not found")
+
+            amount = float(funds[op.id_fund]['minimum_amount'])
+            balance = balances[op.user_id]
+            if op.transaction_type == "subscribe":
+                if key in subscribed:
+                    raise ValueError("User is already subscribed to this fund.")
+                if balance < amount:
+                    raise ValueError(f"Insufficient balance to subscribe to fund {op.id_fund}.")
+                new_balance = balance - amount
+                subscribed.add(key)
+            else:
+                if key not in subscribed:
+                    raise ValueError("User is not subscribed to this fund.")
+                new_balance = balance + amount
+                subscribed.discard(key)
+        except ValueError as e:
+            results[index] = {"index": index, "status": "error", "error": str(e)}
+            continue
+
+        balances[op.user_id] = new_balance
+        touched[op.user_id].add(key)
+        transaction_item, result = build_transaction_record(
+            op.user_id, op.id_fund, op.transaction_type, op.notification_type, amount, new_balance
+        )
+        accepted[op.user_id].append((index, op, transaction_item, result))
+
+    commits = await asyncio.gather(*(
+        run_io(
+            _commit_client,
+            user_id,
+            initial_balances[user_id],
+            balances[user_id],
+            _relation_actions(user_id, touched[user_id], initially_subscribed, subscribed, funds),
+            [entry[2] for entry in accepted[user_id]]
+        )
+        for user_id in accepted
+    ), return_exceptions=True)
+
+    committed = []
+    for user_id, outcome in zip(list(accepted), commits):
+        if isinstance(outcome, Exception):
+            logger.warning("Batch operations for %s rejected: %s", user_id, outcome)
+            for index, _, _, _ in accepted[user_id]:
+                results[index] = {"index": index, "status": "error", "error": str(outcome)}
+            continue
+        invalidate_client(user_id)
+        committed.extend(accepted[user_id])
+
+    for index, op, transaction_item, result in committed:
+        results[index] = {"index": index, "status": "ok", "transaction": result}
+        enqueue_notification(transaction_item, result, op.notification_type)
+
+    logger.info("Batch applied: %s/%s operations committed", len(committed), len(operations))
+    return results
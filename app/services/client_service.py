@@ -1,34 +1,90 @@
-from decimal import Decimal
-import boto3
-import os
-from botocore.exceptions import ClientError
+import threading
 
+from app.config.settings import settings
 from app.models.fund import ClientModel
+from app.repositories import get_storage
+from app.utils.aio import run_io
+from app.utils.cache import TTLCache
+from app.utils.metrics import client_reads
+from app.utils.singleflight import SingleFlight
 
-dynamodb_endpoint = os.getenv('DYNAMODB_ENDPOINT_URL')
-if dynamodb_endpoint:
-    dynamodb = boto3.resource('dynamodb', endpoint_url=dynamodb_endpoint)
-else:
-    dynamodb = boto3.resource('dynamodb')
+# Two read paths. get_client is what subscribe/cancel use: a strongly consistent
+# read, never cached, because the balance it returns is the one the conditional
+# write is checked against. Read-only endpoints use get_client_cached: concurrent
+# misses for one user share a single read, and with CLIENT_CACHE_TTL_MS > 0 the
+# validated model is kept for a few milliseconds. Writes to a client invalidate
+# its entry (in this process; other workers age out within the TTL).
+client_cache = TTLCache(max_size=settings.client_cache_max_size, ttl=settings.client_cache_ttl_ms / 1000)
+_flights = SingleFlight()
 
-client_table = dynamodb.Table('Clients')
+# A load only fills the cache if no write to the client happened while it was in flight.
+_pending = {}
+_pending_lock = threading.Lock()
+
+def _load_client(user_id: str, consistent: bool = False) -> dict:
+    item = get_storage().clients.get(user_id, consistent=consistent)
+    if item is None:
+        raise ValueError(f"Client {user_id} does not exist.")
+    return ClientModel.model_validate(item).model_dump()
 
 def get_client(user_id: str) -> dict:
+    return _load_client(user_id, consistent=True)
+
+async def get_client_async(user_id: str) -> dict:
+    return await run_io(get_client, user_id)
+
+def _fetch_client(user_id: str) -> dict:
+    token = object()
+    with _pending_lock:
+        _pending[user_id] = token
+    client = None
     try:
-        response = client_table.get_item(Key={'user_id': user_id})
-        if 'Item' not in response:
-            raise ValueError(f"Client {user_id} does not exist.")
-        return ClientModel.model_validate(response["Item"]).model_dump()
-    except ClientError as e:
-        raise RuntimeError(f"Error accessing Clients table: {e.response['Error']['Message']}")
+        client = _load_client(user_id)
+    finally:
+        with _pending_lock:
+            if _pending.get(user_id) is token:
+                del _pending[user_id]
+                if client is not None and client_cache.ttl > 0:
+                    client_cache.set(user_id, client)
+    client_reads.inc(source="backend")
+    return client
+
+def _cached(user_id: str):
+    if client_cache.ttl <= 0:
+        return None
+    client = client_cache.get(user_id)
+    if client is not None:
+        client_reads.inc(source="cache")
+    return client
+
+def get_client_cached(user_id: str) -> dict:
+    """A possibly slightly stale client for read-only callers; never use it to decide a balance change."""
+    client = _cached(user_id)
+    if client is not None:
+        return client
+    client, shared = _flights.do(user_id, lambda: _fetch_client(user_id))
+    if shared:
+        client_reads.inc(source="coalesced")
+    return client
+
+async def get_client_cached_async(user_id: str) -> dict:
+    # Cache hits are answered on the event loop without a thread hop.
+    client = _cached(user_id)
+    if client is not None:
+        return client
+    client, shared = await _flights.do_async(user_id, lambda: run_io(_fetch_client, user_id))
+    if shared:
+        client_reads.inc(source="coalesced")
+    return client
+
+def invalidate_client(user_id: str):
+    """Drop the cached client and detach any read of it already in flight."""
+    with _pending_lock:
+        _pending.pop(user_id, None)
+        client_cache.invalidate(user_id)
+    _flights.forget(user_id)
 
 def update_client_balance(user_id: str, new_balance: float):
-    try:
-        client_table.update_item(
-            Key={'user_id': user_id},
-            UpdateExpression="SET balance = :balance",
-            ExpressionAttributeValues={':balance': Decimal(str(new_balance))}
-        )
-        return {"message": "Balance updated successfully."}
-    except ClientError as e:
-        raise RuntimeError(f"Failed to update balance: {e.response['Error']['Message']}")
\ No newline at end of file
+    get_storage().clients.update_balance(user_id, new_balance)
+    invalidate_client(user_id)
+    return {"message": "Balance updated successfully."}
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from app.config.settings import settings
+from app.models.fund import FundModel
+from app.repositories import get_storage
+from app.utils.aio import run_io
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger("fund-catalog")
+
+fund_cache = TTLCache(max_size=settings.fund_cache_max_size, ttl=settings.fund_cache_ttl_seconds)
+
+# Snapshot of the full catalog, kept alongside the per-fund entries so that
+# GET /v1/funds does not re-read the whole table while it is fresh.
+_catalog: Optional[List[dict]] = None
+_catalog_expires_at = 0.0
+_catalog_lock = threading.Lock()
+
+
+def _to_fund(item: dict) -> dict:
+    return FundModel.model_validate(item).model_dump()
+
+
+def get_fund(id_fund: str) -> dict:
+    fund = fund_cache.get(id_fund)
+    if fund is not None:
+        return fund
+    return _load_fund(id_fund)
+
+
+def _load_fund(id_fund: str) -> dict:
+    item = get_storage().funds.get(id_fund)
+    if item is None:
+        logger.error("Fund %s not found in table.", id_fund)
+        raise ValueError(f"Fund {id_fund} not found")
+
+    fund = _to_fund(item)
+    fund_cache.set(id_fund, fund)
+    return fund
+
+
+async def get_fund_async(id_fund: str) -> dict:
+    # Cache hits are answered on the event loop without a thread hop.
+    fund = fund_cache.get(id_fund)
+    if fund is not None:
+        return fund
+    return await run_io(_load_fund, id_fund)
+
+
+def get_funds(id_funds: Iterable[str]) -> Dict[str, dict]:
+    """Resolve many funds at once; cache misses are fetched in one batch read. Unknown ids are omitted."""
+    funds = {}
+    missing = []
+    for id_fund in set(id_funds):
+        fund = fund_cache.get(id_fund)
+        if fund is not None:
+            funds[id_fund] = fund
+        else:
+            missing.append(id_fund)
+
+    if missing:
+        for item in get_storage().funds.get_many(missing):
+            fund = _to_fund(item)
+            fund_cache.set(fund['id_fund'], fund)
+            funds[fund['id_fund']] = fund
+    return funds
+
+
+def list_funds() -> List[dict]:
+    global _catalog, _catalog_expires_at
+
+    with _catalog_lock:
+        if _catalog is not None and _catalog_expires_at > time.monotonic():
+            fund_cache.record(hit=True)
+            return _catalog
+        fund_cache.record(hit=False)
+
+        items = get_storage().funds.list_all()
+        catalog = sorted((_to_fund(item) for item in items), key=lambda fund: fund['id_fund'])
+        for fund in catalog:
+            fund_cache.set(fund['id_fund'], fund)
+
+        _catalog = catalog
+        _catalog_expires_at = time.monotonic() + fund_cache.ttl
+        logger.info("Fund catalog loaded: %s funds", len(catalog))
+        return catalog
+
+
+def preload():
+    list_funds()
+
+
+def invalidate(id_fund: Optional[str] = None):
+    """Drop one fund, or the whole catalog when no id is given.
+
+    Only this process's cache: other workers pick up the change when their entries expire.
+    """
+    global _catalog, _catalog_expires_at
+
+    with _catalog_lock:
+        _catalog = None
+        _catalog_expires_at = 0.0
+        if id_fund:
+            fund_cache.invalidate(id_fund)
+        else:
+            fund_cache.clear()
+    logger.info("Fund catalog cache invalidated: %s", id_fund or 'all')
+
+
+def cache_stats() -> dict:
+    stats = fund_cache.stats()
+    stats["catalog_loaded"] = _catalog is not None and _catalog_expires_at > time.monotonic()
+    return stats
@@ -0,0 +1,122 @@
+import logging
+import random
+import threading
+from decimal import Decimal
+from typing import List, Optional
+
+from app.config.settings import settings
+from app.repositories import FundStatsCheck, FundStatsDelta, TransactionConflict, get_storage
+from app.services.fund_catalog import get_fund, get_fund_async, list_funds
+from app.utils.aio import run_io
+from app.utils.metrics import fund_stats_repairs
+
+logger = logging.getLogger("fund-stats")
+
+# Subscriber count and committed capital per fund, kept as counters that every
+# subscribe/cancel bumps inside its own storage transaction. Committed capital
+# uses the fund minimum at the time of each operation; reconcile() re-derives
+# both counters from ClientFundRelation and the current catalog, like the portfolio.
+
+_reconciler: Optional[threading.Thread] = None
+_stopping = threading.Event()
+
+
+def stats_delta(id_fund: str, subscribers: int, committed: float) -> FundStatsDelta:
+    """A counter write on a random shard, so concurrent operations on one fund do not contend."""
+    return FundStatsDelta(id_fund, subscribers, committed, random.randrange(settings.fund_stats_shards))
+
+
+def _to_stats(id_fund: str, counters: dict) -> dict:
+    return {
+        "id_fund": id_fund,
+        "subscribers": int(counters["subscribers"]),
+        "committed_capital": float(counters["committed_capital"])
+    }
+
+
+def get_fund_stats(id_fund: str) -> dict:
+    get_fund(id_fund)  # unknown funds raise ValueError
+    return _to_stats(id_fund, get_storage().fund_stats.get(id_fund))
+
+
+async def get_fund_stats_async(id_fund: str) -> dict:
+    await get_fund_async(id_fund)
+    return _to_stats(id_fund, await run_io(get_storage().fund_stats.get, id_fund))
+
+
+def _correction(id_fund: str, current: dict, delta_subscribers: int, delta_committed: Decimal) -> list:
+    """The delta, written only if none of the fund's shards changed since ``current`` was read."""
+    versions = current["versions"]
+    checks = [FundStatsCheck(id_fund, shard, versions.get(shard, 0))
+              for shard in sorted(set(versions) | set(range(settings.fund_stats_shards))) if shard != 0]
+    return [FundStatsDelta(id_fund, delta_subscribers, float(delta_committed), 0, versions.get(0, 0))] + checks
+
+
+def reconcile() -> List[dict]:
+    """Bring every fund's counters back in line with ClientFundRelation; returns the corrections.
+
+    Counters are read before the relations are counted, and each correction is
+    a delta conditioned on the fund's shard versions still being the ones read.
+    Every subscribe/cancel bumps a version in the same transaction as its
+    relation write, so a fund that saw traffic while the pass ran is left for the
+    next pass instead of being corrected against a count it is not part of.
+    """
+    storage = get_storage()
+    minimums = {fund["id_fund"]: Decimal(str(fund["minimum_amount"])) for fund in list_funds()}
+    snapshot = {id_fund: storage.fund_stats.get(id_fund) for id_fund in minimums}
+    counts = storage.relations.count_by_fund()
+
+    repairs, busy = [], []
+    for id_fund in sorted(set(minimums) | set(counts)):
+        subscribers = counts.get(id_fund, 0)
+        committed = subscribers * minimums.get(id_fund, Decimal(0))
+        current = snapshot.get(id_fund) or storage.fund_stats.get(id_fund)
+        delta_subscribers = subscribers - int(current["subscribers"])
+        delta_committed = committed - Decimal(str(current["committed_capital"]))
+        if not delta_subscribers and not delta_committed:
+            continue
+        try:
+            storage.transact(_correction(id_fund, current, delta_subscribers, delta_committed))
+        except TransactionConflict:
+            busy.append(id_fund)
+            continue
+        fund_stats_repairs.inc()
+        repairs.append({"id_fund": id_fund, "subscribers": delta_subscribers,
+                        "committed_capital": float(delta_committed)})
+
+    if busy:
+        logger.info("Fund stats changed during reconciliation, left for the next pass: %s", busy)
+    if repairs:
+        logger.warning("Fund stats drift repaired for %s funds: %s", len(repairs), repairs)
+    else:
+        logger.info("Fund stats reconciled, no drift.")
+    return repairs
+
+
+def _run(interval: float):
+    while not _stopping.wait(interval):
+        try:
+            reconcile()
+        except Exception:
+            logger.exception("Fund stats reconciliation failed.")
+
+
+def start_reconciler(interval: float = None):
+    """Reconcile in the background every ``interval`` seconds (run it on one instance only)."""
+    global _reconciler
+    interval = settings.fund_stats_reconcile_interval_seconds if interval is None else interval
+    if interval <= 0 or _reconciler is not None:
+        return
+    _stopping.clear()
+    _reconciler = threading.Thread(target=_run, args=(interval,), name="fund-stats-reconciler", daemon=True)
+    _reconciler.start()
+    logger.info("Fund stats reconciliation every %ss.", interval)
+
+
+def stop_reconciler():
+    global _reconciler
+    if _reconciler is None:
+        return
+    _stopping.set()
+    _reconciler.join(timeout=5)
+    _reconciler = None
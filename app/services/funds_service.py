@@ -1,136 +1,294 @@
-from typing import Optional
+import asyncio
+import random
+from contextlib import contextmanager
+from typing import List, Optional
 import uuid
 import logging
-import os
 from datetime import datetime, timezone
 from decimal import Decimal
 
-import boto3
-from botocore.exceptions import ClientError
-
-from app.models.fund import TransactionHistoryModel
-from app.utils.relations import is_subscribed, create_subscription_record, delete_subscription_record
-from app.services.client_service import get_client, update_client_balance
-from app.utils.notifier import send_fund_notification
+from app.config.settings import settings
+from app.repositories import (BalanceUpdate, HistoryPut, SubscriptionDelete, SubscriptionPut, TransactionConflict,
+                              get_storage, pending_notification_key)
+from app.services.fund_catalog import get_fund, get_fund_async
+from app.services.client_service import get_client, get_client_async, invalidate_client
+from app.services import idempotency
+from app.services.fund_stats import stats_delta
+from app.services.idempotency import DuplicateRequest, IdempotentRequest
+from app.utils.notifier import SnsBatchPublisher, build_fund_notification
+from app.utils.aio import run_io
+from app.utils.metrics import fund_transaction_retries, fund_transaction_stage, fund_transactions
+from app.utils.outbox import NotificationOutbox
 
 logger = logging.getLogger("funds-service")
-logger.setLevel(logging.INFO)
-
-dynamodb_endpoint = os.getenv('DYNAMODB_ENDPOINT_URL')
-if dynamodb_endpoint:
-    dynamodb = boto3.resource('dynamodb', endpoint_url=dynamodb_endpoint)
-else:
-    dynamodb = boto3.resource('dynamodb')
-
-transactions_table = dynamodb.Table('TransactionHistory')
-funds_table = dynamodb.Table('Funds')
 
 
 def get_fund_minimum_amount(id_fund: str) -> float:
-    logger.info(f"Fetching minimum amount for fund {id_fund}")
-    try:
-        response = funds_table.get_item(Key={'id_fund': id_fund})
-        if 'Item' not in response:
-            logger.error(f"Fund {id_fund} not found in table.")
-            raise ValueError(f"Fund {id_fund} not found")
-        amount = float(response['Item']['minimum_amount'])
-        logger.info(f"Minimum amount for fund {id_fund}: {amount}")
-        return amount
-    except ClientError as e:
-        logger.exception("DynamoDB client error when retrieving fund.")
-        raise RuntimeError(f"Error retrieving fund: {e.response['Error']['Message']}")
+    amount = float(get_fund(id_fund)['minimum_amount'])
+    logger.debug("Minimum amount for fund %s: %s", id_fund, amount)
+    return amount
 
 
-def create_transaction(user_id: str, id_fund: str, transaction_type: str, notification_type: Optional[str] = None) -> dict:
-    logger.info(f"Transaction request: user_id={user_id}, id_fund={id_fund}, type={transaction_type}")
+def mark_notified(history_keys: List[dict]):
+    """Flip ``notification`` on delivered history rows."""
+    marked = get_storage().history.mark_notified(history_keys)
+    logger.info("Marked %s of %s transactions as notified.", marked, len(history_keys))
 
-    client = get_client(user_id)
-    balance = float(client["balance"])
-    logger.info(f"Client balance: {balance}")
 
-    fund_minimum = get_fund_minimum_amount(id_fund)
+notification_outbox = NotificationOutbox(
+    publish_batch=SnsBatchPublisher(),
+    on_delivered=mark_notified,
+    workers=settings.outbox_workers,
+    max_attempts=settings.outbox_max_attempts,
+    backoff_seconds=settings.outbox_backoff_seconds,
+    linger_seconds=settings.outbox_linger_seconds
+)
 
-    if transaction_type == "subscribe":
-        logger.info("Processing subscription...")
-        if is_subscribed(user_id, id_fund):
-            logger.warning("User already subscribed.")
-            raise ValueError("User is already subscribed to this fund.")
-        if balance < fund_minimum:
-            logger.warning("Insufficient balance.")
-            raise ValueError("Insufficient balance to subscribe to fund {id_fund}.")
-        new_balance = balance - fund_minimum
-        amount = fund_minimum
-        create_subscription_record(user_id, id_fund)
-        logger.info("Subscription record created.")
-
-    elif transaction_type == "cancel":
-        logger.info("Processing cancellation...")
-        if not is_subscribed(user_id, id_fund):
-            logger.warning("User not subscribed.")
-            raise ValueError("User is not subscribed to this fund.")
-        new_balance = balance + fund_minimum
-        amount = fund_minimum
-        delete_subscription_record(user_id, id_fund)
-        logger.info("Subscription record deleted.")
 
-    else:
-        logger.error(f"Unsupported transaction type: {transaction_type}")
+def _check_transaction_type(transaction_type: str):
+    if transaction_type not in ("subscribe", "cancel"):
+        logger.error("Unsupported transaction type: %s", transaction_type)
         raise ValueError(f"Unsupported transaction type: {transaction_type}")
 
-    update_client_balance(user_id, new_balance)
-    logger.info(f"Client balance updated to {new_balance}")
 
+def build_transaction_record(user_id: str, id_fund: str, transaction_type: str, notification_type: Optional[str],
+                             amount: float, new_balance: float) -> tuple:
+    """Return the TransactionHistory item and the API result for one operation."""
     transaction_id = str(uuid.uuid4())
-    timestamp = datetime.now(timezone.utc).isoformat()
-    logger.info(f"Transaction ID: {transaction_id}, Timestamp: {timestamp}")
+    timestamp = datetime.now(timezone.utc)
+    iso_timestamp = timestamp.isoformat()
 
-    transaction_data = {
+    # Every field comes from validated input or is generated here, so the row is
+    # built directly instead of round-tripping through TransactionHistoryModel.
+    transaction_item = {
+        "id_transaction": f"trans#{transaction_id}",
+        "user_id#fund_id#timestamp": f"{user_id}#{id_fund}#{iso_timestamp}",
         "transaction_id": transaction_id,
         "user_id": user_id,
         "id_fund": id_fund,
-        "timestamp": timestamp,
+        "timestamp": iso_timestamp,
         "transaction_type": transaction_type,
         "amount": Decimal(str(amount)),
         "notification": False
     }
+    if notification_type:
+        # Lets notification_sweep find the row through the sparse pending index (left
+        # on delivery) and re-drive it once it has been enqueued for a grace period.
+        transaction_item["notification_type"] = notification_type
+        transaction_item["notification_pending"] = pending_notification_key(
+            iso_timestamp, random.randrange(settings.outbox_sweep_shards))
+        transaction_item["notification_enqueued_at"] = iso_timestamp
 
-    validated_transaction = TransactionHistoryModel(**transaction_data)
+    result = {
+        'transaction_id': transaction_id,
+        'user_id': user_id,
+        'id_fund': id_fund,
+        'transaction_type': transaction_type,
+        'new_balance': new_balance,
+        'timestamp': timestamp
+    }
+    return transaction_item, result
 
-    item_data = validated_transaction.model_dump()
-    item_data["timestamp"] = validated_transaction.timestamp.isoformat()
 
-    transaction_item = {
-        "id_transaction": f"trans#{validated_transaction.transaction_id}",
-        "user_id#fund_id#timestamp": f"{validated_transaction.user_id}#{validated_transaction.id_fund}#{item_data['timestamp']}",
-        **item_data
+def _prepare_transaction(user_id: str, id_fund: str, transaction_type: str, notification_type: Optional[str],
+                         balance: float, fund_minimum: float,
+                         idempotent: Optional[IdempotentRequest] = None) -> dict:
+    """Validate the operation against the balance we read and build its storage writes."""
+    logger.debug("Client balance: %s", balance)
+    amount = fund_minimum
+
+    if transaction_type == "subscribe":
+        if balance < fund_minimum:
+            logger.debug("Insufficient balance.")
+            raise ValueError(f"Insufficient balance to subscribe to fund {id_fund}.")
+        new_balance = balance - fund_minimum
+        relation_action = SubscriptionPut(user_id, id_fund)
+    else:
+        new_balance = balance + fund_minimum
+        relation_action = SubscriptionDelete(user_id, id_fund)
+
+    transaction_item, result = build_transaction_record(
+        user_id, id_fund, transaction_type, notification_type, amount, new_balance
+    )
+
+    direction = 1 if transaction_type == "subscribe" else -1
+    actions = [
+        BalanceUpdate(user_id, balance, new_balance),
+        relation_action,
+        HistoryPut(transaction_item),
+        stats_delta(id_fund, direction, direction * amount)
+    ]
+    idempotency_write = None
+    if idempotent is not None:
+        idempotency_write = idempotency.record_write(idempotent, result)
+        actions.append(idempotency_write)
+
+    return {
+        "actions": actions,
+        "transaction_item": transaction_item,
+        "result": result,
+        "idempotency_write": idempotency_write
     }
 
+
+def _commit_transaction(plan: dict, attempt: int) -> bool:
+    """Write the plan; False means the balance moved under us and the caller should re-read."""
+    result = plan["result"]
+    try:
+        get_storage().transact(plan["actions"])
+        invalidate_client(result["user_id"])
+        logger.info("Transaction %s committed on attempt %s.", result['transaction_id'], attempt)
+        if plan["idempotency_write"] is not None:
+            idempotency.remember(plan["idempotency_write"])
+        return True
+    except TransactionConflict as e:
+        reasons = e.reasons
+        if plan["idempotency_write"] is not None and reasons[-1] == "ConditionalCheckFailed":
+            # Checked first: the winner also moved the balance and the relation.
+            raise DuplicateRequest()
+        relation_reason = reasons[1] if len(reasons) > 1 else "None"
+        if relation_reason == "ConditionalCheckFailed":
+            if result["transaction_type"] == "subscribe":
+                logger.debug("User already subscribed.")
+                raise ValueError("User is already subscribed to this fund.")
+            logger.debug("User not subscribed.")
+            raise ValueError("User is not subscribed to this fund.")
+
+        # Either the balance moved under us or another transaction held the item.
+        logger.warning("Transaction %s cancelled (%s), attempt %s.", result['transaction_id'], reasons, attempt)
+        return False
+
+
+def enqueue_notification(transaction_item: dict, result: dict, notification_type: Optional[str]):
+    notification = build_fund_notification(
+        result["user_id"], result["id_fund"], result["transaction_type"], notification_type,
+        reference={"transaction_id": transaction_item["transaction_id"]}
+    )
+    if notification is not None:
+        notification_outbox.enqueue(notification)
+
+
+@contextmanager
+def _track_outcome(transaction_type: str):
     try:
-        transactions_table.put_item(Item=transaction_item)
-        logger.info(f"Transaction {transaction_id} recorded successfully.")
-    except ClientError as e:
-        logger.exception("Error writing transaction to DynamoDB.")
-        raise RuntimeError(f"Error writing transaction: {e.response['Error']['Message']}")
+        yield
+    except DuplicateRequest:
+        fund_transactions.inc(transaction_type=transaction_type, outcome="replayed")
+        raise
+    except ValueError:
+        fund_transactions.inc(transaction_type=transaction_type, outcome="rejected")
+        raise
+    except Exception:
+        fund_transactions.inc(transaction_type=transaction_type, outcome="error")
+        raise
+    fund_transactions.inc(transaction_type=transaction_type, outcome="committed")
+
+
+def _idempotent_request(user_id: str, id_fund: str, transaction_type: str, notification_type: Optional[str],
+                        idempotency_key: Optional[str]) -> Optional[IdempotentRequest]:
+    if not idempotency_key:
+        return None
+    return idempotency.idempotent_request(user_id, idempotency_key, id_fund, transaction_type, notification_type)
+
+
+def _replay_duplicate(idempotent: IdempotentRequest) -> dict:
+    result = idempotency.lookup(idempotent)
+    if result is None:
+        raise RuntimeError("Concurrent request with the same Idempotency-Key could not be replayed, please retry.")
+    return result
+
+
+def create_transaction(user_id: str, id_fund: str, transaction_type: str, notification_type: Optional[str] = None,
+                       idempotency_key: Optional[str] = None) -> dict:
+    """Apply a subscribe/cancel in a single storage transaction (one TransactWriteItems call on DynamoDB).
+
+    The balance change, the ClientFundRelation put/delete and the history row
+    commit together. The balance update is conditioned on the value we read, so
+    a concurrent transaction for the same user makes ours retry with a fresh
+    read instead of overwriting its result.
+
+    With an ``idempotency_key`` the response is stored in the same transaction,
+    and a retry with the same key returns it without touching any other table.
+    """
+    logger.debug("Transaction request: user_id=%s, id_fund=%s, type=%s", user_id, id_fund, transaction_type)
+    _check_transaction_type(transaction_type)
+    idempotent = _idempotent_request(user_id, id_fund, transaction_type, notification_type, idempotency_key)
+    if idempotent is not None:
+        replay = idempotency.lookup(idempotent)
+        if replay is not None:
+            return replay
 
     try:
-        send_fund_notification(user_id, id_fund, transaction_type, notification_type)
-        transactions_table.update_item(
-            Key={
-                "id_transaction": f"trans#{transaction_id}",
-                "user_id#fund_id#timestamp": f"{user_id}#{id_fund}#{item_data['timestamp']}"
-            },
-            UpdateExpression="SET notification = :notification",
-            ExpressionAttributeValues={":notification": True}
-        )
-        logger.info("Notification sent and recorded successfully.")
-    except Exception as e:
-        logger.error(f"Failed to send notification, but transaction was recorded: {e}")
+        plan = _run_transaction(user_id, id_fund, transaction_type, notification_type, idempotent)
+    except DuplicateRequest:
+        return _replay_duplicate(idempotent)
+    return plan["result"]
 
-    return {
-        'transaction_id': transaction_id,
-        'user_id': user_id,
-        'id_fund': id_fund,
-        'transaction_type': transaction_type,
-        'new_balance': new_balance,
-        'timestamp': validated_transaction.timestamp
-    }
+
+def _run_transaction(user_id: str, id_fund: str, transaction_type: str, notification_type: Optional[str],
+                     idempotent: Optional[IdempotentRequest]) -> dict:
+    with _track_outcome(transaction_type):
+        with fund_transaction_stage.time(stage="fund_lookup"):
+            fund_minimum = get_fund_minimum_amount(id_fund)
+
+        for attempt in range(1, settings.transaction_max_attempts + 1):
+            with fund_transaction_stage.time(stage="client_lookup"):
+                client = get_client(user_id)
+            plan = _prepare_transaction(user_id, id_fund, transaction_type, notification_type,
+                                        float(client["balance"]), fund_minimum, idempotent)
+            with fund_transaction_stage.time(stage="commit"):
+                committed = _commit_transaction(plan, attempt)
+            if committed:
+                break
+            fund_transaction_retries.inc(transaction_type=transaction_type)
+        else:
+            raise RuntimeError("Client balance changed concurrently, please retry the transaction.")
+
+        with fund_transaction_stage.time(stage="notify_enqueue"):
+            enqueue_notification(plan["transaction_item"], plan["result"], notification_type)
+    return plan
+
+
+async def create_transaction_async(user_id: str, id_fund: str, transaction_type: str,
+                                   notification_type: Optional[str] = None,
+                                   idempotency_key: Optional[str] = None) -> dict:
+    """Async variant of ``create_transaction``; the client and fund reads run concurrently."""
+    logger.debug("Transaction request: user_id=%s, id_fund=%s, type=%s", user_id, id_fund, transaction_type)
+    _check_transaction_type(transaction_type)
+    idempotent = _idempotent_request(user_id, id_fund, transaction_type, notification_type, idempotency_key)
+    if idempotent is not None:
+        replay = await idempotency.lookup_async(idempotent)
+        if replay is not None:
+            return replay
+
+    try:
+        plan = await _run_transaction_async(user_id, id_fund, transaction_type, notification_type, idempotent)
+    except DuplicateRequest:
+        return await run_io(_replay_duplicate, idempotent)
+    return plan["result"]
+
+
+async def _run_transaction_async(user_id: str, id_fund: str, transaction_type: str, notification_type: Optional[str],
+                                 idempotent: Optional[IdempotentRequest]) -> dict:
+    with _track_outcome(transaction_type):
+        with fund_transaction_stage.time(stage="client_fund_lookup"):
+            client, fund = await asyncio.gather(get_client_async(user_id), get_fund_async(id_fund))
+        fund_minimum = float(fund['minimum_amount'])
+
+        for attempt in range(1, settings.transaction_max_attempts + 1):
+            if attempt > 1:
+                fund_transaction_retries.inc(transaction_type=transaction_type)
+                with fund_transaction_stage.time(stage="client_lookup"):
+                    client = await get_client_async(user_id)
+            plan = _prepare_transaction(user_id, id_fund, transaction_type, notification_type,
+                                        float(client["balance"]), fund_minimum, idempotent)
+            with fund_transaction_stage.time(stage="commit"):
+                committed = await run_io(_commit_transaction, plan, attempt)
+            if committed:
+                break
+        else:
+            raise RuntimeError("Client balance changed concurrently, please retry the transaction.")
+
+        with fund_transaction_stage.time(stage="notify_enqueue"):
+            enqueue_notification(plan["transaction_item"], plan["result"], notification_type)
+    return plan
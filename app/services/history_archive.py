@@ -0,0 +1,323 @@
+import argparse
+import logging
+import os
+import pickle
+import tempfile
+import uuid
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.config.settings import settings
+from app.repositories import HistoryFilter, get_storage
+from app.repositories.archive import (
+    MANIFEST, PART_SUFFIX, ArchiveStore, decode_group, decode_manifest, empty_manifest, encode_group,
+    encode_manifest, get_archive_store
+)
+from app.utils.cache import TTLCache
+from app.utils.metrics import history_archive_groups_read, history_archive_rows
+
+logger = logging.getLogger("history-archive")
+
+# Two tiers of TransactionHistory: recent rows in the table, everything older
+# than HISTORY_ARCHIVE_AFTER_DAYS in archive parts partitioned by UTC day.
+# compact() moves whole days from one tier to the other; reads walk the table
+# first and then the archive (newest day first), so a history page or export
+# spans both without the caller knowing where a row lives.
+#
+# Every read lists the archived days once, skips those outside its start/end
+# and, per day, opens only the row groups whose user range covers its user.
+# A read across users visits each group in turn, so an export with no range
+# reads the whole archive, one group in memory at a time.
+
+ARCHIVE_CURSOR = "archive"
+
+# A read location: (date, part, group) in the date's manifest. A user's read takes
+# every covering group of a date at once (part and group -1) to return it newest first.
+Location = Tuple[str, int, int]
+
+# Groups are never rewritten, so a decoded group only leaves the cache by size.
+_groups_cache = TTLCache(max_size=settings.history_archive_cache_groups, ttl=24 * 3600)
+# Only compaction changes the date list and the manifests; other processes see
+# its changes once these entries expire.
+_dates_cache = TTLCache(max_size=16, ttl=300)
+_manifests_cache = TTLCache(max_size=10000, ttl=300)
+
+
+def _timestamp(item: dict) -> str:
+    timestamp = item.get("timestamp")
+    if timestamp is None:
+        timestamp = item["user_id#fund_id#timestamp"].split("#")[2]
+    return timestamp
+
+
+def _user(item: dict) -> str:
+    user_id = item.get("user_id")
+    if user_id is None:
+        user_id = item["user_id#fund_id#timestamp"].split("#")[0]
+    return user_id
+
+
+def partition_of(item: dict) -> str:
+    value = datetime.fromisoformat(_timestamp(item))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).date().isoformat()
+
+
+def compaction_cutoff(older_than_days: Optional[int] = None, now: Optional[datetime] = None) -> datetime:
+    """Start of the UTC day ``older_than_days`` ago: only whole days are archived."""
+    days = settings.history_archive_after_days if older_than_days is None else older_than_days
+    now = now or datetime.now(timezone.utc)
+    return datetime.combine((now - timedelta(days=days)).date(), time.min, tzinfo=timezone.utc)
+
+
+def _dates(store: ArchiveStore) -> List[str]:
+    dates = _dates_cache.get(store)
+    if dates is None:
+        dates = store.dates()
+        _dates_cache.set(store, dates)
+    return dates
+
+
+def _manifest(store: ArchiveStore, date: str, cached: bool = True) -> dict:
+    key = (store, date)
+    manifest = _manifests_cache.get(key) if cached else None
+    if manifest is None:
+        try:
+            manifest = decode_manifest(store.read(date, MANIFEST))
+        except FileNotFoundError:
+            # Parts written by a run that stopped before its manifest are never read.
+            manifest = empty_manifest()
+        _manifests_cache.set(key, manifest)
+    return manifest
+
+
+def _load_group(store: ArchiveStore, date: str, part: dict, group: dict) -> List[dict]:
+    key = (store, date, part["name"], group["offset"])
+    rows = _groups_cache.get(key)
+    if rows is None:
+        rows = decode_group(store.read(date, part["name"], group["offset"], group["length"]))
+        _groups_cache.set(key, rows)
+    return rows
+
+
+def _archived_ids(store: ArchiveStore, date: str, manifest: dict) -> Set[str]:
+    return {row["transaction_id"] for part in manifest["parts"] for group in part["groups"]
+            for row in _load_group(store, date, part, group)}
+
+
+def _write_part(store: ArchiveStore, date: str, rows: List[dict]) -> dict:
+    """Write ``rows`` as one part of row groups sorted by user; returns its manifest entry."""
+    rows.sort(key=lambda item: (_user(item), _timestamp(item), item["transaction_id"]))
+    name = f"part-{uuid.uuid4().hex}{PART_SUFFIX}"
+    payload, groups = bytearray(), []
+    for i in range(0, len(rows), settings.history_archive_group_rows):
+        group = rows[i:i + settings.history_archive_group_rows]
+        data = encode_group(group)
+        groups.append({"offset": len(payload), "length": len(data), "rows": len(group),
+                       "first_user": _user(group[0]), "last_user": _user(group[-1])})
+        payload += data
+    store.write(date, name, bytes(payload))
+    return {"name": name, "rows": len(rows), "groups": groups}
+
+
+def _spill(directory: str, date: str, items: List[dict]):
+    with open(os.path.join(directory, date), "ab") as f:
+        pickle.dump(items, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _spilled(directory: str, date: str) -> Iterator[List[dict]]:
+    with open(os.path.join(directory, date), "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _archive_date(store: ArchiveStore, date: str, batches: Iterable[List[dict]], summary: dict):
+    """Archive one day's rows as a few large parts, publish them, then delete them from the table."""
+    manifest = _manifest(store, date, cached=False)
+    known = _archived_ids(store, date, manifest) if manifest["parts"] else set()
+    keys, fresh, parts = [], [], []
+    for items in batches:
+        for item in items:
+            keys.append({"transaction_id": item["transaction_id"]})
+            if item["transaction_id"] not in known:
+                known.add(item["transaction_id"])
+                fresh.append(item)
+        while len(fresh) >= settings.history_archive_part_rows:
+            parts.append(_write_part(store, date, fresh[:settings.history_archive_part_rows]))
+            fresh = fresh[settings.history_archive_part_rows:]
+    if fresh:
+        parts.append(_write_part(store, date, fresh))
+
+    if parts:
+        # The manifest is written last: readers see the new parts whole or not at all.
+        manifest = {**manifest, "parts": manifest["parts"] + parts}
+        store.write(date, MANIFEST, encode_manifest(manifest))
+        _manifests_cache.set((store, date), manifest)
+        _dates_cache.invalidate(store)
+        archived = sum(part["rows"] for part in parts)
+        summary["archived"] += archived
+        summary["parts"] += len(parts)
+        history_archive_rows.inc(archived, operation="archived")
+    if keys:
+        get_storage().history.delete_many(keys)
+        summary["deleted"] += len(keys)
+
+
+def compact(older_than_days: Optional[int] = None, now: Optional[datetime] = None) -> dict:
+    """Move every history row older than the cutoff into the archive; returns a summary.
+
+    The scan spills rows to a local file per day, so each day is then written as
+    parts of up to HISTORY_ARCHIVE_PART_ROWS rows however the table orders them.
+    A day is archived before its rows are deleted. A run interrupted in between
+    leaves rows in both tiers; the next run skips those already archived and
+    only deletes them, so rerunning is always safe. Run it on one instance.
+    """
+    store = get_archive_store()
+    if store is None:
+        raise RuntimeError("History archive is not configured (HISTORY_ARCHIVE_URI).")
+    cutoff = compaction_cutoff(older_than_days, now)
+    filters = HistoryFilter(end=(cutoff - timedelta(microseconds=1)).isoformat())
+    history_repository = get_storage().history
+
+    summary = {"cutoff": cutoff.isoformat(), "archived": 0, "deleted": 0, "parts": 0, "partitions": []}
+    dates = set()
+    with tempfile.TemporaryDirectory(prefix="history-compaction-") as spill_dir:
+        start_key = None
+        while True:
+            page, start_key = history_repository.query(filters, settings.history_export_page_size, start_key)
+            by_date = defaultdict(list)
+            for item in page:
+                by_date[partition_of(item)].append(item)
+            for date, items in by_date.items():
+                _spill(spill_dir, date, items)
+            dates.update(by_date)
+            if not start_key:
+                break
+
+        for date in sorted(dates):
+            _archive_date(store, date, _spilled(spill_dir, date), summary)
+
+    summary["partitions"] = sorted(dates)
+    logger.info("History compaction up to %s: %s rows archived in %s parts, %s deleted from the table.",
+                summary["cutoff"], summary["archived"], summary["parts"], summary["deleted"])
+    return summary
+
+
+def _in_range(date: str, filters: HistoryFilter) -> bool:
+    # Filter bounds are UTC ISO strings, so their first 10 characters are the partition date.
+    return (not filters.start or date >= filters.start[:10]) and (not filters.end or date <= filters.end[:10])
+
+
+def _covers(group: dict, filters: HistoryFilter) -> bool:
+    return not filters.user_id or group["first_user"] <= filters.user_id <= group["last_user"]
+
+
+def _locations(store: ArchiveStore, filters: HistoryFilter) -> List[Location]:
+    """Locations that can hold matching rows, in read order: newest date first, then part and group."""
+    locations = []
+    for date in sorted((date for date in _dates(store) if _in_range(date, filters)), reverse=True):
+        groups = [(i, j) for i, part in enumerate(_manifest(store, date)["parts"])
+                  for j, group in enumerate(part["groups"]) if _covers(group, filters)]
+        if filters.user_id:
+            locations.extend([(date, -1, -1)] if groups else [])
+        else:
+            locations.extend((date, i, j) for i, j in groups)
+    return locations
+
+
+def _matches(row: dict, filters: HistoryFilter) -> bool:
+    timestamp = _timestamp(row)
+    return ((not filters.user_id or row.get("user_id") == filters.user_id)
+            and (not filters.id_fund or row.get("id_fund") == filters.id_fund)
+            and (not filters.transaction_type or row.get("transaction_type") == filters.transaction_type)
+            and (not filters.start or timestamp >= filters.start)
+            and (not filters.end or timestamp <= filters.end))
+
+
+def _location_rows(store: ArchiveStore, location: Location, filters: HistoryFilter) -> List[dict]:
+    date, part_index, group_index = location
+    parts = _manifest(store, date)["parts"]
+    if group_index < 0:
+        groups = [(part, group) for part in parts for group in part["groups"] if _covers(group, filters)]
+    else:
+        groups = [(parts[part_index], parts[part_index]["groups"][group_index])]
+    history_archive_groups_read.inc(len(groups))
+    rows = [row for part, group in groups for row in _load_group(store, date, part, group) if _matches(row, filters)]
+    rows.sort(key=lambda row: (_timestamp(row), row["transaction_id"]), reverse=True)
+    history_archive_rows.inc(len(rows), operation="read")
+    return rows
+
+
+def start_cursor(filters: HistoryFilter) -> Optional[dict]:
+    """Where a read continues once the table is exhausted; None when no group can match."""
+    store = get_archive_store()
+    if store is None or not _locations(store, filters):
+        return None
+    return {ARCHIVE_CURSOR: {}}
+
+
+def _after(location: Location, position: Location) -> bool:
+    """Whether ``location`` comes at or after ``position`` in read order (date descending, then part and group)."""
+    return location[0] < position[0] or (location[0] == position[0] and location[1:] >= position[1:])
+
+
+def _position(location: Location, offset: int) -> dict:
+    return {ARCHIVE_CURSOR: {"date": location[0], "part": location[1], "group": location[2], "offset": offset}}
+
+
+def read_page(filters: HistoryFilter, limit: int, cursor: dict) -> Tuple[List[dict], Optional[dict]]:
+    """Up to ``limit`` archived rows from ``cursor`` on, and the cursor after them."""
+    store = get_archive_store()
+    position = cursor.get(ARCHIVE_CURSOR)
+    if store is None or not isinstance(position, dict):
+        raise ValueError("Invalid pagination cursor.")
+    locations = _locations(store, filters)
+    if position:
+        try:
+            current = (str(position["date"]), int(position["part"]), int(position["group"]))
+            offset = int(position["offset"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Invalid pagination cursor.")
+        locations = [location for location in locations if _after(location, current)]
+    else:
+        current, offset = None, 0
+
+    rows = []
+    for i, location in enumerate(locations):
+        begin = offset if location == current else 0
+        matching = _location_rows(store, location, filters)
+        taken = matching[begin:begin + limit - len(rows)]
+        rows.extend(taken)
+        if begin + len(taken) < len(matching):
+            return rows, _position(location, begin + len(taken))
+        if len(rows) == limit:
+            following = locations[i + 1:]
+            return rows, _position(following[0], 0) if following else None
+    return rows, None
+
+
+def iter_rows(filters: HistoryFilter) -> Iterator[dict]:
+    """Every matching archived row, one day of a user (or one row group) in memory at a time."""
+    store = get_archive_store()
+    if store is None:
+        return
+    for location in _locations(store, filters):
+        yield from _location_rows(store, location, filters)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Move old transaction history into the archive.")
+    parser.add_argument("--older-than-days", type=int, default=None,
+                        help=f"archive whole UTC days older than this (default {settings.history_archive_after_days})")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    print(compact(args.older_than_days))
+
+
+if __name__ == "__main__":
+    main()
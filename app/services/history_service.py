@@ -0,0 +1,152 @@
+import base64
+import json
+import logging
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Iterator, Optional
+
+from app.config.settings import settings
+from app.models.fund import TransactionHistoryModel
+from app.repositories import HistoryFilter, get_storage
+from app.services import history_archive
+from app.utils.aio import run_io
+
+logger = logging.getLogger("history-service")
+
+
+def encode_cursor(last_evaluated_key: Optional[dict]) -> Optional[str]:
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid pagination cursor.")
+    if not isinstance(key, dict):
+        raise ValueError("Invalid pagination cursor.")
+    return key
+
+
+def _iso_utc(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def to_history_row(item: dict) -> dict:
+    """Shape a stored row like TransactionHistoryModel without validating it again.
+
+    Rows are validated when they are written; reads only normalise types, and the
+    result is serialized directly (see app.utils.serialization).
+    """
+    id_fund = item.get("id_fund")
+    timestamp = item.get("timestamp")
+    if id_fund is None or timestamp is None:
+        # Legacy rows only carry these inside the composite key.
+        id_fund, timestamp = item["user_id#fund_id#timestamp"].split("#")[1:]
+    amount = item["amount"]
+    return {
+        "transaction_id": item["transaction_id"],
+        "user_id": item["user_id"],
+        "id_fund": id_fund,
+        "timestamp": datetime.fromisoformat(timestamp),
+        "transaction_type": item["transaction_type"],
+        "amount": amount if isinstance(amount, Decimal) else Decimal(str(amount)),
+        "notification": item.get("notification", False)
+    }
+
+
+def to_history_model(item: dict) -> TransactionHistoryModel:
+    return TransactionHistoryModel(**to_history_row(item))
+
+
+def _filters(user_id: Optional[str], id_fund: Optional[str], start: Optional[datetime],
+             end: Optional[datetime], transaction_type: Optional[str]) -> HistoryFilter:
+    return HistoryFilter(
+        user_id=user_id,
+        id_fund=id_fund,
+        start=_iso_utc(start) if start else None,
+        end=_iso_utc(end) if end else None,
+        transaction_type=transaction_type
+    )
+
+
+def list_transactions(user_id: Optional[str] = None, id_fund: Optional[str] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      transaction_type: Optional[str] = None, limit: Optional[int] = None,
+                      cursor: Optional[str] = None) -> dict:
+    """Return one page of history (plain rows, see ``to_history_row``), newest first when filtered by user.
+
+    Each storage read asks only for the rows still missing from the page, so the
+    returned cursor always points right after the last row handed back. Selective
+    filters can leave reads nearly empty, so a page stops after
+    HISTORY_MAX_READS_PER_PAGE reads and may come back short with a cursor: fewer
+    rows than ``limit`` never means the history ended, only a null cursor does.
+    Once the table is exhausted the page continues into the archive (see history_archive).
+    """
+    limit = min(limit or settings.history_page_size, settings.history_max_page_size)
+    filters = _filters(user_id, id_fund, start, end, transaction_type)
+    history_repository = get_storage().history
+    start_key = decode_cursor(cursor)
+
+    items = []
+    if not start_key or history_archive.ARCHIVE_CURSOR not in start_key:
+        for _ in range(settings.history_max_reads_per_page):
+            page, start_key = history_repository.query(filters, limit - len(items), start_key)
+            items.extend(page)
+            if not start_key or len(items) >= limit:
+                break
+        if not start_key:
+            start_key = history_archive.start_cursor(filters)
+    if start_key and history_archive.ARCHIVE_CURSOR in start_key and len(items) < limit:
+        page, start_key = history_archive.read_page(filters, limit - len(items), start_key)
+        items.extend(page)
+
+    history = []
+    for item in items:
+        try:
+            history.append(to_history_row(item))
+        except Exception as e:
+            logger.warning("Skipping invalid item: %s", e)
+
+    return {"items": history, "next_cursor": encode_cursor(start_key)}
+
+
+async def list_transactions_async(**kwargs) -> dict:
+    return await run_io(list_transactions, **kwargs)
+
+
+def iter_transactions(user_id: Optional[str] = None, id_fund: Optional[str] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      transaction_type: Optional[str] = None) -> Iterator[TransactionHistoryModel]:
+    """Yield every matching history row, one storage page at a time, then the archived ones.
+
+    Only the current page (or archive row group) is held in memory, so exports stay
+    flat regardless of table size and callers can start writing before the last page is read.
+    """
+    filters = _filters(user_id, id_fund, start, end, transaction_type)
+    history_repository = get_storage().history
+
+    start_key = None
+    while True:
+        page, start_key = history_repository.query(filters, settings.history_export_page_size, start_key)
+        for item in page:
+            try:
+                yield to_history_model(item)
+            except Exception as e:
+                logger.warning("Skipping invalid item: %s", e)
+
+        if not start_key:
+            break
+
+    for item in history_archive.iter_rows(filters):
+        try:
+            yield to_history_model(item)
+        except Exception as e:
+            logger.warning("Skipping invalid item: %s", e)
@@ -0,0 +1,91 @@
+import json
+import logging
+import time
+from typing import NamedTuple, Optional
+
+from app.config.settings import settings
+from app.repositories import IdempotencyPut, get_storage
+from app.utils.aio import run_io
+from app.utils.cache import TTLCache
+from app.utils.metrics import idempotent_replays
+from app.utils.serialization import dumps
+
+logger = logging.getLogger("idempotency")
+
+# Responses of subscribe/cancel calls sent with an Idempotency-Key. The record is
+# written in the same storage transaction as the operation itself, so a retry
+# either finds it here (LRU first, then the IdempotencyKeys table) or loses the
+# conditional put and replays whatever the winning attempt stored.
+idempotency_cache = TTLCache(max_size=settings.idempotency_cache_max_size, ttl=settings.idempotency_ttl_seconds)
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used for a different operation."""
+
+
+class DuplicateRequest(Exception):
+    """A concurrent request with the same key committed first."""
+
+
+class IdempotentRequest(NamedTuple):
+    key: str
+    fingerprint: str
+
+
+def idempotent_request(user_id: str, key: str, id_fund: str, transaction_type: str,
+                       notification_type: Optional[str]) -> IdempotentRequest:
+    # Keys are scoped per user so two clients picking the same key never collide.
+    return IdempotentRequest(f"{user_id}#{key}", f"{transaction_type}|{id_fund}|{notification_type or ''}")
+
+
+def _replay(request: IdempotentRequest, record: dict, source: str) -> dict:
+    if record["fingerprint"] != request.fingerprint:
+        raise IdempotencyKeyReused("Idempotency-Key was already used for a different request.")
+    idempotent_replays.inc(source=source)
+    logger.info("Replaying stored response for idempotency key %s (%s).", request.key, source)
+    return json.loads(record["response"])
+
+
+def remember(write: IdempotencyPut):
+    expires_at = int(write.record["expires_at"])
+    idempotency_cache.set(write.key, write.record, ttl=max(0, expires_at - time.time()))
+
+
+def _load(request: IdempotentRequest) -> Optional[dict]:
+    record = get_storage().idempotency.get(request.key)
+    # DynamoDB TTL removes expired items lazily; treat them as gone.
+    if record is None or int(record["expires_at"]) < time.time():
+        return None
+    remember(IdempotencyPut(request.key, record, int(time.time())))
+    return record
+
+
+def lookup(request: IdempotentRequest) -> Optional[dict]:
+    """Return the stored result for this key, or None when the request is new."""
+    record = idempotency_cache.get(request.key)
+    if record is not None:
+        return _replay(request, record, "cache")
+    record = _load(request)
+    return _replay(request, record, "store") if record is not None else None
+
+
+async def lookup_async(request: IdempotentRequest) -> Optional[dict]:
+    # Cache hits are answered on the event loop without a thread hop.
+    record = idempotency_cache.get(request.key)
+    if record is not None:
+        return _replay(request, record, "cache")
+    record = await run_io(_load, request)
+    return _replay(request, record, "store") if record is not None else None
+
+
+def record_write(request: IdempotentRequest, result: dict) -> IdempotencyPut:
+    """The conditional write that stores ``result`` alongside the operation."""
+    now = int(time.time())
+    record = {
+        "fingerprint": request.fingerprint,
+        # Stored exactly as the first response was sent, so replays are byte-identical.
+        "response": dumps(result).decode("utf-8"),
+        "created_at": now,
+        "expires_at": now + settings.idempotency_ttl_seconds
+    }
+    return IdempotencyPut(request.key, record, now)
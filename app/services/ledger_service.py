@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from app.config.settings import settings
+from app.repositories import get_storage
+from app.services.history_service import iter_transactions
+from app.utils.aio import run_io
+
+logger = logging.getLogger("ledger")
+
+# The balance ledger is TransactionHistory itself: each subscribe debits and each
+# cancel credits the amount on its row, written in the same storage transaction
+# that moves Clients.balance. BalanceSnapshots pins a client's balance at an
+# instant, so a past balance is the nearest snapshot plus (or minus) only the
+# rows between it and the requested time. Balances set outside subscribe/cancel
+# (update_client_balance) bypass the ledger; snapshot right after such a change.
+
+_snapshotter: Optional[threading.Thread] = None
+_stopping = threading.Event()
+
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def ledger_delta(transaction_type: str, amount) -> Decimal:
+    amount = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+    return -amount if transaction_type == "subscribe" else amount
+
+
+def _replay(user_id: str, after: datetime, until: Optional[datetime]) -> Tuple[Decimal, int]:
+    """Net ledger movement of the rows with ``after < timestamp <= until`` (None = up to now)."""
+    total, count = Decimal(0), 0
+    for row in iter_transactions(user_id=user_id, start=after, end=until):
+        if _utc(row.timestamp) <= after:
+            continue
+        total += ledger_delta(row.transaction_type, row.amount)
+        count += 1
+    return total, count
+
+
+def _balance_at(user_id: str, at: datetime) -> Tuple[Decimal, Optional[datetime], int]:
+    storage = get_storage()
+    at_iso = at.isoformat()
+
+    snapshot = storage.balance_snapshots.latest_before(user_id, at_iso)
+    if snapshot is not None:
+        snapshot_at = datetime.fromisoformat(snapshot["at"])
+        delta, replayed = _replay(user_id, snapshot_at, at)
+        return Decimal(str(snapshot["balance"])) + delta, snapshot_at, replayed
+
+    # Before the first snapshot: unwind from the next one instead.
+    snapshot = storage.balance_snapshots.earliest_after(user_id, at_iso)
+    if snapshot is not None:
+        snapshot_at = datetime.fromisoformat(snapshot["at"])
+        delta, replayed = _replay(user_id, at, snapshot_at)
+        return Decimal(str(snapshot["balance"])) - delta, snapshot_at, replayed
+
+    # No snapshot yet: unwind from the live balance (every later row is replayed).
+    client = storage.clients.get(user_id)
+    if client is None:
+        raise ValueError(f"Client {user_id} does not exist.")
+    delta, replayed = _replay(user_id, at, None)
+    return Decimal(str(client["balance"])) - delta, None, replayed
+
+
+def balance_at(user_id: str, at: Optional[datetime] = None) -> dict:
+    """The client's balance as of ``at`` (default now), rebuilt from the nearest snapshot."""
+    at = _utc(at) if at else datetime.now(timezone.utc)
+    balance, snapshot_at, replayed = _balance_at(user_id, at)
+    return {"user_id": user_id, "at": at, "balance": float(balance), "snapshot_at": snapshot_at, "replayed": replayed}
+
+
+async def balance_at_async(user_id: str, at: Optional[datetime] = None) -> dict:
+    return await run_io(balance_at, user_id, at)
+
+
+def take_snapshot(user_id: str, at: datetime) -> Optional[dict]:
+    """Record the balance as of ``at``; None when nothing moved since the previous snapshot.
+
+    ``at`` must be settled (no transaction with an earlier timestamp still in
+    flight), which is why take_snapshots() lags the clock by a settle window.
+    """
+    at = _utc(at)
+    balance, snapshot_at, replayed = _balance_at(user_id, at)
+    if snapshot_at is not None and snapshot_at <= at and not replayed:
+        return None
+    item = {
+        "user_id": user_id,
+        "at": at.isoformat(),
+        "balance": balance,
+        "transactions": replayed,
+        "created_at": int(time.time())
+    }
+    get_storage().balance_snapshots.put(item)
+    return item
+
+
+def take_snapshots(at: Optional[datetime] = None) -> dict:
+    """Snapshot every client as of ``at`` (default: now minus BALANCE_SNAPSHOT_SETTLE_SECONDS)."""
+    at = _utc(at) if at else datetime.now(timezone.utc) - timedelta(seconds=settings.balance_snapshot_settle_seconds)
+    user_ids = get_storage().clients.list_ids()
+    taken = failed = 0
+    for user_id in user_ids:
+        try:
+            taken += take_snapshot(user_id, at) is not None
+        except Exception:
+            failed += 1
+            logger.exception("Balance snapshot failed for %s.", user_id)
+    logger.info("Balance snapshots as of %s: %s taken, %s unchanged, %s failed.",
+                at.isoformat(), taken, len(user_ids) - taken - failed, failed)
+    return {"at": at.isoformat(), "clients": len(user_ids), "taken": taken, "failed": failed}
+
+
+def _run(interval: float):
+    while not _stopping.wait(interval):
+        try:
+            take_snapshots()
+        except Exception:
+            logger.exception("Balance snapshot pass failed.")
+
+
+def start_snapshotter(interval: float = None):
+    """Snapshot every client in the background every ``interval`` seconds (run it on one instance only)."""
+    global _snapshotter
+    interval = settings.balance_snapshot_interval_seconds if interval is None else interval
+    if interval <= 0 or _snapshotter is not None:
+        return
+    _stopping.clear()
+    _snapshotter = threading.Thread(target=_run, args=(interval,), name="balance-snapshotter", daemon=True)
+    _snapshotter.start()
+    logger.info("Balance snapshots every %ss.", interval)
+
+
+def stop_snapshotter():
+    global _snapshotter
+    if _snapshotter is None:
+        return
+    _stopping.set()
+    _snapshotter.join(timeout=5)
+    _snapshotter = None
@@ -0,0 +1,107 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from app.config.settings import settings
+from app.repositories import get_storage, pending_notification_key
+from app.services.funds_service import notification_outbox
+from app.utils.metrics import notifications
+from app.utils.notifier import build_fund_notification
+
+logger = logging.getLogger("notification-sweep")
+
+# The outbox lives in process memory, so whatever it holds is lost when the
+# process crashes, is killed or is recycled, and messages it gives up on after
+# OUTBOX_MAX_ATTEMPTS are dropped. Every history row that asked for a
+# notification carries notification_pending (a day#shard partition of a sparse
+# index) until delivery is recorded, plus notification_enqueued_at. The sweep
+# queries that index over the window and re-enqueues rows enqueued longer than
+# the grace period ago, after moving their notification_enqueued_at to now with a
+# conditional write: a row still queued, or claimed by another sweeper, is skipped.
+# Delivery is at-least-once: a message delivered just before its row is marked
+# can be sent twice.
+
+_sweeper: Optional[threading.Thread] = None
+_stopping = threading.Event()
+
+
+def _days(start: datetime, end: datetime) -> List[str]:
+    days, day = [], start.date()
+    while day <= end.date():
+        days.append(day.isoformat())
+        day += timedelta(days=1)
+    return days
+
+
+def _redrive(item: dict, cutoff: str, now: str) -> bool:
+    if item.get("notification") or not item.get("notification_type"):
+        return False
+    enqueued_at = item.get("notification_enqueued_at") or item["timestamp"]
+    if enqueued_at > cutoff:
+        return False  # may still be in an outbox, or was re-driven recently
+    message = build_fund_notification(
+        item["user_id"], item["id_fund"], item["transaction_type"], item["notification_type"],
+        reference={"transaction_id": item["transaction_id"]}
+    )
+    if message is None or not get_storage().history.claim_notification(item["transaction_id"], enqueued_at, now):
+        return False
+    notification_outbox.enqueue(message)
+    return True
+
+
+def redrive(now: Optional[datetime] = None) -> dict:
+    """Re-enqueue the pending notifications of the rows inside the sweep window; returns a summary."""
+    now = now or datetime.now(timezone.utc)
+    start = now - timedelta(seconds=settings.outbox_sweep_window_seconds)
+    end = now - timedelta(seconds=settings.outbox_sweep_grace_seconds)
+    history_repository = get_storage().history
+
+    summary = {"start": start.isoformat(), "end": end.isoformat(), "read": 0, "redriven": 0}
+    for day in _days(start, end):
+        for shard in range(settings.outbox_sweep_shards):
+            partition = pending_notification_key(day, shard)
+            start_key = None
+            while True:
+                page, start_key = history_repository.pending_notifications(
+                    partition, summary["start"], summary["end"], settings.history_export_page_size, start_key)
+                summary["read"] += len(page)
+                summary["redriven"] += sum(_redrive(item, summary["end"], now.isoformat()) for item in page)
+                if not start_key:
+                    break
+
+    if summary["redriven"]:
+        notifications.inc(summary["redriven"], outcome="redriven")
+        logger.warning("Re-enqueued %s undelivered notifications.", summary["redriven"])
+    else:
+        logger.info("Notification sweep found nothing to re-drive.")
+    return summary
+
+
+def _run(interval: float):
+    while not _stopping.wait(interval):
+        try:
+            redrive()
+        except Exception:
+            logger.exception("Notification sweep failed.")
+
+
+def start_sweeper(interval: float = None):
+    """Sweep in the background every ``interval`` seconds (run it on one instance only)."""
+    global _sweeper
+    interval = settings.outbox_sweep_interval_seconds if interval is None else interval
+    if interval <= 0 or _sweeper is not None:
+        return
+    _stopping.clear()
+    _sweeper = threading.Thread(target=_run, args=(interval,), name="notification-sweep", daemon=True)
+    _sweeper.start()
+    logger.info("Notification sweep every %ss.", interval)
+
+
+def stop_sweeper():
+    global _sweeper
+    if _sweeper is None:
+        return
+    _stopping.set()
+    _sweeper.join(timeout=5)
+    _sweeper = None
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from app.repositories import get_storage
+from app.services.client_service import get_client_cached_async
+from app.services.fund_catalog import get_funds
+from app.utils.aio import run_io
+
+logger = logging.getLogger("portfolio-service")
+
+
+async def get_portfolio_async(user_id: str) -> dict:
+    """Balance and current holdings of a client.
+
+    The client read and the relation query on the user_id index run concurrently;
+    fund details come from the catalog cache. A holding is valued at its fund's
+    current minimum amount, which is what a cancel would refund.
+    """
+    client, relations = await asyncio.gather(
+        get_client_cached_async(user_id),
+        run_io(get_storage().relations.list_for_user, user_id)
+    )
+    funds = await run_io(get_funds, [relation["id_fund"] for relation in relations]) if relations else {}
+
+    holdings = []
+    for relation in relations:
+        fund = funds.get(relation["id_fund"])
+        if fund is None:
+            logger.warning("Subscription %s references unknown fund", relation["user_id#fund_id"])
+        subscribed_at = relation.get("subscribed_at")
+        holdings.append({
+            "id_fund": relation["id_fund"],
+            "name": fund["name"] if fund else None,
+            "category": fund["category"] if fund else None,
+            "amount": fund["minimum_amount"] if fund else 0.0,
+            "subscribed_at": datetime.fromisoformat(subscribed_at) if subscribed_at else None,
+        })
+    holdings.sort(key=lambda holding: holding["id_fund"])
+
+    return {
+        "user_id": user_id,
+        "balance": client["balance"],
+        "holdings": holdings,
+        "total_committed": sum(holding["amount"] for holding in holdings),
+    }
@@ -0,0 +1,58 @@
+import logging
+import time
+
+from app.config.settings import settings
+from app.repositories import get_storage
+from app.services import fund_catalog
+from app.utils import aio
+from app.utils.metrics import startup_seconds
+
+logger = logging.getLogger("startup")
+
+# Cold-start report: how long this process took to import, to warm up and to
+# serve its first request. Exported as app_startup_seconds{phase} and logged.
+_report = {"import": None, "warmup": None, "first_request": None}
+_first_request_seen = False
+
+
+def record(phase: str, seconds: float):
+    _report[phase] = round(seconds, 4)
+    startup_seconds.set(seconds, phase=phase)
+
+
+def report() -> dict:
+    return dict(_report)
+
+
+def first_request_pending() -> bool:
+    return not _first_request_seen
+
+
+def record_first_request(seconds: float):
+    global _first_request_seen
+    if _first_request_seen:
+        return
+    _first_request_seen = True
+    record("first_request", seconds)
+    logger.info("Startup report: %s", report())
+
+
+def warm_up():
+    """Build the storage backend and AWS clients and open pooled connections before serving.
+
+    The concurrent point reads each take a connection from the pool, so the first
+    requests find TCP/TLS sessions already open; the fund catalog is preloaded
+    into its cache on the way.
+    """
+    started = time.perf_counter()
+    storage = get_storage()
+    executor = aio.get_executor()
+    reads = [executor.submit(storage.funds.get, "__warmup__") for _ in range(settings.warmup_connections)]
+    for read in reads:
+        read.result()
+    fund_catalog.preload()
+    if settings.sns_topic_arn or settings.sns_email_topic_arn:
+        from app.utils.aws import get_sns_client
+        get_sns_client()
+    record("warmup", time.perf_counter() - started)
+    logger.info("Warm-up done in %.3fs (%s connections).", _report["warmup"], settings.warmup_connections)
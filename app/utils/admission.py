@@ -0,0 +1,215 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.config.settings import settings
+from app.utils.metrics import admission_concurrency_limit, admission_rejections, backend_throttles
+
+# Admission control for the API: a global and a per-user token bucket, plus a
+# concurrency limit that adapts to the backend (AIMD). Every DynamoDB throttle
+# or slow request shrinks the limit multiplicatively, each fast request grows it
+# by 1/limit. Excess load is refused up front with 429/503 and Retry-After
+# instead of queueing on the I/O pool and slowing every request down.
+
+# Slow by design (a batch of up to 1000 operations, a full export): they still
+# take a slot, but their latency says nothing about the backend and is left out.
+LATENCY_EXEMPT_PATHS = {"/v1/funds/batch", "/v1/funds/history/export"}
+
+THROTTLE_CODES = {
+    "ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded",
+    "Throttling", "TooManyRequestsException",
+    # TransactionCanceledException reasons
+    "ThrottlingError", "ProvisionedThroughputExceeded",
+}
+
+
+class Rejected(Exception):
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Take one token; returns 0 on success, else the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class UserBuckets:
+    """One bucket per user, keeping the ``max_users`` most recently seen."""
+
+    def __init__(self, rate: float, burst: float, max_users: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, user_id: str) -> float:
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > self.max_users:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(user_id)
+        return bucket.take()
+
+
+class AdaptiveLimiter:
+    def __init__(self, min_limit: int, max_limit: int, latency_target: float,
+                 backoff: float = 0.7, cooldown: float = 1.0):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        admission_concurrency_limit.set(self.limit)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: Optional[float]):
+        """Free a slot; ``latency`` None frees it without adjusting the limit."""
+        with self._lock:
+            self.in_flight -= 1
+            if latency is None:
+                return
+            if latency > self.latency_target:
+                self._decrease()
+            elif self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                admission_concurrency_limit.set(self.limit)
+
+    def on_throttle(self):
+        with self._lock:
+            self._decrease()
+
+    def _decrease(self):
+        # At most once per cooldown, so one burst of slow calls is one step down.
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        admission_concurrency_limit.set(self.limit)
+
+
+_global_bucket: Optional[TokenBucket] = None
+_user_buckets: Optional[UserBuckets] = None
+_limiter: Optional[AdaptiveLimiter] = None
+_lock = threading.Lock()
+
+
+def configure():
+    """(Re)build the buckets and the limiter from settings."""
+    global _global_bucket, _user_buckets, _limiter
+    with _lock:
+        _global_bucket = (TokenBucket(settings.admission_global_rate, settings.admission_global_burst)
+                          if settings.admission_global_rate > 0 else None)
+        _user_buckets = (UserBuckets(settings.admission_user_rate, settings.admission_user_burst,
+                                     settings.admission_max_tracked_users)
+                         if settings.admission_user_rate > 0 else None)
+        _limiter = AdaptiveLimiter(settings.admission_min_concurrency, settings.admission_max_concurrency,
+                                   settings.admission_latency_target_seconds)
+
+
+def limiter() -> AdaptiveLimiter:
+    if _limiter is None:
+        configure()
+    return _limiter
+
+
+def _reject(status_code: int, reason: str, detail: str, retry_after: float):
+    admission_rejections.inc(reason=reason)
+    raise Rejected(status_code, reason, detail, retry_after)
+
+
+def applies(path: str) -> bool:
+    """API routes only; probes, metrics and admin endpoints are never shed."""
+    return (settings.admission_enabled and path.startswith("/v1/")
+            and path != "/v1/funds/health" and "/admin/" not in path)
+
+
+def admit():
+    """Take a global token and a concurrency slot; pair every success with ``release``."""
+    limiter()
+    if _global_bucket is not None:
+        wait = _global_bucket.take()
+        if wait:
+            _reject(429, "global_rate", "Too many requests, please retry later.", wait)
+    if not _limiter.try_acquire():
+        _reject(503, "concurrency", "Service is at capacity, please retry shortly.",
+                settings.admission_retry_after_seconds)
+
+
+def release(latency: float, path: str = ""):
+    _limiter.release(None if path in LATENCY_EXEMPT_PATHS else latency)
+
+
+def check_user(user_id: Optional[str]):
+    """Charge one request to ``user_id``'s bucket (no-op when per-user limits are off)."""
+    if not settings.admission_enabled or not user_id:
+        return
+    limiter()
+    if _user_buckets is None:
+        return
+    wait = _user_buckets.take(user_id)
+    if wait:
+        _reject(429, "user_rate", "Too many requests for this user, please retry later.", wait)
+
+
+def throttled_exception(error: Exception) -> HTTPException:
+    """503 + Retry-After for a request whose backend calls stayed throttled after retries."""
+    admission_rejections.inc(reason="backend_throttled")
+    retry_after = max(1, math.ceil(settings.admission_retry_after_seconds))
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(retry_after)})
+
+
+def record_throttle(operation: str):
+    backend_throttles.inc(operation=operation)
+    limiter().on_throttle()
+
+
+def watch_throttling(client, service: str):
+    """Feed every throttled attempt (retries included) of a botocore client into the limiter."""
+    def response_received(parsed_response, context, exception=None, **kwargs):
+        if not parsed_response:
+            return
+        codes = {parsed_response.get("Error", {}).get("Code")}
+        codes.update(reason.get("Code") for reason in parsed_response.get("CancellationReasons") or [])
+        if codes & THROTTLE_CODES:
+            record_throttle(kwargs.get("event_name", "").rsplit(".", 1)[-1])
+
+    client.meta.events.register(f"response-received.{service}", response_received)
+    return client
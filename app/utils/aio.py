@@ -0,0 +1,44 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config.settings import settings
+
+# boto3 is blocking, so async handlers hand each AWS call to a dedicated pool sized
+# like the HTTP connection pool. Starlette's default threadpool (40 threads) is then
+# never held by a request waiting on I/O, and the event loop keeps accepting work.
+# In-flight AWS calls are still capped by this pool's threads (AWS_MAX_POOL_CONNECTIONS),
+# not by the event loop: a native async client (aiobotocore) would lift that cap, but
+# it pins its own botocore version, so the handlers stay async over a sized thread pool.
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.aws_max_pool_connections,
+                    thread_name_prefix="aws-io"
+                )
+    return _executor
+
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking call on the I/O pool, keeping the caller's context variables."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), context.run, call)
+
+
+def shutdown(wait: bool = True):
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
@@ -0,0 +1,160 @@
+import threading
+
+from app.config.settings import settings
+from app.repositories.base import BackendThrottled
+from app.utils.admission import THROTTLE_CODES, watch_throttling
+from app.utils.metrics import instrument_client
+
+# One session, DynamoDB resource, SNS and S3 client per process, built on first use
+# and shared by every module so pooled (TLS) connections are reused across requests.
+# boto3 itself is imported on first use too: it is the bulk of the import time.
+_lock = threading.Lock()
+_session = None
+_dynamodb = None
+_sns = None
+_s3 = None
+_tables = {}
+
+
+def client_config():
+    from botocore.config import Config
+
+    return Config(
+        region_name=settings.aws_region,
+        max_pool_connections=settings.aws_max_pool_connections,
+        connect_timeout=settings.aws_connect_timeout,
+        read_timeout=settings.aws_read_timeout,
+        tcp_keepalive=settings.aws_tcp_keepalive,
+        retries={
+            "mode": settings.aws_retry_mode,
+            "total_max_attempts": settings.aws_max_attempts
+        }
+    )
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import boto3
+
+                _session = boto3.session.Session(region_name=settings.aws_region)
+    return _session
+
+
+def get_dynamodb():
+    global _dynamodb
+    if _dynamodb is None:
+        session = get_session()
+        with _lock:
+            if _dynamodb is None:
+                _dynamodb = session.resource(
+                    "dynamodb",
+                    endpoint_url=settings.dynamodb_endpoint_url or None,
+                    config=client_config()
+                )
+                instrument_client(_dynamodb.meta.client, "dynamodb")
+                watch_throttling(_dynamodb.meta.client, "dynamodb")
+    return _dynamodb
+
+
+def get_dynamodb_client():
+    return get_dynamodb().meta.client
+
+
+def get_table(name: str):
+    table = _tables.get(name)
+    if table is None:
+        table = get_dynamodb().Table(name)
+        _tables[name] = table
+    return table
+
+
+def backend_error(error, context: str) -> RuntimeError:
+    """Wrap a botocore ClientError; throttling becomes BackendThrottled so callers can answer 503."""
+    details = error.response.get("Error", {})
+    message = f"{context}: {details.get('Message', '')}"
+    if details.get("Code") in THROTTLE_CODES:
+        return BackendThrottled(message)
+    return RuntimeError(message)
+
+
+def get_sns_client():
+    global _sns
+    if _sns is None:
+        session = get_session()
+        with _lock:
+            if _sns is None:
+                _sns = instrument_client(session.client(
+                    "sns",
+                    endpoint_url=settings.sns_endpoint_url or None,
+                    config=client_config()
+                ), "sns")
+    return _sns
+
+
+def get_s3_client():
+    global _s3
+    if _s3 is None:
+        session = get_session()
+        with _lock:
+            if _s3 is None:
+                _s3 = instrument_client(session.client(
+                    "s3",
+                    endpoint_url=settings.s3_endpoint_url or None,
+                    config=client_config()
+                ), "s3")
+    return _s3
+
+
+def set_dynamodb(resource):
+    """Swap the shared DynamoDB resource (tests, local stand-ins)."""
+    global _dynamodb
+    with _lock:
+        _dynamodb = resource
+        _tables.clear()
+
+
+def set_sns_client(client):
+    """Swap the shared SNS client (tests, local stand-ins)."""
+    global _sns
+    with _lock:
+        _sns = client
+
+
+def set_s3_client(client):
+    """Swap the shared S3 client (tests, local stand-ins)."""
+    global _s3
+    with _lock:
+        _s3 = client
+
+
+def drop_clients():
+    """Close and forget the clients but keep the session and the service models it has loaded.
+
+    The pre-fork server calls this before forking: pooled sockets must not be
+    shared between processes, so every worker opens its own on first use.
+    """
+    global _dynamodb, _sns, _s3
+    with _lock:
+        clients = [_dynamodb.meta.client if _dynamodb is not None else None, _sns, _s3]
+        _dynamodb = None
+        _sns = None
+        _s3 = None
+        _tables.clear()
+    for client in clients:
+        close = getattr(client, "close", None)
+        if close is not None:
+            close()
+
+
+def reset():
+    """Forget every shared client; the next call rebuilds them from settings."""
+    global _session, _dynamodb, _sns, _s3
+    with _lock:
+        _session = None
+        _dynamodb = None
+        _sns = None
+        _s3 = None
+        _tables.clear()
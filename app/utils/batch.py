@@ -0,0 +1,76 @@
+import logging
+import random
+import time
+from typing import Iterable, List, Optional
+
+from botocore.exceptions import ClientError
+
+from app.repositories.base import BackendThrottled
+from app.utils.aws import backend_error, get_dynamodb
+
+logger = logging.getLogger("dynamodb-batch")
+
+# DynamoDB limits per request.
+BATCH_GET_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _backoff(attempt: int, base: float):
+    delay = base * (2 ** (attempt - 1))
+    time.sleep(delay + random.uniform(0, delay))
+
+
+def batch_get(table_name: str, keys: List[dict], consistent_read: bool = False,
+              max_attempts: int = 8, backoff_seconds: float = 0.05) -> List[dict]:
+    """BatchGetItem every key, 100 per call, retrying UnprocessedKeys with backoff."""
+    items = []
+    for chunk in _chunks(keys, BATCH_GET_LIMIT):
+        request = {table_name: {"Keys": chunk, "ConsistentRead": consistent_read}}
+        for attempt in range(1, max_attempts + 1):
+            try:
+                response = get_dynamodb().batch_get_item(RequestItems=request)
+            except ClientError as e:
+                raise backend_error(e, f"Error reading {table_name}")
+            items.extend(response.get("Responses", {}).get(table_name, []))
+            request = response.get("UnprocessedKeys") or {}
+            if not request:
+                break
+            _backoff(attempt, backoff_seconds)
+        else:
+            # Unprocessed keys are DynamoDB shedding load.
+            raise BackendThrottled(f"Gave up reading {table_name} after {max_attempts} attempts.")
+    return items
+
+
+def batch_write(table_name: str, puts: Optional[List[dict]] = None, deletes: Optional[List[dict]] = None,
+                max_attempts: int = 8, backoff_seconds: float = 0.05) -> int:
+    """BatchWriteItem puts and delete keys, 25 per call, retrying UnprocessedItems with backoff.
+
+    Returns the number of write requests sent (including retries) so callers can
+    report round trips.
+    """
+    requests = [{"PutRequest": {"Item": item}} for item in puts or []]
+    requests += [{"DeleteRequest": {"Key": key}} for key in deletes or []]
+
+    calls = 0
+    for chunk in _chunks(requests, BATCH_WRITE_LIMIT):
+        pending = {table_name: chunk}
+        for attempt in range(1, max_attempts + 1):
+            calls += 1
+            try:
+                response = get_dynamodb().batch_write_item(RequestItems=pending)
+            except ClientError as e:
+                raise backend_error(e, f"Error writing {table_name}")
+            pending = response.get("UnprocessedItems") or {}
+            if not pending:
+                break
+            logger.warning("%s unprocessed writes on %s, attempt %s", len(pending.get(table_name, [])), table_name, attempt)
+            _backoff(attempt, backoff_seconds)
+        else:
+            raise BackendThrottled(f"Gave up writing {table_name} after {max_attempts} attempts.")
+    return calls
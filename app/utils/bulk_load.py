@@ -0,0 +1,342 @@
+"""Bulk-load DynamoDB tables from DynamoDB-JSON or NDJSON, in parallel and resumably.
+
+    python -m app.utils.bulk_load iac/data.json
+    python -m app.utils.bulk_load history.ndjson.gz --table TransactionHistory --plain \\
+        --workers 16 --checkpoint history.checkpoint.json --resume
+    python -m app.utils.bulk_load big.json --endpoint-url http://localhost:8000   # DynamoDB Local
+    python -m app.utils.bulk_load big.json --stand-in                            # in-process stand-in
+
+Input is streamed: a document like iac/data.json ({"clients": [...], "funds": [...],
+"relations": [...], "history": [...]}, or table names as keys) is decoded one item
+at a time, and NDJSON one line at a time. NDJSON lines are a DynamoDB export line
+({"Item": {...}}), {"table": ..., "item": {...}}, or a bare item with --table.
+Items are DynamoDB JSON unless --plain.
+
+Workers write 25-item BatchWriteItem requests through app.utils.batch, which
+retries unprocessed items with backoff. The checkpoint stores how many input
+records are known to be written; --resume skips those and rewrites at most the
+batches that were in flight (puts are idempotent).
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.repositories.tables import CLIENTS_TABLE, FUNDS_TABLE, RELATIONS_TABLE, TRANSACTIONS_TABLE
+from app.utils.batch import BATCH_WRITE_LIMIT, batch_write
+
+logger = logging.getLogger("bulk-load")
+
+# Sections of the iac/data.json layout (the same ones MemoryStorage.load reads).
+SECTIONS = {"clients": CLIENTS_TABLE, "funds": FUNDS_TABLE, "relations": RELATIONS_TABLE,
+            "history": TRANSACTIONS_TABLE}
+
+# A BatchWriteItem request may not name one key twice; within a batch the last item wins.
+KEY_ATTRIBUTES = {
+    CLIENTS_TABLE: ("user_id",),
+    FUNDS_TABLE: ("id_fund",),
+    RELATIONS_TABLE: ("user_id#fund_id",),
+    TRANSACTIONS_TABLE: ("transaction_id",),
+}
+
+Record = Tuple[str, dict]
+
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+class _StreamDecoder:
+    """Decode one JSON value at a time from a file, holding only a small window in memory."""
+
+    def __init__(self, f, chunk_size: int = 1 << 16):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder(parse_float=Decimal)
+        self._buffer = ""
+        self._pos = 0
+
+    def _fill(self) -> bool:
+        chunk = self._f.read(self._chunk_size)
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return bool(chunk)
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return
+
+    def peek(self) -> str:
+        self._skip_whitespace()
+        return self._buffer[self._pos] if self._pos < len(self._buffer) else ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self._pos} of the input window.")
+        self._pos += 1
+
+    def value(self):
+        # Items and keys are objects and strings, so a truncated window never decodes.
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            self._pos = end
+            return value
+
+
+def iter_document(f, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, dict]]:
+    """(section, item) for every item of a {"section": [item, ...], ...} document."""
+    decoder = _StreamDecoder(f, chunk_size)
+    decoder.expect("{")
+    if decoder.peek() == "}":
+        return
+    while True:
+        section = decoder.value()
+        decoder.expect(":")
+        decoder.expect("[")
+        if decoder.peek() != "]":
+            while True:
+                yield section, decoder.value()
+                if decoder.peek() != ",":
+                    break
+                decoder.expect(",")
+        decoder.expect("]")
+        if decoder.peek() != ",":
+            break
+        decoder.expect(",")
+    decoder.expect("}")
+
+
+def iter_records(path: str, input_format: Optional[str] = None, table: Optional[str] = None,
+                 plain: bool = False) -> Iterator[Record]:
+    """(table name, item with Decimal numbers) for every record of ``path``."""
+    from boto3.dynamodb.types import TypeDeserializer
+
+    deserializer = TypeDeserializer()
+
+    def decode(item: dict, typed: bool) -> dict:
+        return {k: deserializer.deserialize(v) for k, v in item.items()} if typed else item
+
+    if input_format is None:
+        name = path[:-3] if path.endswith(".gz") else path
+        input_format = "ndjson" if name.endswith((".ndjson", ".jsonl")) else "document"
+
+    with _open(path) as f:
+        if input_format == "document":
+            for section, item in iter_document(f):
+                yield SECTIONS.get(section, section), decode(item, not plain)
+            return
+
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line, parse_float=Decimal)
+            if "Item" in record:
+                name, item, typed = table, record["Item"], True
+            elif "item" in record:
+                name, item, typed = record.get("table") or table, record["item"], not plain
+            else:
+                name, item, typed = table, record, not plain
+            if not name:
+                raise ValueError(f"Line {line_number}: no table given (use --table or a \"table\" field).")
+            yield name, decode(item, typed)
+
+
+def _dedupe(table: str, items: List[dict]) -> List[dict]:
+    names = KEY_ATTRIBUTES.get(table)
+    if not names:
+        return items
+    return list({tuple(item.get(name) for name in names): item for item in items}.values())
+
+
+def read_checkpoint(path: str, source: str) -> int:
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("source") != source:
+        raise ValueError(f"Checkpoint {path} belongs to {checkpoint.get('source')}, not {source}.")
+    return int(checkpoint["records"])
+
+
+def write_checkpoint(path: str, source: str, records: int, complete: bool = False):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"source": source, "records": records, "complete": complete, "updated_at": time.time()}, f)
+    os.replace(temp_path, path)
+
+
+class BulkLoader:
+    """Batch records per table and write the batches from a pool of workers.
+
+    At most ``2 * workers`` batches are buffered or in flight, so memory stays flat
+    whatever the input size. Keep ``workers`` at or below AWS_MAX_POOL_CONNECTIONS.
+    """
+
+    def __init__(self, workers: int = 8, max_attempts: int = 8, backoff_seconds: float = 0.05,
+                 checkpoint: Optional[str] = None, source: str = "", checkpoint_every: float = 5.0,
+                 report_every: float = 10.0):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.checkpoint = checkpoint
+        self.source = source
+        self.checkpoint_every = checkpoint_every
+        self.report_every = report_every
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(2 * workers)
+        self._in_flight: Dict[int, int] = {}  # batch id -> first record index
+        self._buffers: Dict[str, List[Tuple[int, dict]]] = {}
+        self._next_batch = 0
+        self._error: Optional[BaseException] = None
+        self._written: Dict[str, int] = {}
+        self._calls = 0
+        self._batches = 0
+
+    def _low_water(self, read: int) -> int:
+        """Records before this index are all written."""
+        with self._lock:
+            pending = list(self._in_flight.values())
+        pending += [buffer[0][0] for buffer in self._buffers.values() if buffer]
+        return min(pending, default=read)
+
+    def _write(self, batch_id: int, table: str, batch: List[Tuple[int, dict]]):
+        try:
+            calls = batch_write(table, puts=_dedupe(table, [item for _, item in batch]),
+                                max_attempts=self.max_attempts, backoff_seconds=self.backoff_seconds)
+        except BaseException as e:
+            with self._lock:
+                self._error = self._error or e  # the batch stays in _in_flight, holding the checkpoint back
+            raise
+        finally:
+            self._slots.release()
+        with self._lock:
+            del self._in_flight[batch_id]
+            self._written[table] = self._written.get(table, 0) + len(batch)
+            self._calls += calls
+            self._batches += 1
+
+    def _submit(self, executor: ThreadPoolExecutor, table: str, batch: List[Tuple[int, dict]]):
+        self._slots.acquire()
+        with self._lock:
+            batch_id = self._next_batch
+            self._next_batch += 1
+            self._in_flight[batch_id] = batch[0][0]
+        executor.submit(self._write, batch_id, table, batch)
+
+    def _save(self, records: int, complete: bool = False):
+        if self.checkpoint:
+            write_checkpoint(self.checkpoint, self.source, records, complete)
+
+    def run(self, records: Iterable[Record], skip: int = 0) -> dict:
+        started = last_checkpoint = last_report = time.monotonic()
+        read = skip
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-load") as executor:
+            for index, (table, item) in enumerate(records):
+                if index < skip:
+                    continue
+                if self._error is not None:
+                    break
+                read = index + 1
+                buffer = self._buffers.setdefault(table, [])
+                buffer.append((index, item))
+                if len(buffer) == BATCH_WRITE_LIMIT:
+                    self._submit(executor, table, self._buffers.pop(table))
+
+                now = time.monotonic()
+                if now - last_checkpoint >= self.checkpoint_every:
+                    self._save(self._low_water(read))
+                    last_checkpoint = now
+                if now - last_report >= self.report_every:
+                    written = sum(self._written.values())
+                    logger.info("%s records written, %.0f records/s.", written, written / (now - started))
+                    last_report = now
+
+            if self._error is None:
+                for table, buffer in list(self._buffers.items()):
+                    if buffer:
+                        self._submit(executor, table, self._buffers.pop(table))
+        elapsed = time.monotonic() - started
+
+        low_water = self._low_water(read)
+        self._save(low_water, complete=self._error is None)
+        if self._error is not None:
+            logger.error("Bulk load stopped; resume from record %s.", low_water)
+            raise self._error
+
+        written = sum(self._written.values())
+        return {
+            "records": written,
+            "resumed_from": skip,
+            "seconds": round(elapsed, 3),
+            "records_per_second": round(written / elapsed, 1) if elapsed else None,
+            "tables": dict(sorted(self._written.items())),
+            "batches": self._batches,
+            "batch_calls": self._calls,
+            "retried_calls": self._calls - self._batches
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Bulk-load DynamoDB tables from DynamoDB-JSON or NDJSON.")
+    parser.add_argument("path", help="input file (.json document, .ndjson/.jsonl lines; .gz accepted)")
+    parser.add_argument("--format", choices=("document", "ndjson"), help="override detection by extension")
+    parser.add_argument("--table", help="target table for NDJSON lines that do not name one")
+    parser.add_argument("--plain", action="store_true", help="items are plain JSON, not DynamoDB JSON")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--max-attempts", type=int, default=8, help="BatchWriteItem attempts per batch")
+    parser.add_argument("--backoff", type=float, default=0.05, help="base backoff between attempts (s)")
+    parser.add_argument("--checkpoint", help="checkpoint file, written every few seconds and at the end")
+    parser.add_argument("--resume", action="store_true", help="skip the records recorded in --checkpoint")
+    parser.add_argument("--endpoint-url", help="DynamoDB endpoint, e.g. DynamoDB Local")
+    parser.add_argument("--stand-in", action="store_true", help="load into the in-process DynamoDB stand-in")
+    args = parser.parse_args(argv)
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    stand_in = None
+    if args.stand_in:
+        from benchmarks.local_aws import install
+
+        stand_in, _ = install()
+    elif args.endpoint_url:
+        from app.utils import aws
+
+        settings.dynamodb_endpoint_url = args.endpoint_url
+        aws.reset()
+
+    source = os.path.abspath(args.path)
+    skip = read_checkpoint(args.checkpoint, source) if args.resume else 0
+    loader = BulkLoader(workers=args.workers, max_attempts=args.max_attempts, backoff_seconds=args.backoff,
+                        checkpoint=args.checkpoint, source=source)
+    report = loader.run(iter_records(args.path, args.format, args.table, args.plain), skip=skip)
+    if stand_in is not None:
+        report["stand_in_items"] = {name: stand_in.count(name) for name in sorted(report["tables"])}
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
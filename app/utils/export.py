@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+from typing import Iterable, Iterator
+
+from app.models.fund import TransactionHistoryModel
+
+EXPORT_FIELDS = ["transaction_id", "user_id", "id_fund", "timestamp", "transaction_type", "amount", "notification"]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _row(transaction: TransactionHistoryModel) -> dict:
+    return {
+        "transaction_id": transaction.transaction_id,
+        "user_id": transaction.user_id,
+        "id_fund": transaction.id_fund,
+        "timestamp": transaction.timestamp.isoformat(),
+        "transaction_type": transaction.transaction_type,
+        "amount": str(transaction.amount),
+        "notification": transaction.notification,
+    }
+
+
+def ndjson_lines(transactions: Iterable[TransactionHistoryModel]) -> Iterator[str]:
+    for transaction in transactions:
+        yield json.dumps(_row(transaction), ensure_ascii=False) + "\n"
+
+
+def csv_lines(transactions: Iterable[TransactionHistoryModel]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for transaction in transactions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(_row(transaction))
+        yield buffer.getvalue()
+
+
+EXPORT_WRITERS = {
+    "ndjson": ndjson_lines,
+    "csv": csv_lines,
+}
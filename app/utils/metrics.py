@@ -0,0 +1,242 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+from app.config.settings import settings
+
+# Minimal Prometheus-style registry. Recording is a dict lookup plus a short
+# lock, and nothing is formatted until /metrics is scraped.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[:-1]) if state else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        lines = self.header()
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += state[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {state[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_requests_in_flight = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "Requests currently being served.", ["method"]))
+http_request_duration = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "End-to-end request latency.", ["method", "route", "status"]))
+
+startup_seconds = REGISTRY.register(Gauge(
+    "app_startup_seconds", "Cold-start phases of this process: import, warmup, first_request.", ["phase"]))
+
+aws_request_duration = REGISTRY.register(Histogram(
+    "aws_request_duration_seconds", "Latency of each DynamoDB/SNS API call, retries included.",
+    ["service", "table", "operation"]))
+aws_requests = REGISTRY.register(Counter(
+    "aws_requests_total", "DynamoDB/SNS API calls by outcome.", ["service", "table", "operation", "status"]))
+aws_retries = REGISTRY.register(Counter(
+    "aws_retries_total", "Retries performed by botocore.", ["service", "operation"]))
+
+admission_rejections = REGISTRY.register(Counter(
+    "admission_rejections_total", "Requests shed by admission control.", ["reason"]))
+admission_concurrency_limit = REGISTRY.register(Gauge(
+    "admission_concurrency_limit", "Current adaptive limit on concurrent API requests."))
+backend_throttles = REGISTRY.register(Counter(
+    "backend_throttles_total", "Throttled DynamoDB attempts (retries included).", ["operation"]))
+
+fund_transactions = REGISTRY.register(Counter(
+    "fund_transactions_total", "Subscribe/cancel operations by outcome.", ["transaction_type", "outcome"]))
+fund_transaction_retries = REGISTRY.register(Counter(
+    "fund_transaction_retries_total", "Transactions re-read and retried after a concurrent balance change.",
+    ["transaction_type"]))
+fund_transaction_stage = REGISTRY.register(Histogram(
+    "fund_transaction_stage_seconds", "Time spent in each stage of create_transaction.", ["stage"]))
+fund_stats_repairs = REGISTRY.register(Counter(
+    "fund_stats_repairs_total", "Per-fund counters corrected by reconciliation."))
+idempotent_replays = REGISTRY.register(Counter(
+    "idempotent_replays_total", "Subscribe/cancel retries answered from a stored Idempotency-Key response.",
+    ["source"]))
+client_reads = REGISTRY.register(Counter(
+    "client_reads_total", "Read-only client lookups by where they were answered: cache, coalesced or backend.",
+    ["source"]))
+history_archive_rows = REGISTRY.register(Counter(
+    "history_archive_rows_total", "History rows moved to the archive (archived) or read back from it (read).",
+    ["operation"]))
+history_archive_groups_read = REGISTRY.register(Counter(
+    "history_archive_groups_read_total", "Archive row groups opened by history reads after date and user pruning."))
+
+notifications = REGISTRY.register(Counter(
+    "notifications_total", "Notifications handled by the outbox.", ["outcome"]))
+notification_publish_retries = REGISTRY.register(Counter(
+    "notification_publish_retries_total", "PublishBatch retries performed by the outbox."))
+
+
+def _resource_label(params: dict) -> str:
+    if "TableName" in params:
+        return params["TableName"]
+    if "TopicArn" in params:
+        return params["TopicArn"].rsplit(":", 1)[-1]
+    if "Bucket" in params:
+        return params["Bucket"]
+    if "RequestItems" in params:
+        return ",".join(sorted(params["RequestItems"]))
+    if "TransactItems" in params:
+        return "transaction"
+    return ""
+
+
+def instrument_client(client, service: str):
+    """Time every API call made by a botocore client, labelled by table and operation."""
+    if not settings.metrics_enabled:
+        return client
+
+    # before-parameter-build still sees the caller's parameters (TableName, TopicArn...),
+    # and its context dict is the one later passed to after-call / after-call-error.
+    def before_call(params, model, context, **kwargs):
+        context["metrics"] = (time.perf_counter(), _resource_label(params), model.name)
+
+    def _record(context, status: str, retries: int = 0):
+        started = context.get("metrics")
+        if started is None:
+            return
+        start, resource, operation = started
+        aws_request_duration.observe(time.perf_counter() - start, service=service, table=resource,
+                                     operation=operation)
+        aws_requests.inc(service=service, table=resource, operation=operation, status=status)
+        if retries:
+            aws_retries.inc(retries, service=service, operation=operation)
+
+    def after_call(http_response, parsed, context, **kwargs):
+        status = "ok" if http_response.status_code < 400 else parsed.get("Error", {}).get("Code", "error")
+        _record(context, status, parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0))
+
+    def after_call_error(exception, context, **kwargs):
+        _record(context, type(exception).__name__)
+
+    events = client.meta.events
+    events.register(f"before-parameter-build.{service}", before_call)
+    events.register(f"after-call.{service}", after_call)
+    events.register(f"after-call-error.{service}", after_call_error)
+    return client
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -1,18 +1,20 @@
 import os
-import boto3
 import logging
+from typing import List, Optional
 
-from dotenv import load_dotenv
-load_dotenv()
+from app.utils.aws import get_sns_client
+from app.utils.outbox import OutboxMessage, PublishResult
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
+SUBJECT = "Notificación de Fondos"
 
-def send_fund_notification(user_id: str, id_fund: str, transaction_type: str, notification_type: str):
+
+def build_fund_notification(user_id: str, id_fund: str, transaction_type: str, notification_type: Optional[str],
+                            reference=None) -> Optional[OutboxMessage]:
     if not notification_type:
-        logger.info("[NOTIFICATION] No notification type provided, skipping notification.")
-        return
+        logger.debug("[NOTIFICATION] No notification type provided, skipping notification.")
+        return None
 
     topic_arn = None
     if notification_type == "email":
@@ -21,10 +23,8 @@ def send_fund_notification(user_id: str, id_fund: str, transaction_type: str, no
         topic_arn = os.environ.get("SNS_SMS_TOPIC_ARN")
 
     if not topic_arn:
-        logger.warning(f"[NOTIFICATION] SNS topic ARN for '{notification_type}' not configured. Notification skipped.")
-        return
-
-    sns = boto3.client("sns")
+        logger.warning("[NOTIFICATION] SNS topic ARN for '%s' not configured. Notification skipped.", notification_type)
+        return None
 
     message = (
         f"Usuario {user_id} ha realizado una operación de tipo '{transaction_type}' en el fondo {id_fund}."
@@ -37,15 +37,56 @@ def send_fund_notification(user_id: str, id_fund: str, transaction_type: str, no
             'StringValue': 'Transactional'
         }
 
+    return OutboxMessage(topic_arn=topic_arn, message=message, subject=SUBJECT, attributes=attributes, reference=reference)
+
+
+def send_fund_notification(user_id: str, id_fund: str, transaction_type: str, notification_type: str):
+    notification = build_fund_notification(user_id, id_fund, transaction_type, notification_type)
+    if notification is None:
+        return
+
     try:
-        response = sns.publish(
-            TopicArn=topic_arn,
-            Message=message,
-            Subject="Notificación de Fondos",
-            MessageAttributes=attributes if notification_type == "sms" else {}
+        response = get_sns_client().publish(
+            TopicArn=notification.topic_arn,
+            Message=notification.message,
+            Subject=notification.subject,
+            MessageAttributes=notification.attributes
         )
-        logger.info(f"[NOTIFICATION] Notification sent via {notification_type.upper()}: {response['MessageId']}")
+        logger.info("[NOTIFICATION] Notification sent via %s: %s", notification_type.upper(), response['MessageId'])
     except Exception as e:
-        logger.error(f"[NOTIFICATION] Error sending notification: {e}")
+        logger.error("[NOTIFICATION] Error sending notification: %s", e)
         raise RuntimeError(f"Failed to send notification: {str(e)}")
 
+
+class SnsBatchPublisher:
+    """``publish_batch`` callable for the outbox, backed by SNS PublishBatch."""
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_sns_client()
+
+    def __call__(self, topic_arn: str, messages: List[OutboxMessage]) -> PublishResult:
+        response = self.client.publish_batch(
+            TopicArn=topic_arn,
+            PublishBatchRequestEntries=[
+                {
+                    "Id": str(i),
+                    "Message": message.message,
+                    "Subject": message.subject,
+                    "MessageAttributes": message.attributes
+                }
+                for i, message in enumerate(messages)
+            ]
+        )
+        delivered = [int(entry["Id"]) for entry in response.get("Successful", [])]
+        retryable = []
+        for entry in response.get("Failed", []):
+            if entry.get("SenderFault"):
+                logger.error("[NOTIFICATION] Rejected by SNS: %s %s", entry.get('Code'), entry.get('Message'))
+            else:
+                retryable.append(int(entry["Id"]))
+        logger.info("[NOTIFICATION] Published %s/%s notifications to %s", len(delivered), len(messages), topic_arn)
+        return PublishResult(delivered=delivered, retryable=retryable)
@@ -0,0 +1,164 @@
+import logging
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, List, NamedTuple, Optional
+
+from app.utils.metrics import notification_publish_retries, notifications
+
+logger = logging.getLogger("notification-outbox")
+
+# SNS PublishBatch accepts at most 10 entries per call.
+SNS_BATCH_LIMIT = 10
+
+
+class OutboxMessage(NamedTuple):
+    topic_arn: str
+    message: str
+    subject: str
+    attributes: dict
+    reference: Any = None
+
+
+class PublishResult(NamedTuple):
+    delivered: List[int]
+    retryable: List[int]
+
+
+class NotificationOutbox:
+    """In-process outbox drained by a pool of background workers.
+
+    Requests only enqueue; workers group pending messages per topic, publish them
+    with ``publish_batch(topic_arn, messages) -> PublishResult`` in chunks of up to
+    10, retry retryable failures with exponential backoff and then hand the
+    ``reference`` of every delivered message to ``on_delivered`` in one call.
+    Queued messages do not survive the process; callers that need them to must
+    keep their own record (see app.services.notification_sweep).
+    """
+
+    def __init__(self, publish_batch: Callable[[str, List[OutboxMessage]], PublishResult],
+                 on_delivered: Optional[Callable[[List[Any]], None]] = None,
+                 workers: int = 2, max_attempts: int = 5, backoff_seconds: float = 0.2,
+                 linger_seconds: float = 0.02, max_drain: int = 100):
+        self.publish_batch = publish_batch
+        self.on_delivered = on_delivered
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.linger_seconds = linger_seconds
+        self.max_drain = max_drain
+        self._queue: "queue.Queue[OutboxMessage]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def enqueue(self, message: OutboxMessage):
+        self.start()
+        self._queue.put(message)
+
+    def start(self):
+        if self._threads and not self._stopping.is_set():
+            return
+        with self._start_lock:
+            if self._threads and not self._stopping.is_set():
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"notification-outbox-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def flush(self):
+        """Block until every message enqueued so far has been handled."""
+        self._queue.join()
+
+    def stop(self, timeout: float = 10.0):
+        """Drain what is already queued, then stop the workers."""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _take(self) -> List[OutboxMessage]:
+        while True:
+            try:
+                first = self._queue.get(timeout=0.2)
+                break
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return []
+
+        taken = [first]
+        deadline = time.monotonic() + self.linger_seconds
+        while len(taken) < self.max_drain:
+            remaining = deadline - time.monotonic()
+            try:
+                taken.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return taken
+
+    def _run(self):
+        while True:
+            taken = self._take()
+            if not taken:
+                return
+            try:
+                self._dispatch(taken)
+            except Exception:
+                logger.exception("Notification outbox dispatch failed")
+            finally:
+                for _ in taken:
+                    self._queue.task_done()
+
+    def _dispatch(self, messages: List[OutboxMessage]):
+        by_topic = defaultdict(list)
+        for message in messages:
+            by_topic[message.topic_arn].append(message)
+
+        delivered = []
+        for topic_arn, topic_messages in by_topic.items():
+            for i in range(0, len(topic_messages), SNS_BATCH_LIMIT):
+                delivered.extend(self._publish_with_retry(topic_arn, topic_messages[i:i + SNS_BATCH_LIMIT]))
+
+        notifications.inc(len(delivered), outcome="delivered")
+        if delivered and self.on_delivered:
+            references = [message.reference for message in delivered if message.reference is not None]
+            if references:
+                try:
+                    self.on_delivered(references)
+                except Exception:
+                    logger.exception("Failed to record delivered notifications")
+
+    def _publish_with_retry(self, topic_arn: str, chunk: List[OutboxMessage]) -> List[OutboxMessage]:
+        delivered = []
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = self.publish_batch(topic_arn, chunk)
+            except Exception as e:
+                logger.warning("Publish to %s failed on attempt %s: %s", topic_arn, attempt, e)
+                result = PublishResult(delivered=[], retryable=list(range(len(chunk))))
+
+            delivered.extend(chunk[i] for i in result.delivered)
+            rejected = len(chunk) - len(result.delivered) - len(result.retryable)
+            if rejected:
+                notifications.inc(rejected, outcome="rejected")
+            chunk = [chunk[i] for i in result.retryable]
+            if not chunk:
+                return delivered
+            if attempt < self.max_attempts:
+                notification_publish_retries.inc()
+                delay = self.backoff_seconds * (2 ** (attempt - 1))
+                time.sleep(delay + random.uniform(0, delay))
+
+        logger.error("Dropping %s notifications for %s after %s attempts", len(chunk), topic_arn, self.max_attempts)
+        notifications.inc(len(chunk), outcome="dropped")
+        return delivered
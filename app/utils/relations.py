@@ -1,68 +1,35 @@
-from datetime import datetime, timezone
-import boto3
-import os
 import logging
 
-logger = logging.getLogger("relations")
-logger.setLevel(logging.INFO)
-
-dynamodb_endpoint = os.getenv('DYNAMODB_ENDPOINT_URL')
-if dynamodb_endpoint:
-    dynamodb = boto3.resource('dynamodb', endpoint_url=dynamodb_endpoint)
-else:
-    dynamodb = boto3.resource('dynamodb')
+from app.repositories import get_storage
+from app.utils.aio import run_io
 
-relation_table = dynamodb.Table('ClientFundRelation')
+logger = logging.getLogger("relations")
 
 def is_subscribed(user_id: str, fund_id: str) -> bool:
     try:
-        key = f"{user_id}#{fund_id}"
-        logger.info(f"Checking subscription for key: {key}")
-        response = relation_table.get_item(
-            Key={'user_id#fund_id': key}
-        )
-        is_sub = 'Item' in response
-        logger.info(f"Subscription check result: {is_sub}")
+        logger.debug("Checking subscription for %s#%s", user_id, fund_id)
+        is_sub = get_storage().relations.get(user_id, fund_id) is not None
+        logger.debug("Subscription check result: %s", is_sub)
         return is_sub
     except Exception as e:
-        logger.error(f"Error checking subscription: {e}")
+        logger.error("Error checking subscription: %s", e)
         return False
 
+async def is_subscribed_async(user_id: str, fund_id: str) -> bool:
+    return await run_io(is_subscribed, user_id, fund_id)
+
 def create_subscription_record(user_id: str, fund_id: str):
     try:
-        key = f"{user_id}#{fund_id}"
-        item_data = {
-            'user_id#fund_id': key,
-            'user_id': user_id,
-            'id_fund': fund_id,
-            'subscribed_at': datetime.now(timezone.utc).isoformat()
-        }
-        logger.info(f"Creating subscription record: {item_data}")
-        
-        relation_table.put_item(Item=item_data)
-        logger.info(f"✅ Subscription record created successfully for {key}")
-        
-        # Verify insertion
-        verify_response = relation_table.get_item(Key={'user_id#fund_id': key})
-        if 'Item' in verify_response:
-            logger.info(f"✅ Verification: Record exists in table")
-        else:
-            logger.error(f"❌ Verification failed: Record not found after insertion")
-            
+        get_storage().relations.put(user_id, fund_id)
+        logger.debug("Subscription record created for %s#%s", user_id, fund_id)
     except Exception as e:
-        logger.error(f"❌ Error creating subscription record: {e}")
+        logger.error("Error creating subscription record: %s", e)
         raise
 
 def delete_subscription_record(user_id: str, fund_id: str):
     try:
-        key = f"{user_id}#{fund_id}"
-        logger.info(f"Deleting subscription record: {key}")
-        
-        relation_table.delete_item(
-            Key={'user_id#fund_id': key}
-        )
-        logger.info(f"✅ Subscription record deleted successfully for {key}")
-        
+        get_storage().relations.delete(user_id, fund_id)
+        logger.debug("Subscription record deleted for %s#%s", user_id, fund_id)
     except Exception as e:
-        logger.error(f"❌ Error deleting subscription record: {e}")
+        logger.error("Error deleting subscription record: %s", e)
         raise
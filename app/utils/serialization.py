@@ -0,0 +1,40 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the stdlib path below produces the same output
+    orjson = None
+
+# JSON encoding for trusted internal data (history rows, transaction results).
+# The output matches what a pydantic response model would produce: Decimal as a
+# string, UTC datetimes with a "Z" suffix. Handlers that return FastJSONResponse
+# also skip FastAPI's response-model validation pass.
+
+
+def _encode_decimal(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_stdlib(value):
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    return _encode_decimal(value)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_encode_decimal, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=_encode_stdlib, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
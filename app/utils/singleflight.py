@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent loads of the same key share one execution of the loader.
+
+    The first caller for a key runs the loader; callers arriving while it is in
+    flight wait for and receive its result (or its exception). Nothing is kept
+    once the load finishes, so this coalesces bursts without caching anything.
+    Threads and coroutines coalesce separately: ``do`` blocks the calling thread,
+    ``do_async`` shares one task per event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+
+    def do(self, key: Hashable, loader: Callable[[], Any]) -> Tuple[Any, bool]:
+        """``(value, shared)``; ``shared`` is True when another caller's load was reused."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = loader()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+    async def do_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async ``do``: the load runs as its own task, so a cancelled caller does not cancel it for the rest."""
+        loop = asyncio.get_running_loop()
+        flight = (id(loop), key)
+        with self._lock:
+            task = self._tasks.get(flight)
+            shared = task is not None
+            if not shared:
+                task = loop.create_task(loader())
+                self._tasks[flight] = task
+                task.add_done_callback(lambda done: self._finish(flight, done))
+        return await asyncio.shield(task), shared
+
+    def _finish(self, flight: Tuple[int, Hashable], task: asyncio.Task):
+        with self._lock:
+            if self._tasks.get(flight) is task:
+                del self._tasks[flight]
+        if not task.cancelled():
+            task.exception()  # retrieved here, so an error nobody awaited is not reported as lost
+
+    def forget(self, key: Hashable):
+        """Detach the in-flight load of ``key``: later callers start a fresh one (e.g. after a write)."""
+        with self._lock:
+            self._calls.pop(key, None)
+            for flight in [flight for flight in self._tasks if flight[1] == key]:
+                del self._tasks[flight]
@@ -0,0 +1 @@
+"""Benchmarks for the service layer; see ``python -m benchmarks.run --help``."""
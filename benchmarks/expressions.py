@@ -0,0 +1,278 @@
+import re
+from decimal import Decimal
+from typing import Callable, List, Optional, Tuple
+
+from boto3.dynamodb.types import TypeDeserializer
+
+# Subset of the DynamoDB expression language used by this service:
+#   conditions  comparisons (= <> < <= > >=), BETWEEN, IN, AND/OR/NOT, parentheses,
+#               attribute_exists, attribute_not_exists, begins_with, contains
+#   updates     SET a = operand [+|- operand], if_not_exists(a, operand), REMOVE, ADD
+# Attribute paths are top-level names only (plain or #placeholder).
+
+_deserializer = TypeDeserializer()
+
+_TOKEN = re.compile(r"\s*(<>|<=|>=|[=<>(),+\-]|[#:]?[A-Za-z0-9_.]+)")
+_KEYWORDS = {"AND", "OR", "NOT", "BETWEEN", "IN", "SET", "REMOVE", "ADD", "DELETE"}
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def to_python(value: Optional[dict]):
+    return None if value is None else _deserializer.deserialize(value)
+
+
+def _tokenize(expression: str) -> List[str]:
+    tokens, position = [], 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise ExpressionError(f"Invalid expression near: {expression[position:]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+def _compare(left: Optional[dict], op: str, right: Optional[dict]) -> bool:
+    if left is None or right is None:
+        return op == "<>" and (left is None) != (right is None)
+    left_type, right_type = next(iter(left)), next(iter(right))
+    if op in ("=", "<>"):
+        equal = left_type == right_type and to_python(left) == to_python(right)
+        return equal if op == "=" else not equal
+    if left_type != right_type or left_type not in ("S", "N", "B"):
+        return False
+    a, b = to_python(left), to_python(right)
+    return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+
+class _Parser:
+    def __init__(self, expression: str, names: Optional[dict], values: Optional[dict]):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+        # (attribute, value) pairs compared with "=", used to find the partition of a Query.
+        self.equalities: List[Tuple[str, dict]] = []
+
+    def peek(self, offset: int = 0) -> Optional[str]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def take(self, expected: Optional[str] = None) -> str:
+        token = self.peek()
+        if token is None or (expected is not None and token.upper() != expected):
+            raise ExpressionError(f"Expected {expected or 'a token'}, got {token!r}")
+        self.position += 1
+        return token
+
+    def done(self):
+        if self.peek() is not None:
+            raise ExpressionError(f"Unexpected token {self.peek()!r}")
+
+    def name(self, token: str) -> str:
+        if token.startswith("#"):
+            if token not in self.names:
+                raise ExpressionError(f"Undefined attribute name {token}")
+            return self.names[token]
+        if token.startswith(":") or token.upper() in _KEYWORDS:
+            raise ExpressionError(f"Expected an attribute name, got {token!r}")
+        return token
+
+    def value(self, token: str) -> dict:
+        if token not in self.values:
+            raise ExpressionError(f"Undefined attribute value {token}")
+        return self.values[token]
+
+    # Operands evaluate to a typed value ({"S": ...}) or None when the attribute is missing.
+    def operand(self) -> Callable[[dict], Optional[dict]]:
+        token = self.take()
+        if token == "if_not_exists":
+            self.take("(")
+            attribute = self.name(self.take())
+            self.take(",")
+            fallback = self.operand()
+            self.take(")")
+            return lambda item: item[attribute] if attribute in item else fallback(item)
+        if token.startswith(":"):
+            value = self.value(token)
+            return lambda item: value
+        attribute = self.name(token)
+        return lambda item: item.get(attribute)
+
+    def condition(self) -> Callable[[dict], bool]:
+        left = self.conjunction()
+        while self.peek() and self.peek().upper() == "OR":
+            self.take()
+            right = self.conjunction()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def conjunction(self) -> Callable[[dict], bool]:
+        left = self.negation()
+        while self.peek() and self.peek().upper() == "AND":
+            self.take()
+            right = self.negation()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def negation(self) -> Callable[[dict], bool]:
+        if self.peek() and self.peek().upper() == "NOT":
+            self.take()
+            inner = self.negation()
+            return lambda item: not inner(item)
+        return self.predicate()
+
+    def predicate(self) -> Callable[[dict], bool]:
+        token = self.peek()
+        if token == "(":
+            self.take()
+            inner = self.condition()
+            self.take(")")
+            return inner
+        if token in ("attribute_exists", "attribute_not_exists"):
+            self.take()
+            self.take("(")
+            attribute = self.name(self.take())
+            self.take(")")
+            if token == "attribute_exists":
+                return lambda item: attribute in item
+            return lambda item: attribute not in item
+        if token in ("begins_with", "contains"):
+            self.take()
+            self.take("(")
+            target = self.operand()
+            self.take(",")
+            needle = self.operand()
+            self.take(")")
+            if token == "begins_with":
+                return lambda item: _begins_with(target(item), needle(item))
+            return lambda item: _contains(target(item), needle(item))
+
+        start = self.position
+        left = self.operand()
+        simple_left = self.position - start == 1 and not self.tokens[start].startswith(":")
+        operator = self.take().upper()
+        if operator == "BETWEEN":
+            low = self.operand()
+            self.take("AND")
+            high = self.operand()
+            return lambda item: _compare(left(item), ">=", low(item)) and _compare(left(item), "<=", high(item))
+        if operator == "IN":
+            self.take("(")
+            options = [self.operand()]
+            while self.peek() == ",":
+                self.take()
+                options.append(self.operand())
+            self.take(")")
+            return lambda item: any(_compare(left(item), "=", option(item)) for option in options)
+        if operator not in ("=", "<>", "<", "<=", ">", ">="):
+            raise ExpressionError(f"Unsupported operator {operator!r}")
+        right_token = self.peek()
+        right = self.operand()
+        if operator == "=" and simple_left and right_token.startswith(":"):
+            self.equalities.append((self.name(self.tokens[start]), self.value(right_token)))
+        return lambda item: _compare(left(item), operator, right(item))
+
+    def update(self) -> Callable[[dict], None]:
+        steps = []
+        while self.peek() is not None:
+            clause = self.take().upper()
+            while True:
+                if clause == "SET":
+                    steps.append(self._set_action())
+                elif clause == "REMOVE":
+                    attribute = self.name(self.take())
+                    steps.append(lambda item, a=attribute: item.pop(a, None))
+                elif clause == "ADD":
+                    attribute = self.name(self.take())
+                    steps.append(self._add_action(attribute, self.value(self.take())))
+                else:
+                    raise ExpressionError(f"Unsupported update clause {clause!r}")
+                if self.peek() != ",":
+                    break
+                self.take()
+
+        def apply(item: dict):
+            for step in steps:
+                step(item)
+        return apply
+
+    def _set_action(self) -> Callable[[dict], None]:
+        attribute = self.name(self.take())
+        self.take("=")
+        left = self.operand()
+        if self.peek() in ("+", "-"):
+            sign = 1 if self.take() == "+" else -1
+            right = self.operand()
+
+            def compute(item):
+                a, b = left(item), right(item)
+                if a is None or b is None or "N" not in a or "N" not in b:
+                    raise ExpressionError("An operand in the update expression has an incorrect data type")
+                return {"N": str(Decimal(a["N"]) + sign * Decimal(b["N"]))}
+        else:
+            compute = left
+
+        def action(item):
+            value = compute(item)
+            if value is None:
+                raise ExpressionError("The provided expression refers to an attribute that does not exist in the item")
+            item[attribute] = value
+        return action
+
+    @staticmethod
+    def _add_action(attribute: str, value: dict) -> Callable[[dict], None]:
+        def action(item):
+            current = item.get(attribute)
+            if "N" in value:
+                base = Decimal(current["N"]) if current else Decimal(0)
+                item[attribute] = {"N": str(base + Decimal(value["N"]))}
+            else:
+                kind = next(iter(value))
+                merged = set(current[kind]) if current else set()
+                item[attribute] = {kind: sorted(merged | set(value[kind]))}
+        return action
+
+
+def _begins_with(target: Optional[dict], prefix: Optional[dict]) -> bool:
+    return bool(target and prefix and "S" in target and "S" in prefix and target["S"].startswith(prefix["S"]))
+
+
+def _contains(target: Optional[dict], needle: Optional[dict]) -> bool:
+    if not target or not needle:
+        return False
+    if "S" in target and "S" in needle:
+        return needle["S"] in target["S"]
+    kind = next(iter(target))
+    if kind in ("SS", "NS", "BS"):
+        return next(iter(needle.values())) in target[kind]
+    if kind == "L":
+        return any(_compare(element, "=", needle) for element in target["L"])
+    return False
+
+
+def compile_condition(expression: str, names: Optional[dict] = None,
+                      values: Optional[dict] = None) -> Callable[[dict], bool]:
+    parser = _Parser(expression, names, values)
+    condition = parser.condition()
+    parser.done()
+    return condition
+
+
+def compile_key_condition(expression: str, names: Optional[dict] = None,
+                          values: Optional[dict] = None) -> Tuple[Callable[[dict], bool], List[Tuple[str, dict]]]:
+    """Compile a KeyConditionExpression; also returns its ``attribute = :value`` pairs."""
+    parser = _Parser(expression, names, values)
+    condition = parser.condition()
+    parser.done()
+    return condition, parser.equalities
+
+
+def compile_update(expression: str, names: Optional[dict] = None,
+                   values: Optional[dict] = None) -> Callable[[dict], None]:
+    parser = _Parser(expression, names, values)
+    return parser.update()
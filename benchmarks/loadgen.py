@@ -0,0 +1,362 @@
+"""Open-loop HTTP load generator for subscribe/cancel/history with SLO reports.
+
+    python -m benchmarks.loadgen --rps 50,100,200,400 --duration 10 --json load.json
+    python -m benchmarks.loadgen --users 10000 --zipf 1.2 --history-ratio 0.7 --rps 300
+    python -m benchmarks.loadgen --write-seed seed.json --users 5000      # for an app started separately:
+    STORAGE_BACKEND=memory STORAGE_SEED_FILE=seed.json uvicorn app.main:app &
+    python -m benchmarks.loadgen --url http://localhost:8000 --users 5000 --rps 100
+
+Without --url the app is started locally (uvicorn, memory storage seeded with
+--users clients) on a free port, so the whole run stays on one machine.
+Requests leave on a fixed schedule whatever the response times (open loop), and
+latency is measured from the scheduled send time, so queueing in the server is
+not hidden by the generator slowing down. Each --rps stage is reported; the
+first stage that misses the SLO (p99, failure rate or the target rate itself)
+is the saturation point. The JSON report carries the commit for comparisons.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.run import DATA_FILE, _percentile
+
+logger = logging.getLogger("loadgen")
+
+OPERATIONS = ("subscribe", "cancel", "history")
+
+
+class Workload:
+    """Picks the next request: uniform users, Zipf-skewed funds, a subscribe/cancel/history mix.
+
+    Subscriptions seen by the generator are tracked per user, so subscribes go to
+    funds the user is not in and cancels to funds the user is in (when possible).
+    """
+
+    def __init__(self, user_ids: List[str], fund_ids: List[str], zipf: float = 1.0, history_ratio: float = 0.5,
+                 subscribe_ratio: float = 0.5, page_size: int = 20, seed: int = 7):
+        self.user_ids = user_ids
+        self.fund_ids = fund_ids
+        # Rank 1 is the hottest fund; zipf=0 is uniform.
+        self.fund_weights = [1 / (rank ** zipf) for rank in range(1, len(fund_ids) + 1)]
+        self.history_ratio = history_ratio
+        self.subscribe_ratio = subscribe_ratio
+        self.page_size = page_size
+        self.rng = random.Random(seed)
+        self.subscribed: Dict[str, set] = {}
+
+    def _fund(self, exclude=(), among=None) -> Optional[str]:
+        candidates = [(f, w) for f, w in zip(self.fund_ids, self.fund_weights)
+                      if f not in exclude and (among is None or f in among)]
+        if not candidates:
+            return None
+        funds, weights = zip(*candidates)
+        return self.rng.choices(funds, weights)[0]
+
+    def next_request(self) -> dict:
+        user_id = self.rng.choice(self.user_ids)
+        if self.rng.random() < self.history_ratio:
+            return {"operation": "history", "method": "GET", "url": "/v1/funds/history",
+                    "params": {"user_id": user_id, "limit": self.page_size}}
+
+        held = self.subscribed.get(user_id, set())
+        operation = "subscribe" if self.rng.random() < self.subscribe_ratio else "cancel"
+        id_fund = self._fund(exclude=held) if operation == "subscribe" else self._fund(among=held)
+        if id_fund is None:
+            operation = "cancel" if operation == "subscribe" else "subscribe"
+            id_fund = self._fund(exclude=held) if operation == "subscribe" else self._fund(among=held)
+        return {"operation": operation, "method": "POST", "url": f"/v1/funds/{operation}",
+                "json": {"user_id": user_id, "id_fund": id_fund, "transaction_type": operation}}
+
+    def observe(self, request: dict, status: int):
+        if status != 200 or request["operation"] == "history":
+            return
+        body = request["json"]
+        held = self.subscribed.setdefault(body["user_id"], set())
+        if request["operation"] == "subscribe":
+            held.add(body["id_fund"])
+        else:
+            held.discard(body["id_fund"])
+
+
+class StageStats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {operation: [] for operation in OPERATIONS}
+        self.statuses: Dict[str, Counter] = {operation: Counter() for operation in OPERATIONS}
+        self.dropped = 0
+
+    def record(self, operation: str, status: str, latency: Optional[float]):
+        self.statuses[operation][status] += 1
+        if latency is not None:
+            self.latencies[operation].append(latency)
+
+
+def _outcome(status: str) -> str:
+    if status in ("429", "503"):
+        return "shed"  # admission control said no, with Retry-After
+    if status.isdigit() and int(status) < 400:
+        return "ok"
+    if status.isdigit() and int(status) < 500:
+        return "rejected"  # business rule (already subscribed, ...), not a server failure
+    return "error"  # 5xx, timeouts, connection failures
+
+
+def _latency_summary(latencies: List[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round((latencies[-1] if latencies else 0.0) * 1000, 2),
+    }
+
+
+def summarize(stats: StageStats, target_rps: float, elapsed: float, slo_p99_ms: float,
+              slo_failure_rate: float) -> dict:
+    outcomes = Counter()
+    operations = {}
+    for operation in OPERATIONS:
+        counts = Counter()
+        for status, n in stats.statuses[operation].items():
+            counts[_outcome(status)] += n
+        outcomes.update(counts)
+        total = sum(counts.values())
+        if total:
+            operations[operation] = dict(_latency_summary(stats.latencies[operation]), requests=total,
+                                         **{outcome: counts[outcome] for outcome in ("ok", "rejected", "shed", "error")},
+                                         statuses=dict(sorted(stats.statuses[operation].items())))
+
+    sent = sum(outcomes.values())
+    attempted = sent + stats.dropped
+    failures = outcomes["error"] + outcomes["shed"] + stats.dropped
+    latency = _latency_summary([value for values in stats.latencies.values() for value in values])
+    achieved = outcomes["ok"] / elapsed if elapsed else 0.0
+    report = dict(
+        target_rps=target_rps,
+        achieved_rps=round((sent / elapsed) if elapsed else 0.0, 1),
+        goodput_rps=round(achieved, 1),
+        requests=attempted,
+        dropped=stats.dropped,
+        error_rate=round((outcomes["error"] + stats.dropped) / attempted, 4) if attempted else 0.0,
+        shed_rate=round(outcomes["shed"] / attempted, 4) if attempted else 0.0,
+        rejected_rate=round(outcomes["rejected"] / attempted, 4) if attempted else 0.0,
+        failure_rate=round(failures / attempted, 4) if attempted else 0.0,
+        **latency,
+        operations=operations,
+    )
+    report["slo_met"] = (latency["p99_ms"] <= slo_p99_ms and report["failure_rate"] <= slo_failure_rate
+                         and report["achieved_rps"] >= 0.9 * target_rps)
+    return report
+
+
+async def _send(client: httpx.AsyncClient, workload: Workload, request: dict, scheduled: float,
+                stats: StageStats, timeout: float):
+    loop = asyncio.get_running_loop()
+    try:
+        response = await client.request(request["method"], request["url"], params=request.get("params"),
+                                        json=request.get("json"), timeout=timeout)
+        status = str(response.status_code)
+        workload.observe(request, response.status_code)
+    except httpx.TimeoutException:
+        status = "timeout"
+    except httpx.HTTPError:
+        status = "connection_error"
+    stats.record(request["operation"], status, loop.time() - scheduled)
+
+
+async def run_stage(client: httpx.AsyncClient, workload: Workload, rps: float, duration: float,
+                    arrivals: str = "constant", max_in_flight: int = 1000, timeout: float = 5.0,
+                    rng: Optional[random.Random] = None) -> tuple:
+    """Send ``rps * duration`` requests on schedule; returns (StageStats, elapsed seconds)."""
+    loop = asyncio.get_running_loop()
+    rng = rng or random.Random(0)
+    stats = StageStats()
+    in_flight = set()
+    start = loop.time()
+    offset = 0.0
+    for _ in range(int(rps * duration)):
+        scheduled = start + offset
+        offset += rng.expovariate(rps) if arrivals == "poisson" else 1 / rps
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            # The generator itself is saturated: count it instead of queueing (that would close the loop).
+            stats.dropped += 1
+            continue
+        task = asyncio.create_task(_send(client, workload, workload.next_request(), scheduled, stats, timeout))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return stats, loop.time() - start
+
+
+def saturation(stages: List[dict]) -> dict:
+    passing = [stage for stage in stages if stage["slo_met"]]
+    failing = next((stage for stage in stages if not stage["slo_met"]), None)
+    return {
+        "saturation_rps": failing["target_rps"] if failing else None,
+        "max_sustained_rps": max((stage["goodput_rps"] for stage in passing), default=None),
+    }
+
+
+def write_seed(path: str, users: int) -> dict:
+    """A DynamoDB-JSON seed with the funds of iac/data.json and ``users`` well-funded clients."""
+    with open(DATA_FILE, encoding="utf-8") as f:
+        data = json.load(f)
+    clients = []
+    for n in range(users):
+        template = data["clients"][n % len(data["clients"])]
+        local, domain = template["email"]["S"].split("@", 1)
+        clients.append(dict(template, user_id={"S": f"load{n + 1:06d}"}, email={"S": f"{local}+{n + 1}@{domain}"},
+                            balance={"N": "1000000000000"}))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"clients": clients, "funds": data["funds"]}, f)
+    return {"user_ids": [c["user_id"]["S"] for c in clients], "fund_ids": [f["id_fund"]["S"] for f in data["funds"]]}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(seed_path: str, env: Dict[str, str], startup_timeout: float = 30.0):
+    """Run the API under uvicorn with the memory backend; returns (process, base URL)."""
+    port = _free_port()
+    process_env = dict(os.environ, STORAGE_BACKEND="memory", STORAGE_SEED_FILE=seed_path, LOG_LEVEL="WARNING")
+    process_env.update(env)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        env=process_env)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The app exited during startup (code {process.returncode}).")
+        try:
+            if httpx.get(f"{url}/v1/funds/health", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"The app did not answer on {url} within {startup_timeout}s.")
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(url: str, workload: Workload, stages: List[float], duration: float, warmup: float,
+              arrivals: str, connections: int, max_in_flight: int, timeout: float, slo_p99_ms: float,
+              slo_failure_rate: float, seed: int) -> List[dict]:
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    rng = random.Random(seed)
+    reports = []
+    async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+        if warmup > 0:
+            await run_stage(client, workload, stages[0], warmup, arrivals, max_in_flight, timeout, rng)
+        for rps in stages:
+            stats, elapsed = await run_stage(client, workload, rps, duration, arrivals, max_in_flight, timeout, rng)
+            report = summarize(stats, rps, elapsed, slo_p99_ms, slo_failure_rate)
+            reports.append(report)
+            logger.warning("%7.1f rps target: %7.1f achieved, p99 %8.2f ms, failures %.2f%% -> %s", rps,
+                           report["achieved_rps"], report["p99_ms"], report["failure_rate"] * 100,
+                           "ok" if report["slo_met"] else "SLO missed")
+    return reports
+
+
+def format_report(stages: List[dict]) -> str:
+    header = (f"{'target':>8}{'achieved':>10}{'goodput':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'errors':>8}{'shed':>8}{'4xx':>8}  SLO")
+    lines = [header, "-" * len(header)]
+    for s in stages:
+        lines.append(f"{s['target_rps']:>8.1f}{s['achieved_rps']:>10.1f}{s['goodput_rps']:>9.1f}{s['p50_ms']:>9.2f}"
+                     f"{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}{s['error_rate']:>8.2%}{s['shed_rate']:>8.2%}"
+                     f"{s['rejected_rate']:>8.2%}  {'ok' if s['slo_met'] else 'missed'}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--url", help="target an app already running here instead of starting one")
+    parser.add_argument("--users", type=int, default=1000, help="user cardinality (seeded when starting the app)")
+    parser.add_argument("--zipf", type=float, default=1.0, help="hot-fund skew exponent (0 = uniform)")
+    parser.add_argument("--history-ratio", type=float, default=0.5, help="fraction of requests reading history")
+    parser.add_argument("--subscribe-ratio", type=float, default=0.5, help="fraction of writes that subscribe")
+    parser.add_argument("--page-size", type=int, default=20, help="history page size")
+    parser.add_argument("--rps", default="50,100,200", help="comma-separated target rates, one stage each")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per stage")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unreported seconds at the first rate")
+    parser.add_argument("--arrivals", choices=("constant", "poisson"), default="constant")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="generator-side cap, beyond it requests are dropped")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--slo-p99-ms", type=float, default=250.0)
+    parser.add_argument("--slo-failure-rate", type=float, default=0.01, help="errors + shed + dropped")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="environment for the locally started app (repeatable)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    parser.add_argument("--write-seed", metavar="PATH", help="only write the seed for --users clients and exit")
+    args = parser.parse_args(argv)
+    if args.write_seed:
+        write_seed(args.write_seed, args.users)
+        return 0
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    stages = [float(rps) for rps in args.rps.split(",") if rps.strip()]
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    process = None
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_path = os.path.join(tmp, "seed.json")
+        fixture = write_seed(seed_path, args.users)
+        if args.url:
+            url = args.url
+        else:
+            process, url = start_app(seed_path, dict(pair.split("=", 1) for pair in args.app_env))
+        workload = Workload(fixture["user_ids"], fixture["fund_ids"], args.zipf, args.history_ratio,
+                            args.subscribe_ratio, args.page_size, args.seed)
+        try:
+            reports = asyncio.run(run(url, workload, stages, args.duration, args.warmup, args.arrivals,
+                                      args.connections, args.max_in_flight, args.timeout, args.slo_p99_ms,
+                                      args.slo_failure_rate, args.seed))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+
+    result = {
+        "commit": _commit(),
+        "started_at": started_at,
+        "config": {key: value for key, value in vars(args).items() if key not in ("json_path", "app_env", "write_seed")},
+        "stages": reports,
+        "saturation": saturation(reports),
+    }
+    print(format_report(reports))
+    print(json.dumps(result["saturation"]))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+import json
+import os
+import threading
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from xml.sax.saxutils import escape
+
+import boto3
+import yaml
+from botocore.awsrequest import AWSResponse
+
+from app.utils import aws
+from app.utils.admission import watch_throttling
+from app.utils.metrics import instrument_client
+from benchmarks.expressions import (ExpressionError, compile_condition, compile_key_condition,
+                                    compile_update, to_python)
+
+# In-process DynamoDB/SNS stand-in. Real boto3 clients are used end to end
+# (parameter validation, serialization, signing, retries, response parsing and
+# our metrics hooks); only the HTTP send is answered locally through botocore's
+# ``before-send`` event, so round trips can be counted exactly.
+
+# Key schemas and indexes come from the CloudFormation template, so the stand-in
+# rejects exactly the keys the deployed tables would.
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "iac", "template.yaml")
+
+
+class _TemplateLoader(yaml.SafeLoader):
+    """Reads a CloudFormation template; intrinsic functions (!Ref, !Sub, ...) load as None."""
+
+
+_TemplateLoader.add_multi_constructor("!", lambda loader, suffix, node: None)
+
+
+def _key_schema(schema: List[dict]) -> Tuple[str, Optional[str]]:
+    keys = {entry["KeyType"]: entry["AttributeName"] for entry in schema}
+    return keys["HASH"], keys.get("RANGE")
+
+
+def load_tables(path: str = TEMPLATE) -> dict:
+    """Key schema and secondary indexes of every DynamoDB table declared in the template."""
+    with open(path, encoding="utf-8") as f:
+        template = yaml.load(f, Loader=_TemplateLoader)
+    tables = {}
+    for resource in template["Resources"].values():
+        if resource.get("Type") != "AWS::DynamoDB::Table":
+            continue
+        properties = resource["Properties"]
+        indexes = properties.get("GlobalSecondaryIndexes", []) + properties.get("LocalSecondaryIndexes", [])
+        tables[properties["TableName"]] = {
+            "key": _key_schema(properties["KeySchema"]),
+            "indexes": {index["IndexName"]: _key_schema(index["KeySchema"]) for index in indexes}
+        }
+    return tables
+
+
+TABLES = load_tables()
+
+
+class ServiceError(Exception):
+    def __init__(self, code: str, message: str, status: int = 400, **extra):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+
+def _conditional_failure():
+    return ServiceError("ConditionalCheckFailedException", "The conditional request failed")
+
+
+class _Table:
+    def __init__(self, name: str, key: Tuple[str, Optional[str]], indexes: Dict[str, Tuple[str, Optional[str]]]):
+        self.name = name
+        self.key = key
+        self.indexes = indexes
+        self.items: Dict[tuple, dict] = {}
+        # (index name or None, partition value) -> primary keys, so a Query only
+        # touches its own partition.
+        self.partitions: Dict[tuple, set] = defaultdict(set)
+
+    def _partition_keys(self, item: dict):
+        for index, (hash_key, _) in [(None, self.key)] + list(self.indexes.items()):
+            if hash_key in item:
+                yield index, to_python(item[hash_key])
+
+    def put(self, key: tuple, item: dict):
+        self.delete(key)
+        self.items[key] = item
+        for partition in self._partition_keys(item):
+            self.partitions[partition].add(key)
+
+    def delete(self, key: tuple):
+        old = self.items.pop(key, None)
+        if old is not None:
+            for partition in self._partition_keys(old):
+                self.partitions[partition].discard(key)
+
+    def partition(self, index: Optional[str], value) -> List[dict]:
+        return [self.items[key] for key in self.partitions.get((index, value), ())]
+
+    def key_of(self, item: dict) -> tuple:
+        hash_key, range_key = self.key
+        try:
+            values = [to_python(item[hash_key])]
+            if range_key:
+                values.append(to_python(item[range_key]))
+        except KeyError as e:
+            raise ServiceError("ValidationException", f"Missing the key {e.args[0]} in the item")
+        return tuple(values)
+
+    def key_attributes(self, item: dict, index: Optional[str] = None) -> dict:
+        names = [name for name in self.key if name]
+        if index:
+            names += [name for name in self.indexes[index] if name]
+        return {name: item[name] for name in names if name in item}
+
+
+class LocalDynamoDB:
+    """Thread-safe in-memory backend answering the DynamoDB JSON protocol."""
+
+    def __init__(self, tables: dict = None):
+        self._lock = threading.Lock()
+        self.tables = {
+            name: _Table(name, schema["key"], schema["indexes"])
+            for name, schema in (tables or TABLES).items()
+        }
+        self.calls = Counter()
+
+    def table(self, name: str) -> _Table:
+        table = self.tables.get(name)
+        if table is None:
+            raise ServiceError("ResourceNotFoundException", f"Requested resource not found: Table: {name} not found")
+        return table
+
+    def seed(self, table_name: str, items: List[dict]):
+        """Load items (DynamoDB JSON) without counting them as calls."""
+        table = self.table(table_name)
+        with self._lock:
+            for item in items:
+                table.put(table.key_of(item), item)
+
+    def count(self, table_name: str) -> int:
+        return len(self.table(table_name).items)
+
+    def handle(self, operation: str, params: dict) -> dict:
+        handler = getattr(self, f"_{operation}", None)
+        if handler is None:
+            raise ServiceError("UnknownOperationException", f"{operation} is not supported by the local stand-in")
+        self.calls[operation] += 1
+        try:
+            with self._lock:
+                return handler(params)
+        except ExpressionError as e:
+            raise ServiceError("ValidationException", str(e))
+
+    @staticmethod
+    def _check(condition: Optional[str], params: dict, item: dict) -> bool:
+        if not condition:
+            return True
+        return compile_condition(condition, params.get("ExpressionAttributeNames"),
+                                 params.get("ExpressionAttributeValues"))(item)
+
+    def _GetItem(self, params: dict) -> dict:
+        table = self.table(params["TableName"])
+        item = table.items.get(table.key_of(params["Key"]))
+        return {"Item": item} if item is not None else {}
+
+    def _PutItem(self, params: dict) -> dict:
+        table = self.table(params["TableName"])
+        key = table.key_of(params["Item"])
+        old = table.items.get(key)
+        if not self._check(params.get("ConditionExpression"), params, old or {}):
+            raise _conditional_failure()
+        table.put(key, dict(params["Item"]))
+        return {"Attributes": old} if old and params.get("ReturnValues") == "ALL_OLD" else {}
+
+    def _apply_update(self, params: dict) -> Tuple[_Table, tuple, Optional[dict], dict]:
+        table = self.table(params["TableName"])
+        key = table.key_of(params["Key"])
+        old = table.items.get(key)
+        if not self._check(params.get("ConditionExpression"), params, old or {}):
+            raise _conditional_failure()
+        new = dict(old or params["Key"])
+        if params.get("UpdateExpression"):
+            compile_update(params["UpdateExpression"], params.get("ExpressionAttributeNames"),
+                           params.get("ExpressionAttributeValues"))(new)
+        return table, key, old, new
+
+    def _UpdateItem(self, params: dict) -> dict:
+        table, key, old, new = self._apply_update(params)
+        table.put(key, new)
+        return_values = params.get("ReturnValues", "NONE")
+        if return_values == "ALL_NEW":
+            return {"Attributes": new}
+        if return_values == "UPDATED_NEW":
+            return {"Attributes": {k: v for k, v in new.items() if (old or {}).get(k) != v}}
+        if return_values == "ALL_OLD" and old:
+            return {"Attributes": old}
+        return {}
+
+    def _DeleteItem(self, params: dict) -> dict:
+        table = self.table(params["TableName"])
+        key = table.key_of(params["Key"])
+        old = table.items.get(key)
+        if not self._check(params.get("ConditionExpression"), params, old or {}):
+            raise _conditional_failure()
+        table.delete(key)
+        return {"Attributes": old} if old and params.get("ReturnValues") == "ALL_OLD" else {}
+
+    def _page(self, table: _Table, candidates: List[dict], params: dict, order, index: Optional[str]) -> dict:
+        start_key = params.get("ExclusiveStartKey")
+        if start_key:
+            boundary = order(start_key)
+            reverse = params.get("ScanIndexForward", True) is False
+            candidates = [item for item in candidates
+                          if (order(item) < boundary if reverse else order(item) > boundary)]
+
+        limit = params.get("Limit")
+        evaluated = candidates[:limit] if limit else candidates
+        filter_expression = params.get("FilterExpression")
+        if filter_expression:
+            matches = compile_condition(filter_expression, params.get("ExpressionAttributeNames"),
+                                        params.get("ExpressionAttributeValues"))
+            items = [item for item in evaluated if matches(item)]
+        else:
+            items = evaluated
+
+        response = {"Count": len(items), "ScannedCount": len(evaluated)}
+        if params.get("Select") != "COUNT":
+            response["Items"] = items
+        if limit and len(candidates) > limit:
+            response["LastEvaluatedKey"] = table.key_attributes(evaluated[-1], index)
+        return response
+
+    def _Query(self, params: dict) -> dict:
+        table = self.table(params["TableName"])
+        index = params.get("IndexName")
+        if index and index not in table.indexes:
+            raise ServiceError("ValidationException", f"The table does not have the specified index: {index}")
+        hash_key, range_key = table.indexes[index] if index else table.key
+
+        names = params.get("ExpressionAttributeNames")
+        key_condition, equalities = compile_key_condition(
+            params["KeyConditionExpression"], names, params.get("ExpressionAttributeValues"))
+        partition = next((value for name, value in equalities if name == hash_key), None)
+        if partition is None:
+            raise ServiceError("ValidationException", "Query condition missed key schema element")
+
+        candidates = [item for item in table.partition(index, to_python(partition)) if key_condition(item)]
+
+        def order(item):
+            sort_value = to_python(item[range_key]) if range_key and range_key in item else ""
+            return sort_value, table.key_of(item)
+
+        candidates.sort(key=order, reverse=params.get("ScanIndexForward", True) is False)
+        return self._page(table, candidates, params, order, index)
+
+    def _Scan(self, params: dict) -> dict:
+        table = self.table(params["TableName"])
+        candidates = sorted(table.items.values(), key=table.key_of)
+        return self._page(table, candidates, params, table.key_of, None)
+
+    def _BatchGetItem(self, params: dict) -> dict:
+        responses = {}
+        for table_name, request in params["RequestItems"].items():
+            table = self.table(table_name)
+            found = [table.items.get(table.key_of(key)) for key in request["Keys"]]
+            responses[table_name] = [item for item in found if item is not None]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def _BatchWriteItem(self, params: dict) -> dict:
+        for table_name, requests in params["RequestItems"].items():
+            table = self.table(table_name)
+            for request in requests:
+                if "PutRequest" in request:
+                    item = request["PutRequest"]["Item"]
+                    table.put(table.key_of(item), dict(item))
+                else:
+                    table.delete(table.key_of(request["DeleteRequest"]["Key"]))
+        return {"UnprocessedItems": {}}
+
+    def _TransactWriteItems(self, params: dict) -> dict:
+        # Evaluate every condition against the current state first, then apply all or nothing.
+        staged, reasons = [], []
+        for action in params["TransactItems"]:
+            (kind, request), = action.items()
+            table = self.table(request["TableName"])
+            try:
+                if kind == "Put":
+                    key = table.key_of(request["Item"])
+                    if not self._check(request.get("ConditionExpression"), request, table.items.get(key) or {}):
+                        raise _conditional_failure()
+                    staged.append((table, key, dict(request["Item"])))
+                elif kind == "Update":
+                    _, key, _, new = self._apply_update(request)
+                    staged.append((table, key, new))
+                elif kind in ("Delete", "ConditionCheck"):
+                    key = table.key_of(request["Key"])
+                    if not self._check(request.get("ConditionExpression"), request, table.items.get(key) or {}):
+                        raise _conditional_failure()
+                    if kind == "Delete":
+                        staged.append((table, key, None))
+                else:
+                    raise ServiceError("ValidationException", f"Unsupported transaction action {kind}")
+                reasons.append({"Code": "None"})
+            except ServiceError as e:
+                if e.code != "ConditionalCheckFailedException":
+                    raise
+                reasons.append({"Code": "ConditionalCheckFailed", "Message": e.message})
+
+        if any(reason["Code"] != "None" for reason in reasons):
+            codes = ", ".join(reason["Code"] for reason in reasons)
+            raise ServiceError(
+                "TransactionCanceledException",
+                f"Transaction cancelled, please refer cancellation reasons for specific reasons [{codes}]",
+                CancellationReasons=reasons
+            )
+        for table, key, item in staged:
+            if item is None:
+                table.delete(key)
+            else:
+                table.put(key, item)
+        return {}
+
+
+class LocalSNS:
+    """Records Publish/PublishBatch calls and answers them in the SNS query protocol."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.messages: List[Tuple[str, str]] = []
+        self.calls = Counter()
+
+    def handle(self, operation: str, params: dict) -> str:
+        self.calls[operation] += 1
+        topic_arn = params.get("TopicArn", [""])[0]
+        if operation == "Publish":
+            with self._lock:
+                self.messages.append((topic_arn, params.get("Message", [""])[0]))
+            return f"<PublishResult><MessageId>{uuid.uuid4()}</MessageId></PublishResult>"
+        if operation == "PublishBatch":
+            members = []
+            index = 1
+            while f"PublishBatchRequestEntries.member.{index}.Id" in params:
+                prefix = f"PublishBatchRequestEntries.member.{index}"
+                with self._lock:
+                    self.messages.append((topic_arn, params.get(f"{prefix}.Message", [""])[0]))
+                members.append(
+                    f"<member><Id>{escape(params[prefix + '.Id'][0])}</Id><MessageId>{uuid.uuid4()}</MessageId></member>"
+                )
+                index += 1
+            return f"<PublishBatchResult><Successful>{''.join(members)}</Successful><Failed/></PublishBatchResult>"
+        raise ServiceError("InvalidAction", f"{operation} is not supported by the local stand-in")
+
+
+class _Body:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def stream(self, **kwargs):
+        yield self.content
+
+
+def _dynamodb_responder(backend: LocalDynamoDB):
+    def before_send(request, **kwargs):
+        target = request.headers["X-Amz-Target"]
+        if isinstance(target, bytes):
+            target = target.decode("ascii")
+        operation = target.split(".", 1)[1]
+        try:
+            status, body = 200, backend.handle(operation, json.loads(request.body or b"{}"))
+        except ServiceError as e:
+            status = e.status
+            body = {"__type": f"com.amazonaws.dynamodb.v20120810#{e.code}", "message": e.message, **e.extra}
+        return AWSResponse(request.url, status, {"x-amzn-RequestId": uuid.uuid4().hex},
+                           _Body(json.dumps(body).encode("utf-8")))
+    return before_send
+
+
+def _sns_responder(backend: LocalSNS):
+    namespace = "http://sns.amazonaws.com/doc/2010-03-31/"
+
+    def before_send(request, **kwargs):
+        body = request.body.decode("utf-8") if isinstance(request.body, bytes) else request.body
+        params = parse_qs(body or "", keep_blank_values=True)
+        operation = params.get("Action", [""])[0]
+        metadata = f"<ResponseMetadata><RequestId>{uuid.uuid4()}</RequestId></ResponseMetadata>"
+        try:
+            status = 200
+            content = f'<{operation}Response xmlns="{namespace}">{backend.handle(operation, params)}{metadata}</{operation}Response>'
+        except ServiceError as e:
+            status = e.status
+            content = (f'<ErrorResponse xmlns="{namespace}"><Error><Type>Sender</Type><Code>{e.code}</Code>'
+                       f'<Message>{escape(e.message)}</Message></Error>{metadata}</ErrorResponse>')
+        return AWSResponse(request.url, status, {"x-amzn-RequestId": uuid.uuid4().hex},
+                           _Body(content.encode("utf-8")))
+    return before_send
+
+
+def install(dynamodb: Optional[LocalDynamoDB] = None, sns: Optional[LocalSNS] = None) -> Tuple[LocalDynamoDB, LocalSNS]:
+    """Point the shared AWS clients in ``app.utils.aws`` at local stand-ins."""
+    dynamodb = dynamodb or LocalDynamoDB()
+    sns = sns or LocalSNS()
+    session = boto3.session.Session(aws_access_key_id="local", aws_secret_access_key="local",
+                                    region_name=aws.settings.aws_region)
+
+    resource = session.resource("dynamodb", config=aws.client_config())
+    resource.meta.client.meta.events.register("before-send.dynamodb", _dynamodb_responder(dynamodb))
+    instrument_client(resource.meta.client, "dynamodb")
+    watch_throttling(resource.meta.client, "dynamodb")
+
+    sns_client = session.client("sns", config=aws.client_config())
+    sns_client.meta.events.register("before-send.sns", _sns_responder(sns))
+    instrument_client(sns_client, "sns")
+
+    aws.set_dynamodb(resource)
+    aws.set_sns_client(sns_client)
+    return dynamodb, sns
+
+
+def backend_calls(dynamodb: LocalDynamoDB, sns: LocalSNS) -> Counter:
+    calls = Counter({f"dynamodb.{op}": n for op, n in dynamodb.calls.items()})
+    calls.update({f"sns.{op}": n for op, n in sns.calls.items()})
+    return calls
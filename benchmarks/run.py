@@ -0,0 +1,210 @@
+"""Service-layer benchmarks against the in-process DynamoDB/SNS stand-in.
+
+    python -m benchmarks.run --clients 500 --ops 1000 --history 20
+    python -m benchmarks.run --json results.json --baseline benchmarks/baseline.json
+
+Every benchmark calls the real service functions; only the HTTP send to AWS is
+answered locally. Backend calls per operation are exact, so a change that adds a
+round trip shows up even when latency noise hides it. With ``--baseline`` the run
+fails when any benchmark makes more backend calls per operation than recorded.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Callable, List, Sequence
+
+from boto3.dynamodb.types import TypeSerializer
+
+from app.repositories.tables import CLIENTS_TABLE, FUNDS_TABLE, TRANSACTIONS_TABLE
+from app.services import fund_catalog
+from app.services.client_service import get_client
+from app.services.funds_service import build_transaction_record, create_transaction
+from app.services.history_service import list_transactions
+from app.utils.relations import is_subscribed
+from app.utils.serialization import dumps
+from benchmarks.local_aws import LocalDynamoDB, LocalSNS, backend_calls, install
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "iac", "data.json")
+
+serializer = TypeSerializer()
+
+
+def seed(dynamodb: LocalDynamoDB, clients: int, history_per_client: int, seed_value: int = 7) -> dict:
+    """Load funds from iac/data.json and ``clients`` clients cloned from its client rows.
+
+    Balances are topped up to cover every fund so subscribe never fails for lack
+    of funds. Each client gets ``history_per_client`` history rows.
+    """
+    with open(DATA_FILE, encoding="utf-8") as f:
+        data = json.load(f)
+
+    funds = data["funds"]
+    dynamodb.seed(FUNDS_TABLE, funds)
+    total_minimum = sum(Decimal(fund["minimum_amount"]["N"]) for fund in funds)
+
+    rng = random.Random(seed_value)
+    fund_ids = [fund["id_fund"]["S"] for fund in funds]
+    user_ids, client_items, history_items = [], [], []
+    for n in range(clients):
+        template = data["clients"][n % len(data["clients"])]
+        user_id = f"user{n + 1:06d}"
+        local, domain = template["email"]["S"].split("@", 1)
+        balance = max(Decimal(template["balance"]["N"]), total_minimum)
+        client_items.append(dict(template, user_id={"S": user_id}, email={"S": f"{local}+{n + 1}@{domain}"},
+                                 balance={"N": str(balance)}))
+        user_ids.append(user_id)
+        for _ in range(history_per_client):
+            id_fund = rng.choice(fund_ids)
+            item, _ = build_transaction_record(user_id, id_fund, rng.choice(["subscribe", "cancel"]), None,
+                                               75000, float(balance))
+            history_items.append({k: serializer.serialize(v) for k, v in item.items()})
+
+    dynamodb.seed(CLIENTS_TABLE, client_items)
+    dynamodb.seed(TRANSACTIONS_TABLE, history_items)
+    return {"user_ids": user_ids, "fund_ids": fund_ids}
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(name: str, func: Callable, calls: Sequence[tuple], dynamodb: LocalDynamoDB, sns: LocalSNS,
+            threads: int = 1) -> dict:
+    """Run ``func(*args)`` for each entry of ``calls`` and summarize latency and backend calls."""
+    latencies = []
+
+    def timed(args):
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+
+    before = backend_calls(dynamodb, sns)
+    started = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(timed, calls))
+    else:
+        for args in calls:
+            timed(args)
+    elapsed = time.perf_counter() - started
+    after = backend_calls(dynamodb, sns)
+
+    ops = len(calls)
+    latencies.sort()
+    delta = Counter({key: after[key] - before[key] for key in after if after[key] != before[key]})
+    return {
+        "name": name,
+        "ops": ops,
+        "ops_per_sec": ops / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        "calls_per_op": sum(delta.values()) / ops if ops else 0.0,
+        "calls": {key: round(value / ops, 3) for key, value in sorted(delta.items())} if ops else {},
+    }
+
+
+def run(clients: int = 200, ops: int = 500, history: int = 20, page_size: int = 50, threads: int = 1,
+        seed_value: int = 7) -> List[dict]:
+    dynamodb, sns = install()
+    fixture = seed(dynamodb, clients, history, seed_value)
+    user_ids, fund_ids = fixture["user_ids"], fixture["fund_ids"]
+    rng = random.Random(seed_value)
+
+    # Warm botocore's model loading and the fund catalog cache outside the measurements.
+    fund_catalog.invalidate()
+    get_client(user_ids[0])
+    list_transactions(user_id=user_ids[0], limit=1)
+    for id_fund in fund_ids:
+        fund_catalog.get_fund(id_fund)
+
+    pairs = [(user_id, id_fund) for user_id in user_ids for id_fund in fund_ids]
+    rng.shuffle(pairs)
+    pairs = pairs[:ops]
+
+    random_users = [(rng.choice(user_ids),) for _ in range(ops)]
+    random_pairs = [(rng.choice(user_ids), rng.choice(fund_ids)) for _ in range(ops)]
+
+    return [
+        measure("get_client", get_client, random_users, dynamodb, sns, threads),
+        measure("is_subscribed", is_subscribed, random_pairs, dynamodb, sns, threads),
+        measure("create_transaction[subscribe]", create_transaction,
+                [(user_id, id_fund, "subscribe") for user_id, id_fund in pairs], dynamodb, sns, threads),
+        measure("create_transaction[cancel]", create_transaction,
+                [(user_id, id_fund, "cancel") for user_id, id_fund in pairs], dynamodb, sns, threads),
+        measure("list_transactions", lambda user_id: list_transactions(user_id=user_id, limit=page_size),
+                random_users, dynamodb, sns, threads),
+        measure("history_response", lambda user_id: dumps(list_transactions(user_id=user_id, limit=page_size)),
+                random_users, dynamodb, sns, threads),
+    ]
+
+
+def format_report(results: List[dict]) -> str:
+    header = f"{'benchmark':<32}{'ops':>7}{'ops/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'calls/op':>10}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(
+            f"{r['name']:<32}{r['ops']:>7}{r['ops_per_sec']:>10.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+            f"{r['p99_ms']:>9.2f}{r['max_ms']:>9.2f}{r['calls_per_op']:>10.2f}"
+        )
+        lines.append(" " * 4 + ", ".join(f"{call}={count}" for call, count in r["calls"].items()))
+    return "\n".join(lines)
+
+
+def compare_to_baseline(results: List[dict], baseline: dict) -> List[str]:
+    """Return one message per benchmark whose backend calls per operation went up."""
+    regressions = []
+    for r in results:
+        expected = baseline.get(r["name"])
+        if expected is not None and r["calls_per_op"] > expected + 1e-9:
+            regressions.append(f"{r['name']}: {r['calls_per_op']:.2f} calls/op, baseline {expected:.2f}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--clients", type=int, default=200, help="clients to seed")
+    parser.add_argument("--ops", type=int, default=500, help="operations per benchmark")
+    parser.add_argument("--history", type=int, default=20, help="history rows seeded per client")
+    parser.add_argument("--page-size", type=int, default=50, help="history page size")
+    parser.add_argument("--threads", type=int, default=1, help="concurrent callers")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    parser.add_argument("--baseline", help="fail if calls/op exceed the values in this file")
+    parser.add_argument("--write-baseline", action="store_true", help="record this run's calls/op as the baseline")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run(args.clients, args.ops, args.history, args.page_size, args.threads, args.seed)
+    print(format_report(results))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline and args.write_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({r["name"]: r["calls_per_op"] for r in results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f))
+        if regressions:
+            print("\nBackend round-trip regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
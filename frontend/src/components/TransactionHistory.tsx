@@ -4,7 +4,9 @@ import { TransactionHistoryModel } from '../types/funds';
 
 const TransactionHistory: React.FC = () => {
   const [transactions, setTransactions] = useState<TransactionHistoryModel[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
   useEffect(() => {
@@ -14,8 +16,9 @@ const TransactionHistory: React.FC = () => {
   const fetchHistory = async () => {
     try {
       setLoading(true);
-      const data = await fundsApi.getHistory();
-      setTransactions(data);
+      const page = await fundsApi.getHistory();
+      setTransactions(page.items);
+      setNextCursor(page.next_cursor);
       setError(null);
     } catch (error: any) {
       setError(error.response?.data?.detail || 'Error al cargar el historial');
@@ -24,6 +27,21 @@ const TransactionHistory: React.FC = () => {
     }
   };
 
+  const fetchMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const page = await fundsApi.getHistory({ cursor: nextCursor });
+      setTransactions((current) => [...current, ...page.items]);
+      setNextCursor(page.next_cursor);
+      setError(null);
+    } catch (error: any) {
+      setError(error.response?.data?.detail || 'Error al cargar el historial');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const formatDate = (dateString: string) => {
     return new Date(dateString).toLocaleString('es-ES');
   };
@@ -124,6 +142,17 @@ const TransactionHistory: React.FC = () => {
           </table>
         </div>
       )}
+
+      {nextCursor && (
+        <button
+          onClick={fetchMore}
+          className="btn btn-secondary"
+          style={{ width: '100%', marginTop: '1rem' }}
+          disabled={loadingMore}
+        >
+          {loadingMore ? 'Cargando...' : 'Cargar más'}
+        </button>
+      )}
     </div>
   );
 };
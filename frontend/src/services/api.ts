@@ -1,8 +1,10 @@
 import axios from 'axios';
 import { 
+  ClientPortfolio,
   FundTransactionRequest, 
   FundTransactionResponse, 
-  TransactionHistoryModel 
+  TransactionHistoryPage,
+  TransactionHistoryQuery
 } from '../types/funds';
 
 const getApiUrl = (): string => {
@@ -114,10 +116,10 @@ export const fundsApi = {
     }
   },
 
-  getHistory: async (): Promise<TransactionHistoryModel[]> => {
+  getHistory: async (params?: TransactionHistoryQuery): Promise<TransactionHistoryPage> => {
     try {
-      log.info('Get history request started');
-      const response = await api.get('/v1/funds/history');
+      log.info('Get history request started', params);
+      const response = await api.get<TransactionHistoryPage>('/v1/funds/history', { params });
       log.success('Get history completed successfully', response.data);
       return response.data;
     } catch (error) {
@@ -125,6 +127,18 @@ export const fundsApi = {
       throw error;
     }
   },
+
+  getPortfolio: async (userId: string): Promise<ClientPortfolio> => {
+    try {
+      log.info('Get portfolio request started', { userId });
+      const response = await api.get<ClientPortfolio>(`/v1/clients/${encodeURIComponent(userId)}/portfolio`);
+      log.success('Get portfolio completed successfully', response.data);
+      return response.data;
+    } catch (error) {
+      log.error('Get portfolio failed', error);
+      throw error;
+    }
+  },
 };
 
 export default api;
\ No newline at end of file
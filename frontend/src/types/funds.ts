@@ -24,6 +24,36 @@ export interface TransactionHistoryModel {
   notification: boolean;
 }
 
+export interface TransactionHistoryPage {
+  items: TransactionHistoryModel[];
+  next_cursor: string | null;
+}
+
+export interface TransactionHistoryQuery {
+  user_id?: string;
+  id_fund?: string;
+  transaction_type?: "subscribe" | "cancel";
+  start?: string;
+  end?: string;
+  limit?: number;
+  cursor?: string;
+}
+
+export interface PortfolioHolding {
+  id_fund: string;
+  name: string | null;
+  category: string | null;
+  amount: number;
+  subscribed_at: string | null;
+}
+
+export interface ClientPortfolio {
+  user_id: string;
+  balance: number;
+  holdings: PortfolioHolding[];
+  total_committed: number;
+}
+
 export interface ClientModel {
   user_id: string;
   name: string;
@@ -8,6 +8,7 @@ httpx.Client.__init__ = _patched_init
 import sys, types
 sys.modules["email_validator"] = types.ModuleType("email_validator")
 
+import json
 import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime, timezone
@@ -15,7 +16,7 @@ from datetime import datetime, timezone
 from app.main import app
 import app.routers.funds as router
 
-def fake_create_transaction(user_id, id_fund, transaction_type, notification_type=None):
+async def fake_create_transaction(user_id, id_fund, transaction_type, notification_type=None, idempotency_key=None):
     return {
         "transaction_id": "fake-tx-id",
         "user_id": user_id,
@@ -27,7 +28,7 @@ def fake_create_transaction(user_id, id_fund, transaction_type, notification_typ
 
 @pytest.fixture(autouse=True)
 def stub_router_tx(monkeypatch):
-    monkeypatch.setattr(router, "create_transaction", fake_create_transaction)
+    monkeypatch.setattr(router, "create_transaction_async", fake_create_transaction)
 
 client = TestClient(app)
 
@@ -90,3 +91,1044 @@ def test_cancel_invalid_type():
     r = client.post("/v1/funds/cancel", json=payload)
     assert r.status_code == 400
     assert "Invalid transaction type" in r.json()["detail"]
+
+
+def test_history_page(monkeypatch):
+    calls = {}
+
+    async def fake_list_transactions(**kwargs):
+        calls.update(kwargs)
+        return {
+            "items": [{
+                "transaction_id": "t1",
+                "user_id": "u1",
+                "id_fund": "F123",
+                "timestamp": datetime(2025, 5, 3, 0, 0, tzinfo=timezone.utc),
+                "transaction_type": "subscribe",
+                "amount": 75000,
+                "notification": True
+            }],
+            "next_cursor": "abc"
+        }
+
+    monkeypatch.setattr(router, "list_transactions_async", fake_list_transactions)
+    r = client.get("/v1/funds/history", params={"user_id": "u1", "limit": 1})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["next_cursor"] == "abc"
+    assert data["items"][0]["transaction_id"] == "t1"
+    assert calls["user_id"] == "u1"
+    assert calls["limit"] == 1
+
+
+def test_history_invalid_cursor():
+    r = client.get("/v1/funds/history", params={"cursor": "not-a-cursor"})
+    assert r.status_code == 400
+
+
+def _history_row(transaction_id):
+    from app.models.fund import TransactionHistoryModel
+    return TransactionHistoryModel(
+        transaction_id=transaction_id,
+        user_id="u1",
+        id_fund="F123",
+        timestamp=datetime(2025, 5, 3, 0, 0, tzinfo=timezone.utc),
+        transaction_type="subscribe",
+        amount=75000,
+        notification=False
+    )
+
+
+def test_history_export_ndjson(monkeypatch):
+    monkeypatch.setattr(router, "iter_transactions", lambda **kwargs: iter([_history_row("t1"), _history_row("t2")]))
+    r = client.get("/v1/funds/history/export", params={"format": "ndjson"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = r.text.strip().split("\n")
+    assert [json.loads(line)["transaction_id"] for line in lines] == ["t1", "t2"]
+
+
+def test_history_export_csv(monkeypatch):
+    monkeypatch.setattr(router, "iter_transactions", lambda **kwargs: iter([_history_row("t1")]))
+    r = client.get("/v1/funds/history/export", params={"format": "csv"})
+    assert r.status_code == 200
+    lines = r.text.strip().splitlines()
+    assert lines[0].startswith("transaction_id,user_id,id_fund")
+    assert lines[1].startswith("t1,u1,F123")
+
+
+def test_fast_json_matches_response_model(monkeypatch):
+    from decimal import Decimal
+    from app.models.fund import TransactionHistoryPage
+    from app.services.history_service import to_history_row
+    from app.utils import serialization
+
+    row = to_history_row({
+        "transaction_id": "t1", "user_id": "u1", "transaction_type": "subscribe", "amount": Decimal("75000.0"),
+        "user_id#fund_id#timestamp": "u1#F123#2025-05-03T00:00:00.123456+00:00"
+    })
+    page = {"items": [row], "next_cursor": None}
+    expected = TransactionHistoryPage(**page).model_dump_json().encode()
+    assert serialization.dumps(page) == expected
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert serialization.dumps(page) == expected
+
+
+def test_app_import_defers_boto3():
+    import subprocess
+    code = ("import sys, types; sys.modules['email_validator'] = types.ModuleType('email_validator'); "
+            "import app.main; print('boto3' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "False"
+
+
+def test_warm_up_reports_startup_phases(monkeypatch):
+    from app import repositories
+    from app.repositories.memory import MemoryStorage
+    from app.config.settings import settings
+    from app.services import fund_catalog, warmup
+
+    storage = MemoryStorage()
+    storage.funds_by_id["F1"] = {"id_fund": "F1", "name": "Fondo 1", "minimum_amount": 75000}
+    reads = []
+    monkeypatch.setattr(storage.funds, "get", lambda id_fund: reads.append(id_fund))
+    monkeypatch.setattr(warmup, "_first_request_seen", False)
+    repositories.set_storage(storage)
+    fund_catalog.invalidate()
+    try:
+        warmup.warm_up()
+        assert fund_catalog.cache_stats()["catalog_loaded"]
+        client.get("/health")
+        assert warmup.first_request_pending()
+        client.get("/v1/funds")
+    finally:
+        repositories.reset()
+        fund_catalog.invalidate()
+
+    assert len(reads) == settings.warmup_connections
+    report = warmup.report()
+    assert report["warmup"] is not None and report["import"] is not None and report["first_request"] is not None
+    assert not warmup.first_request_pending()
+
+
+@pytest.fixture
+def admission_settings(monkeypatch):
+    from app.config.settings import settings
+    from app.utils import admission
+
+    yield settings
+    monkeypatch.undo()
+    admission.configure()
+
+
+def test_admission_sheds_with_retry_after(admission_settings, monkeypatch):
+    from app.utils import admission
+    monkeypatch.setattr(admission_settings, "admission_user_rate", 0.5)
+    monkeypatch.setattr(admission_settings, "admission_user_burst", 1)
+    monkeypatch.setattr(admission_settings, "admission_max_concurrency", 1)
+    monkeypatch.setattr(admission_settings, "admission_min_concurrency", 1)
+    admission.configure()
+
+    payload = {"user_id": "burst-user", "id_fund": "F1", "transaction_type": "subscribe"}
+    assert client.post("/v1/funds/subscribe", json=payload).status_code == 200
+    r = client.post("/v1/funds/subscribe", json=payload)
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "2"
+
+    assert admission.limiter().try_acquire()  # the only slot
+    try:
+        r = client.post("/v1/funds/subscribe", json=dict(payload, user_id="other"))
+    finally:
+        admission.release(0.0)
+    assert r.status_code == 503 and "Retry-After" in r.headers
+    assert client.get("/v1/funds/health").status_code == 200
+
+
+def test_admission_ignores_latency_of_bulk_routes(admission_settings):
+    from app.utils import admission
+    admission.configure()
+    limiter = admission.limiter()
+
+    for path in ("/v1/funds/batch", "/v1/funds/history/export"):
+        assert limiter.try_acquire()
+        admission.release(30.0, path)
+    assert (limiter.limit, limiter.in_flight) == (limiter.max_limit, 0)
+
+    assert limiter.try_acquire()
+    admission.release(30.0, "/v1/funds/history")
+    assert limiter.limit == limiter.max_limit * limiter.backoff
+
+
+def test_backend_throttling_tightens_limit_and_maps_to_503(admission_settings, monkeypatch):
+    from app.repositories import BackendThrottled
+    from app.repositories.dynamodb import DynamoDBStorage
+    from app.utils import admission, aws
+    from benchmarks.local_aws import ServiceError, install
+
+    monkeypatch.setattr(admission_settings, "aws_max_attempts", 1)
+    admission.configure()
+    dynamodb, _ = install()
+
+    def throttled(params):
+        raise ServiceError("ProvisionedThroughputExceededException", "Rate of requests exceeds the allowed throughput")
+
+    monkeypatch.setattr(dynamodb, "_GetItem", throttled)
+    try:
+        with pytest.raises(BackendThrottled):
+            DynamoDBStorage().clients.get("u1")
+    finally:
+        aws.reset()
+
+    limiter = admission.limiter()
+    assert limiter.limit == max(limiter.min_limit, limiter.max_limit * limiter.backoff)
+    error = admission.throttled_exception(BackendThrottled("throttled"))
+    assert error.status_code == 503 and error.headers["Retry-After"] == "1"
+
+
+def _cancelled(*codes):
+    from botocore.exceptions import ClientError
+    return ClientError({
+        "Error": {"Code": "TransactionCanceledException", "Message": "Transaction cancelled"},
+        "CancellationReasons": [{"Code": code} for code in codes]
+    }, "TransactWriteItems")
+
+
+@pytest.fixture
+def fake_dynamodb():
+    """Swap the shared DynamoDB resource for per-table namespaces the test fills in."""
+    from collections import defaultdict
+    from app.utils import aws
+    tables = defaultdict(types.SimpleNamespace)
+    client = types.SimpleNamespace()
+    aws.set_dynamodb(types.SimpleNamespace(Table=lambda name: tables[name], meta=types.SimpleNamespace(client=client)))
+    yield tables, client
+    aws.reset()
+
+
+@pytest.fixture
+def tx_service(monkeypatch, fake_dynamodb):
+    import app.services.funds_service as service
+    _, dynamodb_client = fake_dynamodb
+    state = {"balance": 500000.0, "writes": []}
+
+    def fake_transact_write_items(TransactItems):
+        state["writes"].append(TransactItems)
+        outcome = state["outcomes"].pop(0)
+        if outcome is not None:
+            raise outcome
+
+    monkeypatch.setattr(service, "get_fund_minimum_amount", lambda id_fund: 75000.0)
+    monkeypatch.setattr(service, "get_client", lambda user_id: {"user_id": user_id, "balance": state["balance"]})
+
+    async def fake_get_client_async(user_id):
+        return {"user_id": user_id, "balance": state["balance"]}
+
+    async def fake_get_fund_async(id_fund):
+        return {"id_fund": id_fund, "minimum_amount": 75000.0}
+
+    monkeypatch.setattr(service, "get_client_async", fake_get_client_async)
+    monkeypatch.setattr(service, "get_fund_async", fake_get_fund_async)
+    dynamodb_client.transact_write_items = fake_transact_write_items
+    monkeypatch.setattr(service.notification_outbox, "enqueue", lambda message: state["outbox"].append(message))
+    state["outbox"] = []
+    return service, state
+
+
+def test_create_transaction_single_write(tx_service):
+    service, state = tx_service
+    state["outcomes"] = [None]
+    result = service.create_transaction("u1", "F123", "subscribe")
+    assert result["new_balance"] == 425000.0
+    assert len(state["writes"]) == 1
+    assert [next(iter(action)) for action in state["writes"][0]] == ["Update", "Put", "Put", "Update"]
+
+
+def test_create_transaction_already_subscribed(tx_service):
+    service, state = tx_service
+    state["outcomes"] = [_cancelled("None", "ConditionalCheckFailed", "None")]
+    with pytest.raises(ValueError, match="already subscribed"):
+        service.create_transaction("u1", "F123", "subscribe")
+
+
+def test_create_transaction_retries_on_balance_race(tx_service):
+    service, state = tx_service
+    state["outcomes"] = [_cancelled("ConditionalCheckFailed", "None", "None"), None]
+    result = service.create_transaction("u1", "F123", "cancel")
+    assert result["new_balance"] == 575000.0
+    assert len(state["writes"]) == 2
+
+
+def test_ttl_cache_eviction():
+    from app.utils.cache import TTLCache
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    cache.set("d", 4, ttl=0)
+    assert cache.get("d") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_fund_catalog_served_from_cache(fake_dynamodb):
+    from app.services import fund_catalog
+    tables, _ = fake_dynamodb
+    scans = []
+
+    def fake_scan(**kwargs):
+        scans.append(kwargs)
+        return {"Items": [{"id_fund": "F123", "name": "F123", "minimum_amount": 75000, "category": "FPV"}]}
+
+    def fail_get_item(**kwargs):
+        raise AssertionError("fund lookup should be served from the cache")
+
+    fund_catalog.invalidate()
+    tables["Funds"].scan = fake_scan
+    tables["Funds"].get_item = fail_get_item
+
+    assert client.get("/v1/funds").json()[0]["id_fund"] == "F123"
+    assert client.get("/v1/funds").json()[0]["minimum_amount"] == 75000
+    assert fund_catalog.get_fund("F123")["name"] == "F123"
+    assert len(scans) == 1
+
+    r = client.post("/v1/funds/admin/cache/invalidate")
+    assert r.status_code == 200
+    assert client.get("/v1/funds/admin/cache").json()["size"] == 0
+
+
+def test_create_transaction_enqueues_notification(tx_service, monkeypatch):
+    service, state = tx_service
+    monkeypatch.setenv("SNS_EMAIL_TOPIC_ARN", "arn:aws:sns:us-east-1:000000000000:email")
+    state["outcomes"] = [None]
+    service.create_transaction("u1", "F123", "subscribe", "email")
+    assert len(state["writes"]) == 1
+    assert [m.topic_arn for m in state["outbox"]] == ["arn:aws:sns:us-east-1:000000000000:email"]
+    assert list(state["outbox"][0].reference) == ["transaction_id"]
+
+
+class FakeSNS:
+    """Local SNS stand-in: fails each entry id listed in ``flaky`` once."""
+
+    def __init__(self, flaky=()):
+        self.calls = []
+        self.flaky = set(flaky)
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.calls.append((TopicArn, [entry["Message"] for entry in PublishBatchRequestEntries]))
+        successful, failed = [], []
+        for entry in PublishBatchRequestEntries:
+            key = entry["Message"]
+            if key in self.flaky:
+                self.flaky.discard(key)
+                failed.append({"Id": entry["Id"], "Code": "InternalError", "SenderFault": False})
+            else:
+                successful.append({"Id": entry["Id"], "MessageId": f"m-{key}"})
+        return {"Successful": successful, "Failed": failed}
+
+
+def test_outbox_batches_per_topic_and_retries():
+    from app.utils.notifier import SnsBatchPublisher
+    from app.utils.outbox import NotificationOutbox, OutboxMessage
+
+    sns = FakeSNS(flaky=["m3"])
+    delivered = []
+    outbox = NotificationOutbox(
+        publish_batch=SnsBatchPublisher(sns),
+        on_delivered=delivered.extend,
+        workers=1,
+        backoff_seconds=0,
+        linger_seconds=0.05
+    )
+    for i in range(12):
+        topic = "email" if i % 4 else "sms"
+        outbox.enqueue(OutboxMessage(topic_arn=topic, message=f"m{i}", subject="s", attributes={}, reference=i))
+    outbox.flush()
+    outbox.stop()
+
+    assert sorted(delivered) == list(range(12))
+    assert all(len(messages) <= 10 for _, messages in sns.calls)
+    assert {topic for topic, _ in sns.calls} == {"email", "sms"}
+    assert ["m3"] in [messages for _, messages in sns.calls]
+
+
+def test_notification_sweep_redrives_undelivered_rows(monkeypatch):
+    from datetime import timedelta
+    from decimal import Decimal
+    from app import repositories
+    from app.repositories import pending_notification_key
+    from app.repositories.dynamodb import DynamoDBStorage
+    from app.services import notification_sweep
+    from app.utils import aws
+    from benchmarks.local_aws import install
+
+    def row(n, minutes_ago, enqueued_minutes_ago=None, **fields):
+        timestamp = (now - timedelta(minutes=minutes_ago)).isoformat()
+        enqueued_at = (now - timedelta(minutes=enqueued_minutes_ago or minutes_ago)).isoformat()
+        return dict({"transaction_id": str(n), "user_id": "u1", "id_fund": "F1", "timestamp": timestamp,
+                     "transaction_type": "subscribe", "amount": Decimal("75000"), "notification": False,
+                     "notification_type": "email", "notification_pending": pending_notification_key(timestamp, n % 4),
+                     "notification_enqueued_at": enqueued_at}, **fields)
+
+    now = datetime(2025, 5, 3, 0, 20, tzinfo=timezone.utc)
+    monkeypatch.setenv("SNS_EMAIL_TOPIC_ARN", "arn:aws:sns:us-east-1:000000000000:email")
+    enqueued = []
+    monkeypatch.setattr(notification_sweep.notification_outbox, "enqueue", enqueued.append)
+    dynamodb, _ = install()
+    storage = DynamoDBStorage()
+    repositories.set_storage(storage)
+    try:
+        delivered = row(2, 30)
+        storage.history.put_many([
+            row(1, 30),                           # lost by the outbox: re-driven
+            delivered,
+            row(3, 40),                           # yesterday's partition, lost too
+            row(4, 1),                            # may still be queued
+            row(5, 30, enqueued_minutes_ago=2),   # re-driven two minutes ago
+            row(6, 3 * 24 * 60),                  # outside the sweep window
+        ])
+        storage.history.mark_notified([{"transaction_id": "2"}])
+        first = notification_sweep.redrive(now)
+        again = notification_sweep.redrive(now + timedelta(minutes=1))
+        marker = dynamodb.tables["TransactionHistory"].items[("1",)]["notification_enqueued_at"]
+    finally:
+        aws.reset()
+        repositories.reset()
+
+    # Delivered rows leave the sparse index; the rest are read through it, never scanned.
+    assert dynamodb.calls["Scan"] == 0
+    assert (first["read"], first["redriven"]) == (3, 2)
+    assert sorted(m.reference["transaction_id"] for m in enqueued) == ["1", "3"]
+    # Claiming a row moved its marker, so the next sweep leaves it alone.
+    assert again["redriven"] == 0 and marker == {"S": now.isoformat()}
+
+
+def test_create_transaction_async_reads_concurrently(tx_service, monkeypatch):
+    import asyncio
+    service, state = tx_service
+    state["outcomes"] = [None]
+    get_client_async, get_fund_async = service.get_client_async, service.get_fund_async
+
+    async def main():
+        # Each read waits until the other is in flight too; reading one after the other times out.
+        both_in_flight = asyncio.Barrier(2)
+
+        async def together(read, key):
+            await asyncio.wait_for(both_in_flight.wait(), timeout=1)
+            return await read(key)
+
+        monkeypatch.setattr(service, "get_client_async", lambda user_id: together(get_client_async, user_id))
+        monkeypatch.setattr(service, "get_fund_async", lambda id_fund: together(get_fund_async, id_fund))
+        return await service.create_transaction_async("u1", "F123", "subscribe")
+
+    result = asyncio.run(main())
+    assert result["new_balance"] == 425000.0
+    assert len(state["writes"]) == 1
+
+
+def test_batch_applies_operations_in_order(fake_dynamodb, monkeypatch):
+    import asyncio
+    from app.models.fund import FundTransactionRequest
+    from app.services import batch_service
+    from app.utils import aws
+
+    reads, writes, transactions = [], [], []
+
+    def batch_get_item(RequestItems):
+        reads.append(RequestItems)
+        (table, request), = RequestItems.items()
+        if table == "Clients":
+            return {"Responses": {table: [{"user_id": "u1", "balance": 100000}, {"user_id": "u2", "balance": 10}]}}
+        return {"Responses": {table: []}}
+
+    def batch_write_item(RequestItems):
+        writes.append(RequestItems)
+        return {}
+
+    resource = aws.get_dynamodb()
+    resource.batch_get_item = batch_get_item
+    resource.batch_write_item = batch_write_item
+    resource.meta.client.transact_write_items = lambda TransactItems: transactions.append(TransactItems)
+    monkeypatch.setattr(batch_service, "get_funds", lambda ids: {"F1": {"id_fund": "F1", "minimum_amount": 75000}})
+
+    ops = [
+        FundTransactionRequest(user_id="u1", id_fund="F1", transaction_type="subscribe"),
+        FundTransactionRequest(user_id="u1", id_fund="F1", transaction_type="subscribe"),
+        FundTransactionRequest(user_id="u2", id_fund="F1", transaction_type="subscribe"),
+        FundTransactionRequest(user_id="u1", id_fund="F1", transaction_type="cancel"),
+        FundTransactionRequest(user_id="u3", id_fund="F1", transaction_type="subscribe"),
+    ]
+    results = asyncio.run(batch_service.apply_batch_async(ops))
+
+    assert [r["status"] for r in results] == ["ok", "error", "error", "ok", "error"]
+    assert "already subscribed" in results[1]["error"]
+    assert "Insufficient balance" in results[2]["error"]
+    assert "does not exist" in results[4]["error"]
+    assert results[3]["transaction"]["new_balance"] == 100000
+    assert len(reads) == 2
+    # u1 subscribed and cancelled: the guarded balance update and both history rows, in one transaction.
+    assert len(transactions) == 1 and len(transactions[0]) == 3
+    assert sum("TransactionHistory" in item["Put"]["TableName"] for item in transactions[0][1:]) == 2
+    assert writes == []
+
+
+def test_batch_endpoint_limit(monkeypatch):
+    from app.config.settings import settings
+    monkeypatch.setattr(settings, "batch_max_operations", 1)
+    op = {"user_id": "u1", "id_fund": "F1", "transaction_type": "subscribe"}
+    r = client.post("/v1/funds/batch", json={"operations": [op, op]})
+    assert r.status_code == 400
+
+
+def test_request_id_propagated():
+    r = client.get("/health", headers={"X-Request-ID": "req-123"})
+    assert r.headers["X-Request-ID"] == "req-123"
+    assert client.get("/health").headers["X-Request-ID"]
+
+
+def test_metrics_endpoint(tx_service):
+    from app.utils import metrics
+    service, state = tx_service
+    state["outcomes"] = [None]
+
+    before = metrics.fund_transactions.value(transaction_type="subscribe", outcome="committed")
+    service.create_transaction("u1", "F1", "subscribe")
+    assert metrics.fund_transactions.value(transaction_type="subscribe", outcome="committed") == before + 1
+
+    client.get("/v1/funds/health")
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/v1/funds/health",status="200"}' in r.text
+    assert 'fund_transaction_stage_seconds_bucket{stage="commit",le="+Inf"}' in r.text
+
+
+def test_local_dynamodb_transaction_round_trips(monkeypatch):
+    from app.services import funds_service
+    from app.utils import aws
+    from benchmarks.local_aws import install
+
+    dynamodb, _ = install()
+    try:
+        dynamodb.seed("Clients", [{"user_id": {"S": "u1"}, "balance": {"N": "200000"}}])
+        dynamodb.seed("Funds", [{"id_fund": {"S": "F1"}, "minimum_amount": {"N": "75000"}}])
+        # ClientModel needs email_validator, which is stubbed out in this module.
+        monkeypatch.setattr(funds_service, "get_client",
+                            lambda user_id: aws.get_table("Clients").get_item(Key={"user_id": user_id})["Item"])
+        monkeypatch.setattr(funds_service, "get_fund_minimum_amount", lambda id_fund: 75000.0)
+
+        assert funds_service.create_transaction("u1", "F1", "subscribe")["new_balance"] == 125000
+        with pytest.raises(ValueError, match="already subscribed"):
+            funds_service.create_transaction("u1", "F1", "subscribe")
+        funds_service.create_transaction("u1", "F1", "cancel")
+        # The stand-in keys tables as iac/template.yaml does, so these addresses match the deployed table.
+        keys = [{"transaction_id": key[0]} for key in dynamodb.tables["TransactionHistory"].items]
+        funds_service.mark_notified(keys + [{"transaction_id": "compacted"}])
+        notified = [item["notification"] for item in dynamodb.tables["TransactionHistory"].items.values()]
+        funds_service.get_storage().history.delete_many(keys[:1])
+    finally:
+        aws.reset()
+
+    assert dynamodb.calls == {"GetItem": 3, "TransactWriteItems": 3, "UpdateItem": 3, "BatchWriteItem": 1}
+    assert dynamodb.count("ClientFundRelation") == 0
+    assert notified == [{"BOOL": True}, {"BOOL": True}]
+    assert dynamodb.count("TransactionHistory") == 1
+    assert dynamodb.tables["Clients"].items[("u1",)]["balance"] == {"N": "200000.0"}
+
+
+def test_memory_storage_keeps_conditional_semantics(monkeypatch):
+    from app import repositories
+    from app.repositories.memory import MemoryStorage
+    from app.services import funds_service, history_service
+
+    storage = MemoryStorage()
+    storage.clients_by_id["u1"] = {"user_id": "u1", "balance": 200000}
+    repositories.set_storage(storage)
+    monkeypatch.setattr(funds_service, "get_client", lambda user_id: storage.clients.get(user_id))
+    monkeypatch.setattr(funds_service, "get_fund_minimum_amount", lambda id_fund: 75000.0)
+    try:
+        funds_service.create_transaction("u1", "F1", "subscribe")
+        with pytest.raises(ValueError, match="already subscribed"):
+            funds_service.create_transaction("u1", "F1", "subscribe")
+        with pytest.raises(repositories.TransactionConflict) as conflict:
+            storage.transact([repositories.BalanceUpdate("u1", 200000, 0)])
+        assert conflict.value.reasons == ["ConditionalCheckFailed"]
+        funds_service.create_transaction("u1", "F1", "cancel")
+        funds_service.create_transaction("u1", "F2", "subscribe")
+
+        first = history_service.list_transactions(user_id="u1", limit=2)
+        second = history_service.list_transactions(user_id="u1", limit=2, cursor=first["next_cursor"])
+    finally:
+        repositories.reset()
+
+    assert storage.clients.get("u1")["balance"] == 125000
+    assert storage.relations.get("u1", "F2") is not None and storage.relations.get("u1", "F1") is None
+    assert [t["id_fund"] for t in first["items"] + second["items"]] == ["F2", "F1", "F1"]
+    assert second["next_cursor"] is None
+
+
+def test_idempotency_key_replays_stored_response(monkeypatch):
+    from app import repositories
+    from app.repositories.memory import MemoryStorage
+    from app.services import funds_service, idempotency
+
+    storage = MemoryStorage()
+    storage.clients_by_id["u1"] = {"user_id": "u1", "balance": 200000}
+    repositories.set_storage(storage)
+    reads = []
+    monkeypatch.setattr(funds_service, "get_client", lambda user_id: reads.append(user_id) or storage.clients.get(user_id))
+    monkeypatch.setattr(funds_service, "get_fund_minimum_amount", lambda id_fund: 75000.0)
+    idempotency.idempotency_cache.clear()
+    try:
+        first = funds_service.create_transaction("u1", "F1", "subscribe", idempotency_key="k1")
+        replay = funds_service.create_transaction("u1", "F1", "subscribe", idempotency_key="k1")
+        assert len(reads) == 1
+
+        # A concurrent duplicate that missed both lookups loses the conditional put and replays.
+        idempotency.idempotency_cache.clear()
+        stored = storage.idempotency.get
+        misses = iter([None])
+        monkeypatch.setattr(storage.idempotency, "get", lambda key: next(misses, None) or stored(key))
+        raced = funds_service.create_transaction("u1", "F1", "subscribe", idempotency_key="k1")
+
+        with pytest.raises(idempotency.IdempotencyKeyReused):
+            funds_service.create_transaction("u1", "F2", "subscribe", idempotency_key="k1")
+    finally:
+        repositories.reset()
+        idempotency.idempotency_cache.clear()
+
+    assert replay["transaction_id"] == raced["transaction_id"] == first["transaction_id"]
+    assert replay["timestamp"] == first["timestamp"].isoformat().replace("+00:00", "Z")
+    assert storage.clients.get("u1")["balance"] == 125000
+    assert len(storage.history_by_key) == 1
+
+
+def test_fund_stats_counters_and_reconcile(monkeypatch):
+    from app import repositories
+    from app.repositories.memory import MemoryStorage
+    from app.services import fund_catalog, fund_stats, funds_service
+
+    storage = MemoryStorage()
+    storage.clients_by_id["u1"] = {"user_id": "u1", "balance": 500000}
+    storage.funds_by_id["F1"] = {"id_fund": "F1", "name": "Fondo 1", "minimum_amount": 75000}
+    repositories.set_storage(storage)
+    fund_catalog.invalidate()
+    monkeypatch.setattr(funds_service, "get_client", lambda user_id: storage.clients.get(user_id))
+    try:
+        funds_service.create_transaction("u1", "F1", "subscribe")
+        assert fund_stats.get_fund_stats("F1") == {"id_fund": "F1", "subscribers": 1, "committed_capital": 75000.0}
+        funds_service.create_transaction("u1", "F1", "cancel")
+        assert fund_stats.get_fund_stats("F1")["subscribers"] == 0
+
+        storage.relations.put("u2", "F1")  # written outside the transactional path
+        assert fund_stats.reconcile() == [{"id_fund": "F1", "subscribers": 1, "committed_capital": 75000.0}]
+        assert fund_stats.reconcile() == []
+        stats = fund_stats.get_fund_stats("F1")
+    finally:
+        repositories.reset()
+        fund_catalog.invalidate()
+
+    assert stats == {"id_fund": "F1", "subscribers": 1, "committed_capital": 75000.0}
+
+
+def test_fund_stats_reconcile_skips_funds_written_during_the_pass(monkeypatch):
+    from app import repositories
+    from app.repositories import FundStatsDelta, SubscriptionPut
+    from app.repositories.dynamodb import DynamoDBStorage
+    from app.services import fund_catalog, fund_stats
+    from app.utils import aws
+    from benchmarks.local_aws import install
+
+    dynamodb, _ = install()
+    storage = DynamoDBStorage()
+    repositories.set_storage(storage)
+    fund_catalog.invalidate()
+    count_by_fund = storage.relations.count_by_fund
+    try:
+        dynamodb.seed("Funds", [{"id_fund": {"S": "F1"}, "name": {"S": "Fondo 1"}, "minimum_amount": {"N": "75000"}}])
+        storage.relations.put("u1", "F1")  # drift: the relation has no counter
+
+        def subscribe_while_counting():
+            # u2 subscribes after the counters were read, and the scan sees its relation.
+            storage.transact([SubscriptionPut("u2", "F1"), FundStatsDelta("F1", 1, 75000.0, 3)])
+            return count_by_fund()
+
+        monkeypatch.setattr(storage.relations, "count_by_fund", subscribe_while_counting)
+        skipped = fund_stats.reconcile()
+        during = fund_stats.get_fund_stats("F1")["subscribers"]
+        monkeypatch.setattr(storage.relations, "count_by_fund", count_by_fund)
+        repaired = fund_stats.reconcile()
+        stats = fund_stats.get_fund_stats("F1")
+    finally:
+        aws.reset()
+        repositories.reset()
+        fund_catalog.invalidate()
+
+    # A +2 correction against the counters read before u2 would have counted u2 twice.
+    assert (skipped, during) == ([], 1)
+    assert repaired == [{"id_fund": "F1", "subscribers": 1, "committed_capital": 75000.0}]
+    assert stats == {"id_fund": "F1", "subscribers": 2, "committed_capital": 150000.0}
+
+
+def test_portfolio_from_user_index(monkeypatch):
+    from app import repositories
+    from app.repositories.memory import MemoryStorage
+    from app.services import fund_catalog, portfolio_service
+
+    storage = MemoryStorage()
+    storage.funds_by_id["F1"] = {"id_fund": "F1", "name": "Fondo 1", "minimum_amount": 75000, "category": "FPV"}
+    storage.funds_by_id["F2"] = {"id_fund": "F2", "name": "Fondo 2", "minimum_amount": 50000, "category": "FIC"}
+    storage.relations.put("u1", "F2")
+    storage.relations.put("u1", "F1")
+    storage.relations.put("u2", "F1")
+
+    async def fake_get_client_async(user_id):
+        return {"user_id": user_id, "balance": 375000.0}
+
+    monkeypatch.setattr(portfolio_service, "get_client_cached_async", fake_get_client_async)
+    repositories.set_storage(storage)
+    fund_catalog.invalidate()
+    try:
+        r = client.get("/v1/clients/u1/portfolio")
+    finally:
+        repositories.reset()
+        fund_catalog.invalidate()
+
+    assert r.status_code == 200
+    data = r.json()
+    assert data["balance"] == 375000.0
+    assert [h["id_fund"] for h in data["holdings"]] == ["F1", "F2"]
+    assert data["holdings"][0]["name"] == "Fondo 1" and data["holdings"][0]["subscribed_at"]
+    assert data["total_committed"] == 125000
+
+
+def test_history_compaction_reads_both_tiers(tmp_path, monkeypatch):
+    from decimal import Decimal
+    from app import repositories
+    from app.config.settings import settings
+    from app.repositories import archive
+    from app.repositories.memory import MemoryStorage
+    from app.services import history_archive, history_service
+
+    class RecordingStore(archive.LocalArchiveStore):
+        def __init__(self, root):
+            super().__init__(root)
+            self.reads = []
+
+        def read(self, date, name, start=0, length=None):
+            self.reads.append((date, name))
+            return super().read(date, name, start, length)
+
+    def row(n, timestamp, user_id="u1"):
+        return {"id_transaction": f"trans#{n}", "user_id#fund_id#timestamp": f"{user_id}#F1#{timestamp}",
+                "transaction_id": str(n), "user_id": user_id, "id_fund": "F1", "timestamp": timestamp,
+                "transaction_type": "subscribe", "amount": Decimal("75000.5"), "notification": True}
+
+    storage = MemoryStorage()
+    storage.history.put_many([
+        row(1, "2024-01-01T10:00:00+00:00"), row(2, "2024-01-01T12:00:00+00:00"),
+        row(3, "2024-01-02T09:00:00+00:00"), row(4, "2024-01-03T09:00:00+00:00", user_id="u2"),
+        row(5, "2024-03-01T09:00:00+00:00")
+    ] + [row(n, f"2024-01-04T09:00:{n:02d}+00:00", user_id=f"u{n}") for n in range(10, 40)])
+    repositories.set_storage(storage)
+    store = RecordingStore(str(tmp_path))
+    archive.set_archive_store(store)
+    # Small scan pages and groups: rows of one day arrive over many pages but still land in one part.
+    monkeypatch.setattr(settings, "history_export_page_size", 7)
+    monkeypatch.setattr(settings, "history_archive_group_rows", 10)
+    now = datetime(2024, 3, 1, 15, tzinfo=timezone.utc)
+    try:
+        summary = history_archive.compact(older_than_days=30, now=now)
+        # Re-running (e.g. after a crash between archive and delete) archives nothing twice.
+        storage.history.put_many([row(3, "2024-01-02T09:00:00+00:00")])
+        rerun = history_archive.compact(older_than_days=30, now=now)
+
+        pages, cursor = [], None
+        while True:
+            page = history_service.list_transactions(user_id="u1", limit=2, cursor=cursor)
+            pages.append([r["transaction_id"] for r in page["items"]])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        pruned = history_service.list_transactions(user_id="u1", start=datetime(2024, 1, 2, tzinfo=timezone.utc),
+                                                   end=datetime(2024, 1, 2, 23, tzinfo=timezone.utc))
+        store.reads.clear()
+        one_user = history_service.list_transactions(user_id="u25")
+        user_reads = list(store.reads)
+        store.reads.clear()
+        ranged = [r.transaction_id for r in history_service.iter_transactions(
+            start=datetime(2024, 1, 1, tzinfo=timezone.utc), end=datetime(2024, 1, 3, 23, tzinfo=timezone.utc))]
+        ranged_reads = list(store.reads)
+        exported = [r.transaction_id for r in history_service.iter_transactions()]
+    finally:
+        repositories.reset()
+        archive.reset()
+
+    assert (summary["archived"], summary["deleted"], summary["parts"]) == (34, 34, 4)
+    assert summary["partitions"] == ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"]
+    assert (rerun["archived"], rerun["deleted"], rerun["parts"]) == (0, 1, 0)
+    assert len(storage.history_by_key) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == \
+        ["date=2024-01-01", "date=2024-01-02", "date=2024-01-03", "date=2024-01-04"]
+    day = sorted(p.name for p in (tmp_path / "date=2024-01-04").iterdir())
+    assert len(day) == 2 and day[0] == "manifest.json" and day[1].endswith(".json.gz")
+    assert pages == [["5", "3"], ["2", "1"]]
+    assert [r["transaction_id"] for r in pruned["items"]] == ["3"] and pruned["items"][0]["amount"] == Decimal("75000.5")
+    # A user's read fetches only the row group covering that user.
+    assert [r["transaction_id"] for r in one_user["items"]] == ["25"]
+    assert user_reads == [("2024-01-04", day[1])]
+    # Days outside the range are skipped; without a range the export covers the whole archive.
+    assert ranged == ["4", "3", "2", "1"] and "2024-01-04" not in {date for date, _ in ranged_reads}
+    assert exported[0] == "5" and exported[-4:] == ["4", "3", "2", "1"]
+    assert sorted(exported[1:-4]) == [str(n) for n in range(10, 40)]
+
+
+def test_balance_at_replays_from_nearest_snapshot():
+    from decimal import Decimal
+    from app import repositories
+    from app.repositories.memory import MemoryStorage
+    from app.services import ledger_service
+
+    def row(n, timestamp, transaction_type, amount):
+        return {"id_transaction": f"trans#{n}", "user_id#fund_id#timestamp": f"u1#F1#{timestamp}",
+                "transaction_id": str(n), "user_id": "u1", "id_fund": "F1", "timestamp": timestamp,
+                "transaction_type": transaction_type, "amount": Decimal(amount), "notification": True}
+
+    storage = MemoryStorage()
+    # Opening balance 500000: -75000, +75000, -50000, -75000 -> 375000 today.
+    storage.clients_by_id["u1"] = {"user_id": "u1", "balance": Decimal("375000")}
+    storage.history.put_many([
+        row(1, "2024-01-01T10:00:00+00:00", "subscribe", "75000"),
+        row(2, "2024-01-05T10:00:00+00:00", "cancel", "75000"),
+        row(3, "2024-02-01T10:00:00+00:00", "subscribe", "50000"),
+        row(4, "2024-03-01T10:00:00+00:00", "subscribe", "75000"),
+    ])
+    repositories.set_storage(storage)
+    try:
+        # Without snapshots the live balance is unwound.
+        unwound = ledger_service.balance_at("u1", datetime(2024, 1, 2, tzinfo=timezone.utc))
+        assert ledger_service.take_snapshot("u1", datetime(2024, 1, 10, tzinfo=timezone.utc))["balance"] == 500000
+        assert ledger_service.take_snapshot("u1", datetime(2024, 1, 20, tzinfo=timezone.utc)) is None
+        summary = ledger_service.take_snapshots(datetime(2024, 2, 15, tzinfo=timezone.utc))
+
+        r = client.get("/v1/clients/u1/balance", params={"at": "2024-03-02T00:00:00Z"})
+        before_first = ledger_service.balance_at("u1", datetime(2024, 1, 1, 12, tzinfo=timezone.utc))
+        missing = client.get("/v1/clients/nobody/balance")
+    finally:
+        repositories.reset()
+
+    assert (unwound["balance"], unwound["snapshot_at"], unwound["replayed"]) == (425000.0, None, 3)
+    assert summary == {"at": "2024-02-15T00:00:00+00:00", "clients": 1, "taken": 1, "failed": 0}
+    assert r.status_code == 200
+    data = r.json()
+    assert (data["balance"], data["replayed"]) == (375000.0, 1)
+    assert data["snapshot_at"].startswith("2024-02-15T00:00:00")
+    # Earlier than every snapshot: unwound from the first one.
+    assert (before_first["balance"], before_first["replayed"]) == (425000.0, 1)
+    assert missing.status_code == 404
+
+
+def test_bulk_load_streams_batches_and_resumes(tmp_path):
+    from app.utils import aws, bulk_load
+    from benchmarks.local_aws import install
+
+    clients = [{"user_id": {"S": f"u{n}"}, "balance": {"N": "500000"}} for n in range(60)]
+    funds = [{"id_fund": {"S": "F1"}, "minimum_amount": {"N": "75000"}}]
+    document = tmp_path / "data.json"
+    document.write_text(json.dumps({"clients": clients, "funds": funds}, indent=2))
+    history = tmp_path / "history.ndjson"
+    history.write_text("\n".join(json.dumps({
+        "transaction_id": str(n), "user_id#fund_id#timestamp": f"u1#F1#2024-01-01T00:00:{n:02d}+00:00",
+        "user_id": "u1", "transaction_type": "subscribe", "amount": 75000.5}) for n in range(30)) + "\n")
+    checkpoint = str(tmp_path / "checkpoint.json")
+
+    dynamodb, _ = install()
+    try:
+        # A small read window makes the decoder refill mid-item.
+        with open(document, encoding="utf-8") as f:
+            records = list(bulk_load.iter_document(f, chunk_size=7))
+        loader = bulk_load.BulkLoader(workers=4, checkpoint=checkpoint, source=str(document))
+        report = loader.run(bulk_load.iter_records(str(document)))
+
+        bulk_load.write_checkpoint(checkpoint, str(history), 25)
+        skip = bulk_load.read_checkpoint(checkpoint, str(history))
+        resumed = bulk_load.BulkLoader(workers=2, checkpoint=checkpoint, source=str(history)).run(
+            bulk_load.iter_records(str(history), table="TransactionHistory", plain=True), skip=skip)
+        with pytest.raises(ValueError, match="belongs to"):
+            bulk_load.read_checkpoint(checkpoint, str(document))
+    finally:
+        aws.reset()
+
+    assert len(records) == 61
+    assert report["tables"] == {"Clients": 60, "Funds": 1} and report["batch_calls"] == 4
+    assert (resumed["records"], resumed["resumed_from"]) == (5, 25)
+    assert dynamodb.count("Clients") == 60 and dynamodb.count("TransactionHistory") == 5
+    assert json.loads(open(checkpoint).read())["complete"] is True
+    assert dynamodb.tables["TransactionHistory"].items[("29",)]["amount"] == {"N": "75000.5"}
+
+
+def test_loadgen_stage_report_and_saturation():
+    import asyncio
+    from benchmarks import loadgen
+
+    workload = loadgen.Workload(["u1", "u2"], ["F1", "F2", "F3"], zipf=1.0, history_ratio=0.5, seed=3)
+
+    def handler(request):
+        if request.url.path == "/v1/funds/cancel":
+            return httpx.Response(503, headers={"Retry-After": "1"})
+        return httpx.Response(200, json={})
+
+    async def stage():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://test") as c:
+            return await loadgen.run_stage(c, workload, rps=400, duration=0.25)
+
+    stats, elapsed = asyncio.run(stage())
+    report = loadgen.summarize(stats, 400, elapsed, slo_p99_ms=250, slo_failure_rate=0.01)
+
+    assert report["requests"] == 100 and report["dropped"] == 0
+    assert set(report["operations"]) == {"subscribe", "cancel", "history"}
+    # Every subscribe targets a fund the user is not in, so none is rejected.
+    assert report["rejected_rate"] == 0 and report["operations"]["subscribe"]["ok"] <= 6
+    assert report["shed_rate"] == report["operations"]["cancel"]["shed"] / 100 > 0
+    assert not report["slo_met"]
+    stages = [dict(report, target_rps=100, goodput_rps=95.0, slo_met=True), dict(report, target_rps=400)]
+    assert loadgen.saturation(stages) == {"saturation_rps": 400, "max_sustained_rps": 95.0}
+
+
+def test_server_runs_background_jobs_in_one_worker(monkeypatch):
+    from app import server
+    from app.config import logging_config
+    from app.config.settings import settings
+
+    pids = iter(range(100, 110))
+    monkeypatch.setattr(server.os, "fork", lambda: next(pids))
+    monkeypatch.setattr(logging_config, "configure_logging", lambda: None)
+    monkeypatch.setattr(logging_config, "shutdown_logging", lambda: None)
+    monkeypatch.setattr(settings, "background_jobs", True)
+    master = server.Master(None, 3, 0, 0, 1.0)
+    for _ in range(3):
+        master.spawn()
+    assert master.jobs_pid == 100
+
+    # The jobs worker exits: its replacement takes the jobs over, a plain replacement does not.
+    del master.children[101]
+    master.spawn()
+    assert master.jobs_pid == 100
+    del master.children[100]
+    master.spawn()
+    assert master.jobs_pid == 104
+
+
+def test_server_sizes_workers_from_container_limits(tmp_path, monkeypatch):
+    import os
+    from app import server
+    from app.config.settings import settings
+
+    monkeypatch.setattr(settings, "web_concurrency", 0)
+    monkeypatch.setattr(settings, "server_worker_memory_mb", 128)
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+
+    v2 = tmp_path / "v2"
+    v2.mkdir()
+    (v2 / "cpu.max").write_text("250000 100000\n")
+    (v2 / "memory.max").write_text("max\n")
+    v1 = tmp_path / "v1"
+    (v1 / "cpu").mkdir(parents=True)
+    (v1 / "memory").mkdir()
+    (v1 / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    (v1 / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    (v1 / "memory" / "memory.limit_in_bytes").write_text(str(300 * 1024 * 1024))
+
+    assert server.cpu_limit(str(v2)) == 2.5 and server.memory_limit(str(v2)) is None
+    assert server.worker_count(str(v2)) == 3
+    # No CPU quota: every CPU in the affinity mask, but only two 128 MB workers fit in 300 MB.
+    assert server.cpu_limit(str(v1)) is None and server.worker_count(str(v1)) == 2
+    assert server.worker_count(str(tmp_path / "missing")) == 8
+    monkeypatch.setattr(settings, "web_concurrency", 5)
+    assert server.worker_count(str(v1)) == 5
+
+
+def test_client_reads_coalesce_and_cache_until_written(monkeypatch):
+    import asyncio
+    import threading
+    import time
+    from app.services import client_service
+
+    reads = []
+    release = threading.Event()
+
+    def fake_load(user_id, consistent=False):
+        reads.append(consistent)
+        release.wait(timeout=5)
+        return {"user_id": user_id, "balance": 500000.0 - 1000 * len(reads)}
+
+    monkeypatch.setattr(client_service, "_load_client", fake_load)
+    monkeypatch.setattr(client_service.client_cache, "ttl", 60)
+    client_service.client_cache.clear()
+
+    async def burst():
+        lookups = asyncio.gather(*[client_service.get_client_cached_async("u1") for _ in range(20)])
+        await asyncio.sleep(0.05)
+        release.set()
+        return await lookups
+
+    try:
+        # Twenty concurrent lookups share one read; the next one is served from the cache.
+        results = asyncio.run(burst())
+        assert reads == [False] and all(result is results[0] for result in results)
+        assert client_service.get_client_cached("u1") is results[0] and len(reads) == 1
+
+        # The balance-mutating path always reads through, strongly consistent.
+        assert client_service.get_client("u1")["balance"] == 498000.0 and reads[-1] is True
+
+        # A write while a read is in flight keeps that (older) read out of the cache.
+        client_service.invalidate_client("u1")
+        release.clear()
+        reader = threading.Thread(target=client_service.get_client_cached, args=("u1",))
+        reader.start()
+        while len(reads) < 3:
+            time.sleep(0.01)
+        client_service.invalidate_client("u1")
+        release.set()
+        reader.join()
+        assert client_service.get_client_cached("u1")["balance"] == 496000.0 and len(reads) == 4
+    finally:
+        release.set()
+        client_service.client_cache.clear()
+
+
+def test_history_page_caps_storage_reads(monkeypatch):
+    from decimal import Decimal
+    from app import repositories
+    from app.config.settings import settings
+    from app.repositories.memory import MemoryStorage
+    from app.services import history_service
+
+    storage = MemoryStorage()
+    # One F2 row at the bottom of 40 F1 rows: a fund filter finds it only after reading everything.
+    storage.history.put_many([
+        {"transaction_id": str(n), "user_id": "u1", "id_fund": "F2" if n == 0 else "F1",
+         "timestamp": f"2024-01-01T00:{n:02d}:00+00:00", "transaction_type": "subscribe",
+         "amount": Decimal("75000"), "notification": True}
+        for n in range(40)
+    ])
+    reads = []
+    query = storage.history.query
+    monkeypatch.setattr(storage.history, "query", lambda *args: reads.append(args[1]) or query(*args))
+    monkeypatch.setattr(settings, "history_max_reads_per_page", 3)
+    repositories.set_storage(storage)
+    try:
+        pages, cursor = [], None
+        while True:
+            page = history_service.list_transactions(user_id="u1", id_fund="F2", limit=10, cursor=cursor)
+            pages.append([r["transaction_id"] for r in page["items"]])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+    finally:
+        repositories.reset()
+
+    # Each request stops after three reads and hands back a cursor, even with nothing found yet.
+    assert pages == [[], ["0"]]
+    assert reads == [10] * 4